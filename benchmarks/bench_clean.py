@@ -0,0 +1,90 @@
+"""
+bench_clean.py
+
+Cleaning of the final dataset: the loops of notebooks/dataCleaning.ipynb (one groupby per
+imputed column, one loop over the sectors per outlier column) against clean.fit() +
+clean.apply(), on girona_for_rent_final resampled to --n listings.
+
+- checks that both keep the same listings with the same imputed values;
+- reports the time of each, and of apply() alone with the saved parameters (cleaning new
+  listings without the history).
+
+    python benchmarks/bench_clean.py [--n 200000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import clean  # noqa: E402
+from storage import read_table  # noqa: E402
+
+
+def notebook_clean(df):
+    """The cleaning cells of the notebook, as they are."""
+    df = df.copy()
+    for col in ["rooms", "metres_cadastre", "emissions_de_co2"]:
+        medians = df.groupby("sector_oficial")[col].median()
+        df[col] = df[col].fillna(df["sector_oficial"].map(medians))
+    df["elevator"] = df["elevator"].where(df["elevator"].notna(), False).infer_objects()
+    df["floors"] = df["floors"].fillna(0)
+    df["qual_energia_num"] = df["qual_energia"].map(clean.ENERGY_GRADES)
+    medians = df.groupby("sector_oficial")["qual_energia_num"].median().round()
+    df["qual_energia_num"] = df["qual_energia_num"].fillna(df["sector_oficial"].map(medians))
+    df["qual_energia"] = df["qual_energia_num"].map(clean.ENERGY_GRADES_INV)
+    df = df.drop(columns="qual_energia_num")
+
+    def iqr_outliers(series):
+        q1, q3 = series.quantile(0.25), series.quantile(0.75)
+        iqr = q3 - q1
+        return series[(series < q1 - 1.5 * iqr) | (series > q3 + 1.5 * iqr)]
+
+    outlier_idx = set()
+    for col in clean.LINEAR_IQR_COLUMNS + clean.LOG_IQR_COLUMNS:
+        for _, g in df.groupby("sector_oficial"):
+            values = np.log1p(g[col]) if col in clean.LOG_IQR_COLUMNS else g[col]
+            outlier_idx.update(iqr_outliers(values).index)
+    return df.drop(index=outlier_idx).reset_index(drop=True)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rent = read_table(clean.INPUT_TABLE)
+    # As read from CSV by the notebook: labels as text, float64 numbers
+    for col in rent.select_dtypes(["category", "boolean"]):
+        rent[col] = rent[col].astype(object)
+    for col in rent.select_dtypes("float32"):
+        rent[col] = rent[col].astype(float)
+    rent = rent.sample(args.n, replace=True, random_state=42).reset_index(drop=True)
+
+    expected, notebook_s = timed(notebook_clean, rent)
+    params, fit_s = timed(clean.fit, rent)
+    cleaned, apply_s = timed(clean.apply, rent, params)
+
+    cols = ["rooms", "floors", "metres_cadastre", "emissions_de_co2", "qual_energia", "elevator", "price", "area"]
+    same = cleaned[cols].astype(str).equals(expected[cols].astype(str))
+
+    print(f"{args.n} listings, {len(cleaned)} kept")
+    print(f"notebook loops:      {notebook_s * 1000:8.1f} ms")
+    print(f"clean.fit + apply:   {(fit_s + apply_s) * 1000:8.1f} ms")
+    print(f"clean.apply (saved): {apply_s * 1000:8.1f} ms")
+    print("✔ same listings and values as the notebook" if same else "✘ differs from the notebook")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+bench_comps.py
+
+Comparables index (comps.ComparablesIndex) on a large synthetic market: the listings of
+final_final_dataset.csv resampled --n times with jitter (about 300 m in position, 10% in
+area).
+
+- build time of the index;
+- p50 / p99 latency of query() (k=10) for --queries random listings;
+- the same after add() of --added listings in batches of 1000 (buffer + rebuilds);
+- checks the comps of a sample of queries against brute force over all the points.
+
+    python benchmarks/bench_comps.py [--n 300000] [--queries 2000] [--added 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from comps import DATA_CSV, RESULT_COLUMNS, ComparablesIndex  # noqa: E402
+
+
+def synthetic(listings, n, rng):
+    out = listings[RESULT_COLUMNS].sample(n, replace=True, random_state=rng.integers(1 << 31)).reset_index(drop=True)
+    out["lat"] += rng.normal(0, 0.003, n)
+    out["lon"] += rng.normal(0, 0.004, n)
+    out["area"] = (out["area"] * rng.normal(1, 0.1, n)).round().clip(lower=15)
+    return out
+
+
+def latencies(index, queries, k=10):
+    times = np.empty(len(queries))
+    for i, q in enumerate(queries):
+        t = time.perf_counter()
+        index.query(q, k)
+        times[i] = time.perf_counter() - t
+    return times * 1e6
+
+
+def brute_force_ok(index, queries, k=10):
+    """Same dissimilarities as a full scan over every point (tree + buffer)."""
+    points = index._vectors(pd.concat([index.listings, index.pending], ignore_index=True))
+    for q in queries:
+        expected = np.sort(np.sqrt(((points - index.vector(q)) ** 2).sum(axis=1)))[:k]
+        got = [c["dissimilarity"] for c in index.query(q, k)]
+        if not np.allclose(got, expected, rtol=0, atol=1e-9):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=300_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--added", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    base = pd.read_csv(DATA_CSV)
+    listings = synthetic(base, args.n, rng)
+    queries = synthetic(base, args.queries, rng).to_dict("records")
+
+    start = time.perf_counter()
+    index = ComparablesIndex(listings)
+    build_s = time.perf_counter() - start
+    before = latencies(index, queries)
+    ok = brute_force_ok(index, queries[:50])
+
+    added = synthetic(base, args.added, rng)
+    start = time.perf_counter()
+    for i in range(0, len(added), 1000):
+        index.add(added.iloc[i:i + 1000])
+    add_s = time.perf_counter() - start
+    after = latencies(index, queries)
+    ok_after = brute_force_ok(index, queries[:50])
+
+    print(f"{args.n} listings, build {build_s:.2f} s")
+    print(f"query k=10: p50 {np.percentile(before, 50):.0f} us, p99 {np.percentile(before, 99):.0f} us")
+    print(f"add {args.added} in batches of 1000: {add_s:.2f} s ({len(index.pending)} in the buffer)")
+    print(f"query k=10 after adds: p50 {np.percentile(after, 50):.0f} us, p99 {np.percentile(after, 99):.0f} us")
+    for name, good in [("before adds", ok), ("after adds", ok_after)]:
+        print(f"✔ matches brute force {name}" if good else f"✘ differs from brute force {name}")
+
+
+if __name__ == "__main__":
+    main()
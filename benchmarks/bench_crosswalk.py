@@ -0,0 +1,95 @@
+"""
+bench_crosswalk.py
+
+Section -> barri crosswalk and aggregation of the sociodemographic indicators to sectors,
+before and after crosswalk.py.
+
+- Pairing: gpd.overlay(sections, barris, how='intersection') against crosswalk.overlap_pairs
+  (STRtree candidates, intersection only for the pairs that intersect) and Crosswalk.build,
+  on the layers of Girona tiled --tiles x --tiles times (translated copies, a province-sized
+  layer). Checks that both give the same intersections in the same order.
+- Aggregation to sectors: the mean over the listings of each sector (clustering.py, on
+  --listings rows of final_final_dataset.csv resampled) against one sparse product of the
+  section x sector crosswalk (population-weighted, clustering.py --crosswalk), which does not
+  depend on the listings.
+
+    python benchmarks/bench_crosswalk.py [--tiles 8] [--listings 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from crosswalk import SECTOR_WEIGHTS_CSV, Crosswalk, overlap_pairs  # noqa: E402
+from enrich import latest_socio  # noqa: E402
+from schema import DATASET_CSV  # noqa: E402
+from section_to_neighbourhood import BARRIS_DBF, SECCIONS_SHP, codis_censals  # noqa: E402
+
+PCA_COLS = ["renda_med", "renda_mediana", "gini", "p80_p20", "pct_65_plus", "pct_under18",
+            "pct_single_household"]
+
+
+def tiled(layer, tiles, key):
+    """`tiles` x `tiles` translated copies of a layer, `key` made unique per copy."""
+    minx, miny, maxx, maxy = layer.total_bounds
+    copies = []
+    for i in range(tiles):
+        for j in range(tiles):
+            offset = [i * (maxx - minx), j * (maxy - miny)]
+            copy = layer.copy()
+            copy.geometry = shapely.transform(layer.geometry.values, lambda xy: xy + offset)
+            copy[key] = copy[key].astype(str) + f"-{i}-{j}"
+            copies.append(copy)
+    return gpd.GeoDataFrame(pd.concat(copies, ignore_index=True), crs=layer.crs)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tiles", type=int, default=8)
+    parser.add_argument("--listings", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    barris = gpd.read_file(BARRIS_DBF)
+    sections = codis_censals(gpd.read_file(SECCIONS_SHP).to_crs(barris.crs), "17079")
+    sections, barris = tiled(sections, args.tiles, "census_tract_INE"), tiled(barris, args.tiles, "BARRIS")
+
+    overlay, t_overlay = timed(lambda: gpd.overlay(sections, barris, how="intersection", keep_geom_type=False))
+    (_, _, pieces), t_pairs = timed(lambda: overlap_pairs(sections, barris))
+    crosswalk, t_build = timed(lambda: Crosswalk.build(sections, barris))
+    same = len(pieces) == len(overlay) and shapely.equals_exact(overlay.geometry.values, pieces, 0).all()
+    print(f"{len(sections)} section polygons x {len(barris)} barris ({args.tiles}x{args.tiles} copies of Girona): "
+          f"{len(pieces)} intersections, {crosswalk.areas.nnz} non-zero weights")
+    print(f"  gpd.overlay {t_overlay:.3f} s, overlap_pairs {t_pairs:.3f} s, Crosswalk.build {t_build:.3f} s  "
+          f"{'✔ same intersections' if same else '✘ intersections differ'}")
+
+    rng = np.random.default_rng(args.seed)
+    listings = pd.read_csv(DATASET_CSV, usecols=["sector_oficial"] + PCA_COLS)
+    listings = listings.sample(args.listings, replace=True, random_state=rng.integers(1 << 31))
+    socio = latest_socio()
+    sector_weights = Crosswalk.read_csv(SECTOR_WEIGHTS_CSV)
+
+    by_listings, t_groupby = timed(lambda: listings.groupby("sector_oficial")[PCA_COLS].mean())
+    by_area, t_sparse = timed(lambda: sector_weights.aggregate(socio[PCA_COLS], weights=socio["poblacion"]))
+    print(f"sociodemographic per sector: groupby over {len(listings)} listings {t_groupby:.3f} s "
+          f"({len(by_listings)} sectors with listings), sparse product {t_sparse * 1000:.2f} ms "
+          f"({by_area.notna().all(axis=1).sum()} sectors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+bench_energy_ingest.py
+
+Ingestion of a large energy certificate registry: the whole-file read of the original
+merge_energy_certificates.py (read_csv + to_datetime + TemporalIndex over every row) against
+energy_ingest.read_certificates (chunks, needed columns only, Girona tracts only, last
+certificate per tract and year).
+
+The registry is synthetic: the rows of girona_energy_certificates.csv resampled to --rows,
+with --outside of them moved to census tracts outside Girona and random dates, all columns
+kept.
+
+- checks that both give the same energy features for every geocoded rental;
+- reports time and peak memory of each (each one runs in a fresh process: peak RSS while
+  reading minus the RSS before, Linux only), and the rows of the index.
+
+    python benchmarks/bench_energy_ingest.py [--rows 2000000] [--outside 0.9]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from energy_ingest import CERT_COLS, ENERGY_CSV, read_certificates  # noqa: E402
+from enrich import energy_features  # noqa: E402
+from storage import read_table  # noqa: E402
+from temporal_index import TemporalIndex  # noqa: E402
+
+
+def synthetic_registry(path, rows, outside, rng):
+    source = pd.read_csv(ENERGY_CSV)
+    registry = source.sample(rows, replace=True, random_state=42).reset_index(drop=True)
+    moved = rng.random(rows) < outside
+    registry.loc[moved, "census_tract"] = 800000000 + rng.integers(0, 99_999_999, moved.sum())
+    dated = registry["data_entrada"].notna().to_numpy()
+    days = rng.integers(0, 15 * 365, rows)
+    dates = (pd.Timestamp("2010-01-01") + pd.to_timedelta(days, unit="D")).strftime("%Y-%m-%d")
+    registry.loc[dated, "data_entrada"] = dates[dated]
+    registry.to_csv(path, index=False)
+
+
+def whole_file(path):
+    """The original approach: everything in memory, then the index."""
+    energy = pd.read_csv(path)
+    energy["data_entrada"] = pd.to_datetime(energy["data_entrada"], errors="coerce")
+    energy["year"] = energy["data_entrada"].dt.year
+    return TemporalIndex.build(energy, "census_tract", "year", CERT_COLS)
+
+
+def streamed(path):
+    return TemporalIndex.build(read_certificates(path), "census_tract", "year", CERT_COLS)
+
+
+def memory_kb(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field + ":"))
+
+
+def measure(name, path):
+    """(seconds, peak memory, index rows, energy features of the rentals) in this process."""
+    fn = {"whole file": whole_file, "streamed": streamed}[name]
+    rent = read_table("girona_for_rent_combined_clean")
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")  # resets the peak RSS (VmHWM) to the current one
+    before = memory_kb("VmRSS")
+    start = time.perf_counter()
+    index = fn(path)
+    elapsed = time.perf_counter() - start
+    peak = (memory_kb("VmHWM") - before) * 1024
+    return elapsed, peak, len(index.years), energy_features(rent, index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--outside", type=float, default=0.9, help="share of certificates outside Girona")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "registry.csv")
+        synthetic_registry(path, args.rows, args.outside, np.random.default_rng(42))
+        size_mb = os.path.getsize(path) / 1e6
+
+        results = {}
+        for name in ["whole file", "streamed"]:
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                results[name] = pool.submit(measure, name, path).result()
+
+    print(f"Registry: {args.rows} rows, {size_mb:.0f} MB")
+    for name, (elapsed, peak, rows, _) in results.items():
+        print(f"{name:<11} {elapsed:6.2f} s, peak {peak / 1e6:7.1f} MB, index rows {rows}")
+    same = results["whole file"][3].equals(results["streamed"][3])
+    print("✔ same energy features for every rental" if same else "✘ energy features differ")
+
+
+if __name__ == "__main__":
+    main()
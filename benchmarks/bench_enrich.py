@@ -0,0 +1,80 @@
+"""
+bench_enrich.py
+
+Compares the chained enrichment scripts (energy -> services -> socio -> final, each reading and
+writing a full interim table) with the fused in-memory enrich() on the same geocoded rentals.
+
+Each mode runs in a fresh Python process so peak RSS is measured separately; the final tables
+of both modes are then compared column for column.
+
+    python benchmarks/bench_enrich.py [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import resource
+import runpy
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+CHAINED_SCRIPTS = ["merge_energy_certificates.py", "merge_services_radius.py",
+                   "merge_sociodemographic.py", "merge_final.py"]
+
+
+def run_mode(mode):
+    """Runs one mode in this process and prints wall time and peak RSS as JSON."""
+    import storage
+    from enrich import enrich, load_sources
+
+    start = time.perf_counter()
+    if mode == "chained":
+        for script in CHAINED_SCRIPTS:
+            sys.argv = [script]
+            runpy.run_path(os.path.join(SRC_DIR, script), run_name="__main__")
+    else:
+        rent = storage.read_table("girona_for_rent_combined_clean")
+        storage.write_table(enrich(rent, load_sources()), "girona_for_rent_final")
+    elapsed = time.perf_counter() - start
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"mode": mode, "wall_s": elapsed, "peak_rss_mb": peak_mb}))
+
+
+def measure(mode, repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, __file__, "--child", mode], capture_output=True, text=True,
+                             env={**os.environ, "INTERIM_CSV": "0"}, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    final = pd.read_parquet(os.path.join(SRC_DIR, "..", "data", "interim", "girona_for_rent_final.parquet"))
+    return min(r["wall_s"] for r in runs), max(r["peak_rss_mb"] for r in runs), final
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", choices=["chained", "fused"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_mode(args.child)
+        return
+
+    results = {mode: measure(mode, args.repeat) for mode in ["chained", "fused"]}
+    print(f"{'mode':<10}{'wall (s)':>10}{'peak RSS (MB)':>16}")
+    for mode, (wall, rss, _) in results.items():
+        print(f"{mode:<10}{wall:>10.3f}{rss:>16.1f}")
+
+    pd.testing.assert_frame_equal(results["chained"][2], results["fused"][2])
+    print(f"✔ Same final table in both modes ({results['fused'][2].shape[1]} columns)")
+
+
+if __name__ == "__main__":
+    main()
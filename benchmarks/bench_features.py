@@ -0,0 +1,84 @@
+"""
+bench_features.py
+
+Feature assembly for new listings with features.FeatureAssembler:
+
+- checks that assemble_one() (one listing at a time) and assemble() (all at once) give the
+  same model feature rows as the batch pipeline's girona_for_rent_final for the geocoded
+  rentals (run the pipeline first);
+- reports the load time of the assembler, p50 / p99 latency of assemble_one() and the
+  throughput of assemble().
+
+    python benchmarks/bench_features.py [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from enrich import METRIC  # noqa: E402
+from features import LISTING_COLUMNS, FeatureAssembler  # noqa: E402
+from schema import apply_schema  # noqa: E402
+from storage import read_table  # noqa: E402
+
+
+def mismatches(rows, expected):
+    """Columns where `rows` and `expected` differ (NaN == NaN), with the number of rows."""
+    diff = {}
+    for col in expected.columns:
+        got, exp = rows[col].astype(object), expected[col].astype(object)
+        same = (got == exp) | (got.isna() & exp.isna())
+        if not same.all():
+            diff[col] = int((~same).sum())
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    # Metric of the batch pipeline, which built the expected rows
+    assembler = FeatureAssembler.load(metric=METRIC)
+    load_s = time.perf_counter() - start
+
+    listings = read_table("girona_for_rent_combined_clean")[LISTING_COLUMNS]
+    expected = read_table("girona_for_rent_final")[assembler.features]
+    records = listings.to_dict("records")
+
+    times = np.empty(len(records))
+    rows = []
+    for i, listing in enumerate(records):
+        t = time.perf_counter()
+        rows.append(assembler.assemble_one(listing))
+        times[i] = time.perf_counter() - t
+    times *= 1e6
+
+    batch_s = []
+    for _ in range(args.repeat):
+        t = time.perf_counter()
+        batch = assembler.assemble(listings)
+        batch_s.append(time.perf_counter() - t)
+
+    # Stored with the types of schema.py (float32 measurements)
+    one_diff = mismatches(apply_schema(pd.DataFrame(rows, index=listings.index)), expected)
+    batch_diff = mismatches(apply_schema(batch), expected)
+
+    print(f"Assembler load: {load_s:.2f} s")
+    print(f"assemble_one ({len(records)} listings): p50 {np.percentile(times, 50):.0f} us, "
+          f"p99 {np.percentile(times, 99):.0f} us")
+    print(f"assemble: {len(listings) / min(batch_s):.0f} listings/s")
+    for name, diff in [("assemble_one", one_diff), ("assemble", batch_diff)]:
+        print(f"✔ {name} matches girona_for_rent_final" if not diff else f"✘ {name} differs: {diff}")
+
+
+if __name__ == "__main__":
+    main()
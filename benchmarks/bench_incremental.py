@@ -0,0 +1,101 @@
+"""
+bench_incremental.py
+
+Incremental refresh (incremental.update) against a full rebuild, on the listings of
+data/initial repeated --copies times (each copy with its own ids and the coordinates moved
+up to ~100 m).
+
+- The previous run saw the same listings without the last --new ones, with --changed
+  listings at another price and --removed listings that are gone now.
+- Times the full rebuild and the incremental run from the previous state, and checks that
+  the geocoded table, the final table and the Leaflet view are identical.
+- Geocoding goes through a temporary cache (warmed by the previous run), so
+  data/cache/geocode_cache.sqlite is not touched.
+
+    python benchmarks/bench_incremental.py [--copies 20] [--new 50] [--changed 20] [--removed 10]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from create_view import leaflet_view  # noqa: E402
+from geocode_cache import GeocodeCache  # noqa: E402
+from girona_for_rent_combined import GEOCODE_PRECISION, GPKG_FILE, load_listings  # noqa: E402
+from incremental import update  # noqa: E402
+from schema import apply_schema  # noqa: E402
+
+
+def synthetic_market(listings, copies, rng):
+    """The listings `copies` times, every copy with its own synthetic ids and moved points."""
+    out = [listings]
+    for i in range(1, copies):
+        copy = listings.copy()
+        copy["synthetic_id"] = f"copy{i}-" + pd.Series(np.arange(len(copy)), index=copy.index).astype(str)
+        copy["lat"] += rng.uniform(-0.0009, 0.0009, len(copy))
+        copy["lon"] += rng.uniform(-0.0012, 0.0012, len(copy))
+        out.append(copy)
+    return pd.concat(out, ignore_index=True)
+
+
+def previous_listings(current, new, changed, removed, rng):
+    """What the previous run saw: no `new` last listings, other prices, listings gone since."""
+    previous = current.iloc[:len(current) - new].copy()
+    rows = rng.choice(len(previous), changed, replace=False)
+    previous.loc[previous.index[rows], "price"] += 50
+    gone = previous.sample(removed, random_state=rng.integers(1 << 31)).copy()
+    gone["synthetic_id"] = "gone-" + pd.Series(np.arange(removed), index=gone.index).astype(str)
+    return pd.concat([previous, gone], ignore_index=True)
+
+
+def same_tables(a, b):
+    return apply_schema(a).equals(apply_schema(b))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--new", type=int, default=50)
+    parser.add_argument("--changed", type=int, default=20)
+    parser.add_argument("--removed", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    current = synthetic_market(load_listings(), args.copies, rng)
+    previous = previous_listings(current, args.new, args.changed, args.removed, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GeocodeCache(os.path.join(tmp, "geocode.sqlite"), GPKG_FILE, precision=GEOCODE_PRECISION)
+        _, _, state, _ = update(previous, cache=cache)
+
+        start = time.perf_counter()
+        full_geocoded, full_final, _, _ = update(current, cache=cache)
+        full_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        geocoded, final, _, changes = update(current, state, cache=cache)
+        incremental_s = time.perf_counter() - start
+
+    print(f"{len(current)} listings ({len(full_final)} with a section)")
+    print(f"full rebuild      {full_s:6.2f} s")
+    print(f"incremental       {incremental_s:6.2f} s  ({changes['enriched']} enriched, {changes['changed']} changed, "
+          f"{changes['removed']} removed)")
+    checks = [
+        ("geocoded table", same_tables(full_geocoded, geocoded)),
+        ("final table", same_tables(full_final, final)),
+        ("Leaflet view", leaflet_view(full_geocoded).equals(leaflet_view(geocoded))),
+    ]
+    for name, same in checks:
+        print(f"✔ same {name} as the full rebuild" if same else f"✘ {name} differs from the full rebuild")
+
+
+if __name__ == "__main__":
+    main()
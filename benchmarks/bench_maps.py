@@ -0,0 +1,109 @@
+"""
+bench_maps.py
+
+Size and load time of the map geometry: the three GeoJSON files written by maps.py against
+each TopoJSON level of data/topojson (all three layers in one file).
+
+- size: bytes on disk and gzipped (what a browser downloads with compression on);
+- load: JSON parse of the GeoJSON files vs JSON parse + decode of the TopoJSON into the same
+  GeoJSON features (topology.decode), best of --repeat;
+- geometry: vertices, max distance to the original borders (Hausdorff, meters) and area
+  difference of each layer.
+
+Run maps.py first.
+
+    python benchmarks/bench_maps.py [--repeat 20]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import geopandas as gpd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from topology import ZOOM_LEVELS, decode, decode_arcs, decode_geoseries, level_name  # noqa: E402
+
+DATA_DIR = os.path.join(SRC_DIR, "..", "data")
+GEOJSON = {
+    "seccions": os.path.join(DATA_DIR, "seccions_girona_union.geojson"),
+    "barris": os.path.join(DATA_DIR, "barris_girona.geojson"),
+    "sectors": os.path.join(DATA_DIR, "sectors_girona.geojson"),
+}
+TOPOJSON = {level_name(z): os.path.join(DATA_DIR, "topojson", f"girona_{level_name(z)}.topojson")
+            for z in [None, *reversed(ZOOM_LEVELS)]}
+
+
+def sizes(paths):
+    raw = gz = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        raw += len(content)
+        gz += len(gzip.compress(content))
+    return raw, gz
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def load_geojson():
+    for path in GEOJSON.values():
+        with open(path, encoding="utf-8") as f:
+            json.load(f)
+
+
+def load_topojson(path):
+    def load():
+        with open(path, encoding="utf-8") as f:
+            topology = json.load(f)
+        arcs = decode_arcs(topology)
+        for name in topology["objects"]:
+            decode(topology, name, arcs)
+    return load
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    raw, gz = sizes(GEOJSON.values())
+    base_ms = best_time(load_geojson, args.repeat) * 1000
+    print(f"{'file':<16}{'KB':>9}{'gzip KB':>9}{'load ms':>9}{'vertices':>10}")
+    print(f"{'geojson (x3)':<16}{raw / 1024:>9.1f}{gz / 1024:>9.1f}{base_ms:>9.2f}")
+
+    originals = {name: gpd.read_file(path).to_crs(25831) for name, path in GEOJSON.items()}
+    checks = []
+    for level, path in TOPOJSON.items():
+        raw, gz = sizes([path])
+        load_ms = best_time(load_topojson(path), args.repeat) * 1000
+        with open(path, encoding="utf-8") as f:
+            topology = json.load(f)
+        vertices = sum(len(arc) for arc in topology["arcs"])
+        print(f"{level:<16}{raw / 1024:>9.1f}{gz / 1024:>9.1f}{load_ms:>9.2f}{vertices:>10}")
+
+        for name, original in originals.items():
+            decoded = gpd.GeoSeries(decode_geoseries(topology, name), crs="EPSG:4326").to_crs(25831)
+            hausdorff = max(a.hausdorff_distance(b) for a, b in zip(original.geometry, decoded))
+            area = decoded.make_valid().union_all().area / original.union_all().area - 1
+            checks.append((level, name, hausdorff, area))
+
+    print(f"\n{'level':<8}{'layer':<10}{'hausdorff m':>12}{'area diff':>11}")
+    for level, name, hausdorff, area in checks:
+        print(f"{level:<8}{name:<10}{hausdorff:>12.2f}{area:>11.1e}")
+
+
+if __name__ == "__main__":
+    main()
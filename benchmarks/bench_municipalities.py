@@ -0,0 +1,114 @@
+"""
+bench_municipalities.py
+
+Per-municipality sharding (municipalities.py) on a synthetic province: each district of Girona
+becomes a municipality (codes 17901, 17902, ...), so the municipalities share real, irregular
+borders.
+
+- Points: synthetic listings of synthetic_data.py (--listings, 20% around the city) plus
+  --border points within ~1 m of the vertices of the municipal borders.
+- Checks that assign_districts_sharded gives the same sections as assign_districts over the
+  whole layer (and how many points fall in the bounding box of several municipalities), and
+  that services_municipalities gives the same features as services_features.
+- Times both for each number of workers (process pool, sources loaded once per worker) and
+  the speedup over one worker. The speedup is bounded by the CPUs of the machine and by the
+  largest municipality (district 2 has ~1/3 of the listings).
+
+    python benchmarks/bench_municipalities.py [--listings 200000] [--workers 1,2,4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from assign_section import assign_districts, seccions  # noqa: E402
+from enrich import load_services_index, services_features, services_municipalities  # noqa: E402
+from municipalities import assign_districts_sharded, municipality_of  # noqa: E402
+from synthetic_data import synthetic_listings  # noqa: E402
+
+BORDER_JITTER_M = 1.0
+
+
+def synthetic_province():
+    """Sections of Girona (WGS84) with one municipality per district."""
+    province = seccions.copy()
+    codes = "17" + (900 + province["DISTRICTE"].astype(int)).astype(str)
+    province["census_tract_INE"] = codes + province["district_id"] + province["section_id"]
+    return province
+
+
+def border_points(province, n, rng):
+    """(lat, lon) of n points around the vertices shared by two municipalities."""
+    projected = province.to_crs(epsg=25831)
+    municipalities = projected.dissolve(by=municipality_of(projected["census_tract_INE"])).geometry
+    boundaries = [shapely.boundary(geom) for geom in municipalities]
+    shared = shapely.union_all([a.intersection(b) for i, a in enumerate(boundaries) for b in boundaries[i + 1:]])
+    vertices = shapely.get_coordinates(shared)
+    picked = vertices[rng.integers(0, len(vertices), n)] + rng.normal(0, BORDER_JITTER_M, (n, 2))
+    points = gpd.GeoSeries(gpd.points_from_xy(picked[:, 0], picked[:, 1]), crs=projected.crs).to_crs(epsg=4326)
+    return points.y.to_numpy(), points.x.to_numpy()
+
+
+def boxes_per_point(province, lats, lons):
+    """Number of municipality bounding boxes containing each point."""
+    bounds = province.geometry.bounds.groupby(municipality_of(province["census_tract_INE"])).agg(
+        {"minx": "min", "miny": "min", "maxx": "max", "maxy": "max"})
+    return sum(((lons >= b.minx) & (lons <= b.maxx) & (lats >= b.miny) & (lats <= b.maxy)).astype(int)
+               for b in bounds.itertuples())
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=200_000)
+    parser.add_argument("--border", type=int, default=20_000, help="extra points on the municipal borders")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    province = synthetic_province()
+    listings = synthetic_listings(args.listings, rng)
+    border_lat, border_lon = border_points(province, args.border, rng)
+    lats = np.concatenate([listings["lat"].to_numpy(), border_lat])
+    lons = np.concatenate([listings["lon"].to_numpy(), border_lon])
+
+    expected, single = timed(lambda: assign_districts(lats, lons, province))
+    rent = pd.DataFrame({"lat": lats, "lon": lons, "year_available": 2024,
+                         "census_tract_INE": expected["census_tract_INE"]}).dropna().reset_index(drop=True)
+    services_expected, services_single = timed(lambda: services_features(rent, load_services_index()))
+
+    shards = pd.Series(municipality_of(rent["census_tract_INE"])).value_counts()
+    shared = boxes_per_point(province, lats, lons) > 1
+    print(f"{len(lats)} points ({args.border} on borders), {len(rent)} in {len(shards)} municipalities "
+          f"(largest {shards.iloc[0] / len(rent):.0%}), {shared.sum()} in several bounding boxes, "
+          f"{os.cpu_count()} CPUs")
+    print(f"single process: assign_districts {single:.2f} s, services_features (index built) {services_single:.2f} s")
+    print(f"{'workers':>8}{'assign (s)':>12}{'speedup':>9}{'services (s)':>14}{'speedup':>9}  same result")
+
+    base = None
+    for workers in map(int, args.workers.split(",")):
+        assigned, t_assign = timed(lambda: assign_districts_sharded(lats, lons, province, workers=workers))
+        services, t_services = timed(lambda: services_municipalities(rent, workers=workers))
+        base = base or (t_assign, t_services)
+        same = assigned.equals(expected) and services.equals(services_expected)
+        print(f"{workers:>8}{t_assign:>12.2f}{base[0] / t_assign:>9.2f}{t_services:>14.2f}"
+              f"{base[1] / t_services:>9.2f}  {'✔' if same else '✘'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+bench_predict.py
+
+Prediction latency of the saved rent model (models/rent_elasticnet.joblib, see src/model.py):
+
+- single listing: p50 / p99 of the compiled fast path (predict.LinearRentModel.predict_one)
+  against the sklearn pipeline on a one-row DataFrame;
+- batch: rows per second of predict_batch against pipeline.predict on the whole dataset.
+
+Both paths are checked to give the same predictions first.
+
+    python benchmarks/bench_predict.py [--calls 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from model import DATA_CSV, FEATURES, load_model  # noqa: E402
+from predict import LinearRentModel  # noqa: E402
+
+
+def latencies_us(fn, rows):
+    times = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        fn(row)
+        times[i] = time.perf_counter() - start
+    return times * 1e6
+
+
+def best_rate(fn, n_rows, repeat=5):
+    best = min(_timed(fn) for _ in range(repeat))
+    return n_rows / best
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000, help="single-listing calls per path")
+    args = parser.parse_args()
+
+    pipeline = load_model()
+    model = LinearRentModel(pipeline)
+    data = pd.read_csv(DATA_CSV)[FEATURES]
+
+    diff = np.abs(model.predict_batch(data) - pipeline.predict(data)).max()
+    print(f"Max difference with pipeline.predict: {diff:.2e}")
+
+    sample = data.sample(args.calls, replace=True, random_state=0)
+    records = sample.to_dict("records")
+    frames = [sample.iloc[[i]] for i in range(len(sample))]
+
+    fast = latencies_us(model.predict_one, records)
+    slow = latencies_us(pipeline.predict, frames)
+
+    print(f"\nSingle listing ({args.calls} calls)")
+    print(f"{'path':<22}{'p50 (us)':>12}{'p99 (us)':>12}")
+    for name, t in [("fast path", fast), ("sklearn pipeline", slow)]:
+        print(f"{name:<22}{np.percentile(t, 50):>12.1f}{np.percentile(t, 99):>12.1f}")
+
+    print(f"\nBatch ({len(data)} rows)")
+    print(f"{'path':<22}{'rows/s':>12}")
+    print(f"{'predict_batch':<22}{best_rate(lambda: model.predict_batch(data), len(data)):>12.0f}")
+    print(f"{'sklearn pipeline':<22}{best_rate(lambda: pipeline.predict(data), len(data)):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+bench_scenarios.py
+
+What-if scenario grid (scenarios.ScenarioGrid) against the notebook approach (one dict per
+scenario, then pipeline.predict on the DataFrame):
+
+- checks that the grid predictions match pipeline.predict() on a sample of scenarios;
+- reports the throughput of both (the notebook approach on the first --sample scenarios)
+  and the time and peak memory (tracemalloc) of streaming the whole grid to Parquet.
+
+    python benchmarks/bench_scenarios.py [--area-step 0.1] [--chunk-size 1000000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from model import load_model  # noqa: E402
+from predict import LinearRentModel  # noqa: E402
+from scenarios import DEFAULTS, ScenarioGrid  # noqa: E402
+
+
+def notebook_rows(grid, start, stop):
+    """Scenarios [start, stop) built like the notebook: a copy of the defaults per row."""
+    chunk = grid.predict_chunk(start, stop).drop(columns=["predicted_price", "barri_oficial"])
+    rows = []
+    for values in chunk.astype(object).to_dict("records"):
+        row = DEFAULTS.copy()
+        row.update(values)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--area-step", type=float, default=0.1, help="m² between areas (smaller = bigger grid)")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--sample", type=int, default=20_000, help="scenarios for the notebook approach")
+    args = parser.parse_args()
+
+    pipeline = load_model()
+    axes = {
+        "sector_oficial": "all",
+        "area": {"start": 20, "stop": 150, "step": args.area_step},
+        "rooms": [1, 2, 3, 4, 5],
+        "qual_energia": "all",
+        "elevator": [True, False],
+        "year_available": [2024, 2025, 2026],
+    }
+    grid = ScenarioGrid(LinearRentModel(pipeline), axes)
+
+    start = time.perf_counter()
+    X = notebook_rows(grid, 0, args.sample)
+    expected = pipeline.predict(X)
+    notebook_s = time.perf_counter() - start
+    diff = np.abs(grid.predict_chunk(0, args.sample)["predicted_price"].to_numpy() - expected).max()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scenarios.parquet")
+        tracemalloc.start()
+        start = time.perf_counter()
+        grid.to_parquet(path, args.chunk_size)
+        grid_s = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        size_mb = os.path.getsize(path) / 1e6
+
+    print(f"Grid: {' x '.join(map(str, grid.shape))} = {grid.size} scenarios")
+    print(f"notebook approach: {args.sample / notebook_s:,.0f} scenarios/s ({args.sample} scenarios)")
+    print(f"ScenarioGrid -> Parquet: {grid.size / grid_s:,.0f} scenarios/s, {grid_s:.2f} s, "
+          f"peak memory {peak / 1e6:.0f} MB, file {size_mb:.0f} MB")
+    print(f"✔ matches pipeline.predict (max diff {diff:.1e})" if diff < 1e-6 else f"✘ max diff {diff}")
+
+
+if __name__ == "__main__":
+    main()
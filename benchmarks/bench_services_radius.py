@@ -0,0 +1,86 @@
+"""
+bench_services_radius.py
+
+Times the services radius stage for each distance metric of ServicesIndex, plus the
+original per-rental buffer/within() approach on a small sample for reference.
+
+Rentals are the geocoded listings in data/interim/girona_for_rent_with_energy.csv,
+replicated with a small random jitter up to the requested size.
+
+    python benchmarks/bench_services_radius.py --rentals 100000 --repeat 3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from services_index import CATEGORIES, METRICS, ServicesIndex  # noqa: E402
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+RENT_CSV = os.path.join(data_dir, "interim", "girona_for_rent_with_energy.csv")
+SERVICES_CSV = os.path.join(data_dir, "initial", "girona_services.csv")
+
+
+def sample_rentals(n, seed=0):
+    rent = pd.read_csv(RENT_CSV, usecols=["lat", "lon"])
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(rent), n)
+    return (rent["lat"].values[idx] + rng.normal(0, 5e-4, n),
+            rent["lon"].values[idx] + rng.normal(0, 5e-4, n))
+
+
+def legacy_buffer_within(lats, lons, services, radius_m):
+    """The original merge_services_radius.py loop (EPSG:3857 buffers)."""
+    rent_gdf = gpd.GeoSeries(gpd.points_from_xy(lons, lats), crs="EPSG:4326").to_crs(epsg=3857)
+    services_gdf = gpd.GeoDataFrame(
+        services, geometry=gpd.points_from_xy(services.lon, services.lat), crs="EPSG:4326"
+    ).to_crs(epsg=3857)
+    for point in rent_gdf:
+        within_buffer = services_gdf[services_gdf.geometry.within(point.buffer(radius_m))]
+        for cat in CATEGORIES:
+            within_buffer[within_buffer["category"] == cat].shape[0]
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rentals", type=int, default=100_000)
+    parser.add_argument("--radii", type=int, nargs="+", default=[500])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--legacy-sample", type=int, default=200,
+                        help="rentals timed with the original per-row loop (0 to skip)")
+    args = parser.parse_args()
+
+    services = pd.read_csv(SERVICES_CSV)
+    lats, lons = sample_rentals(args.rentals)
+    print(f"{args.rentals} rentals, {len(services)} services, radii {args.radii}")
+    print(f"{'metric':<12}{'build (s)':>12}{'query (s)':>12}{'rentals/s':>14}")
+
+    for metric in METRICS:
+        build = best_of(lambda: ServicesIndex(services, metric=metric), args.repeat)
+        index = ServicesIndex(services, metric=metric)
+        query = best_of(lambda: index.query(lats, lons, radii=args.radii), args.repeat)
+        print(f"{metric:<12}{build:>12.4f}{query:>12.4f}{args.rentals / query:>14,.0f}")
+
+    if args.legacy_sample:
+        n = args.legacy_sample
+        legacy = best_of(lambda: legacy_buffer_within(lats[:n], lons[:n], services, args.radii[0]), 1)
+        print(f"{'legacy loop':<12}{'':>12}{legacy:>12.4f}{n / legacy:>14,.0f}  ({n} rentals)")
+
+
+if __name__ == "__main__":
+    main()
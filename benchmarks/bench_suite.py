@@ -0,0 +1,213 @@
+"""
+bench_suite.py
+
+Time and memory of every pipeline stage at production scales, on synthetic markets of
+synthetic_data.py (10k / 100k / 1M listings by default), saved as JSON to compare commits.
+
+- Stages, run in order on the output of the previous one: assign_districts (section of every
+  listing), energy (certificates read, index built, lookup), services (ServicesIndex built
+  and queried), socio, sector, create_view, clean (fit + apply), model_fit (the ElasticNet
+  pipeline of model.py on the cleaned listings with every feature, notebook split) and
+  model_predict (the training split: the one-hot encoder of model.py rejects categories it
+  has not seen, e.g. a sector only in the test split).
+- For each stage: wall time, peak RSS while it runs above the RSS before it (Linux), and the
+  rows in and out. Data generation is not timed.
+- Results go to data/results/bench_suite_<commit>.json (commit, date, machine and one record
+  per scale and stage); `--compare` prints the ratios against a previous results file.
+
+    python benchmarks/bench_suite.py [--scales 10000,100000,1000000] [--stages energy,services]
+                                     [--compare data/results/bench_suite_<commit>.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import clean  # noqa: E402
+from assign_section import assign_districts  # noqa: E402
+from create_view import leaflet_view  # noqa: E402
+from enrich import (RADII_M, append_columns, build_energy_index, build_socio_index, energy_features,  # noqa: E402
+                    load_sectors, sector_features, services_features, socio_features)
+from girona_for_rent_combined import REQUIRED_COLUMNS  # noqa: E402
+from model import FEATURES, build_pipeline, split  # noqa: E402
+from services_index import CATEGORIES, ServicesIndex  # noqa: E402
+from synthetic_data import generate  # noqa: E402
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RESULTS_DIR = os.path.join(base_dir, "data", "results")
+
+SCALES = [10_000, 100_000, 1_000_000]
+STAGES = ["assign_districts", "energy", "services", "socio", "sector", "create_view", "clean",
+          "model_fit", "model_predict"]
+
+
+# =========================
+# MEASUREMENT
+# =========================
+def memory_kb(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field + ":"))
+
+
+def measure(fn):
+    """(result, seconds, peak RSS above the RSS before, in MB)."""
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")  # resets the peak RSS (VmHWM) to the current one
+    before = memory_kb("VmRSS")
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    return result, elapsed, (memory_kb("VmHWM") - before) / 1024
+
+
+# =========================
+# STAGES
+# =========================
+def stage_functions(market, tmp):
+    """Stage name -> function(previous output) -> output, for one synthetic market."""
+    certificates_csv = os.path.join(tmp, "girona_energy_certificates.csv")
+    market["girona_energy_certificates"].to_csv(certificates_csv, index=False)
+    sectors = load_sectors()
+    state = {}
+
+    def geocode(listings):
+        districts = assign_districts(listings["lat"].values, listings["lon"].values)
+        rent = pd.concat([listings, districts], axis=1).dropna(subset=REQUIRED_COLUMNS)
+        state["geocoded"] = rent.reset_index(drop=True)
+        return state["geocoded"]
+
+    def energy(rent):
+        return append_columns(rent, energy_features(rent, build_energy_index(certificates_csv)))
+
+    def services(rent):
+        index = ServicesIndex(market["girona_services"], categories=CATEGORIES)
+        return append_columns(rent, services_features(rent, index, RADII_M))
+
+    def socio(rent):
+        return append_columns(rent, socio_features(rent, build_socio_index()))
+
+    def sector(rent):
+        return append_columns(rent, sector_features(rent, sectors))
+
+    def view(rent):
+        leaflet_view(state["geocoded"])
+        return rent
+
+    def cleaning(rent):
+        return clean.apply(rent, clean.fit(rent))
+
+    def model_fit(cleaned):
+        # A few synthetic points fall in tracts without sociodemographic data for their year
+        cleaned = cleaned.dropna(subset=FEATURES)
+        X_train, _, y_train, _ = split(cleaned)
+        state["X_train"] = X_train
+        return build_pipeline().fit(X_train, y_train)
+
+    def model_predict(model):
+        return model.predict(state["X_train"])
+
+    return {
+        "assign_districts": geocode, "energy": energy, "services": services, "socio": socio,
+        "sector": sector, "create_view": view, "clean": cleaning, "model_fit": model_fit,
+        "model_predict": model_predict,
+    }
+
+
+def run_scale(n, stages, seed):
+    market = generate(n, seed)
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        functions = stage_functions(market, tmp)
+        data = market["girona_for_rent_synthetic"]
+        for name in STAGES:
+            rows_in = len(data)
+            data, elapsed, peak_mb = measure(lambda: functions[name](data))
+            if name not in stages:
+                continue
+            records.append({
+                "scale": n, "stage": name, "rows_in": rows_in,
+                "rows_out": len(data) if hasattr(data, "shape") else None,  # not for the fitted model
+                "wall_s": round(elapsed, 4), "peak_rss_mb": round(peak_mb, 1),
+            })
+            print(f"{n:>9} {name:<18}{elapsed:>9.3f} s{peak_mb:>9.1f} MB")
+    return records
+
+
+# =========================
+# RESULTS
+# =========================
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=base_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    old = {(r["scale"], r["stage"]): r for r in previous["results"]}
+    print(f"\nvs {previous['commit']} ({os.path.basename(previous_path)}): ratio new / old")
+    print(f"{'scale':>9} {'stage':<18}{'wall':>8}{'peak RSS':>10}")
+    for r in current["results"]:
+        o = old.get((r["scale"], r["stage"]))
+        if o is None:
+            continue
+        wall = r["wall_s"] / o["wall_s"] if o["wall_s"] else float("nan")
+        rss = r["peak_rss_mb"] / o["peak_rss_mb"] if o["peak_rss_mb"] > 0 else float("nan")
+        print(f"{r['scale']:>9} {r['stage']:<18}{wall:>8.2f}{rss:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="comma-separated listing counts")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated, recorded stages "
+                        "(the ones before them still run to produce their input)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="results file (default: data/results/bench_suite_<commit>.json)")
+    parser.add_argument("--compare", help="previous results file")
+    args = parser.parse_args()
+
+    stages = args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    commit = git_commit()
+    print(f"{'scale':>9} {'stage':<18}{'wall':>11}{'peak RSS':>12}")
+    results = []
+    for n in map(int, args.scales.split(",")):
+        results += run_scale(n, stages, args.seed)
+
+    report = {
+        "commit": commit,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count(), "pandas": pd.__version__},
+        "seed": args.seed,
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"bench_suite_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✔ Results saved to: {out}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
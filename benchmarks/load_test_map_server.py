@@ -0,0 +1,164 @@
+"""
+load_test_map_server.py
+
+Load test of map_server.py: starts the server on a free port, then --clients concurrent
+keep-alive clients (asyncio) send random map queries for --duration seconds:
+
+- listings in a random viewport (zoom 13-16 around Girona), sometimes with year, price range
+  or barri filters;
+- a layer (barris / sectors / seccions) for the same viewport and zoom;
+- with --revalidate, a share of the requests repeats a previous one with its ETag
+  (If-None-Match), as a browser revalidating its cache does.
+
+All requests accept gzip. Reports requests/s and p50 / p99 latency, overall and per kind.
+
+    python benchmarks/load_test_map_server.py [--clients 32] [--duration 10] [--revalidate 0.5]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from map_server import LISTINGS_CSV  # noqa: E402
+
+CENTER = (2.8214, 41.9794)  # lon, lat
+LAYERS = ["barris", "sectors", "seccions"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def random_query(rng, barris, years):
+    """(kind, path) of a random map request."""
+    zoom = rng.randint(13, 16)
+    half_w, half_h = 360 / 2 ** zoom * 2, 180 / 2 ** zoom * 2  # about the size of a screen
+    lon = CENTER[0] + rng.uniform(-0.02, 0.02)
+    lat = CENTER[1] + rng.uniform(-0.015, 0.015)
+    bbox = f"{lon - half_w:.5f},{lat - half_h:.5f},{lon + half_w:.5f},{lat + half_h:.5f}"
+
+    if rng.random() < 0.3:
+        return "layer", f"/layers/{rng.choice(LAYERS)}?" + urlencode({"bbox": bbox, "zoom": zoom})
+    params = {"bbox": bbox}
+    if rng.random() < 0.5:
+        params["year"] = rng.choice(years)
+    if rng.random() < 0.3:
+        low = rng.choice([400, 600, 800, 1000])
+        params["min_price"], params["max_price"] = low, low + rng.choice([300, 600, 1000])
+    if rng.random() < 0.2:
+        params["barri"] = rng.choice(barris)
+    return "listings", "/listings?" + urlencode(params)
+
+
+async def request(reader, writer, path, etag=None):
+    """(status, etag) of one GET on an open keep-alive connection."""
+    lines = [f"GET {path} HTTP/1.1", "Host: localhost", "Accept-Encoding: gzip"]
+    if etag:
+        lines.append(f"If-None-Match: {etag}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("etag")
+
+
+async def client(port, seed, deadline, revalidate, barris, years, results):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    seen = []  # (path, etag) of earlier responses
+    try:
+        while time.perf_counter() < deadline:
+            if seen and rng.random() < revalidate:
+                (kind, path), etag = rng.choice(seen)
+                kind = "revalidate"
+            else:
+                (kind, path), etag = random_query(rng, barris, years), None
+            start = time.perf_counter()
+            status, new_etag = await request(reader, writer, path, etag)
+            results.append((kind, status, time.perf_counter() - start))
+            if status == 200:
+                seen.append(((kind, path), new_etag))
+    finally:
+        writer.close()
+
+
+async def wait_ready(port, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            status, _ = await request(reader, writer, "/health")
+            writer.close()
+            if status == 200:
+                return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("map_server did not start")
+
+
+async def run(port, args, barris, years):
+    await wait_ready(port)
+    results = []
+    deadline = time.perf_counter() + args.duration
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(port, seed, deadline, args.revalidate, barris, years, results) for seed in range(args.clients)
+    ])
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent connections")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--revalidate", type=float, default=0.0,
+                        help="share of requests repeating an earlier one with If-None-Match")
+    args = parser.parse_args()
+
+    view = pd.read_csv(LISTINGS_CSV)
+    barris = sorted(view["barri_oficial"].dropna().unique().tolist())
+    years = sorted(view["year_available"].dropna().astype(int).unique().tolist())
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(SRC_DIR, "map_server.py"), "--port", str(port)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        results, elapsed = asyncio.run(run(port, args, barris, years))
+    finally:
+        server.terminate()
+        server.wait()
+
+    frame = pd.DataFrame(results, columns=["kind", "status", "seconds"])
+    errors = int((~frame["status"].isin([200, 304])).sum())
+    print(f"{args.clients} clients, {elapsed:.1f} s: {len(frame)} requests, "
+          f"{len(frame) / elapsed:.0f} req/s, errors: {errors}")
+    print(f"{'kind':<12}{'requests':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for kind, group in [("all", frame), *frame.groupby("kind")]:
+        ms = group["seconds"].to_numpy() * 1000
+        print(f"{kind:<12}{len(group):>10}{np.percentile(ms, 50):>9.2f}{np.percentile(ms, 99):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+synthetic_data.py
+
+Synthetic listings, services and energy certificates of Girona at any scale, with the same
+columns as the files of data/initial, to see how the pipeline behaves at production volume.
+
+- Listings: points sampled uniformly inside the census sections of
+  section_to_neighbourhood_clean.gpkg, each section weighted by the real listings it holds
+  (+1, so every section gets some), plus a share (--outside) of points anywhere in the area
+  around the city, which the geocoding drops like the real ones outside Girona. Each point
+  takes the attributes of a real listing of the same barri (any listing when the barri has
+  none), with the area and the price moved by up to ~10%; synthetic ids are gen-<n>.
+- Services: real services moved by ~150 m, as many as in data/initial: the listings are
+  spread over the same area, so the density of services does not grow with them.
+- Certificates: real certificates (same tracts and dates, 60% without a date) with the
+  surface and emissions moved by up to ~10%, as many per listing as in data/initial.
+- The sociodemographic table is per tract and year, so it does not grow with the listings;
+  the real one is used as it is.
+
+    python benchmarks/synthetic_data.py --listings 100000 [--out data/synthetic/100000] [--seed 42]
+"""
+
+import argparse
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from energy_ingest import ENERGY_CSV  # noqa: E402
+from enrich import SERVICES_CSV  # noqa: E402
+from girona_for_rent_combined import GPKG_FILE, load_listings  # noqa: E402
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+SECTIONS_LAYER = "section_to_neighbourhood"
+OUTSIDE_SHARE = 0.2
+OUTSIDE_MARGIN_M = 2000  # around the sections' bounding box
+SERVICE_JITTER_M = 150
+
+
+def load_sections():
+    # Projected (EPSG:25831, meters): uniform sampling in meters
+    return gpd.read_file(GPKG_FILE, layer=SECTIONS_LAYER).reset_index(drop=True)
+
+
+def points_in_polygon(polygon, n, rng):
+    """n points uniformly inside a (multi)polygon, by rejection in its bounding box."""
+    minx, miny, maxx, maxy = polygon.bounds
+    inside_share = polygon.area / ((maxx - minx) * (maxy - miny))
+    xs, ys = [], []
+    while n > 0:
+        m = int(n / inside_share * 1.2) + 16
+        x, y = rng.uniform(minx, maxx, m), rng.uniform(miny, maxy, m)
+        keep = shapely.contains_xy(polygon, x, y)
+        xs.append(x[keep][:n])
+        ys.append(y[keep][:n])
+        n -= len(xs[-1])
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+def to_lat_lon(x, y, crs):
+    points = gpd.GeoSeries(gpd.points_from_xy(x, y), crs=crs).to_crs(epsg=4326)
+    return points.y.to_numpy(), points.x.to_numpy()
+
+
+def listing_points(sections, weights, n, outside, rng):
+    """(lat, lon, barri of the section or None) of n points, in random order."""
+    n_outside = int(round(n * outside))
+    counts = rng.multinomial(n - n_outside, weights / weights.sum())
+    xs, ys, barris = [], [], []
+    for geom, barri, count in zip(sections.geometry, sections["BARRIS"], counts):
+        if count:
+            x, y = points_in_polygon(geom, count, rng)
+            xs.append(x)
+            ys.append(y)
+            barris.append(np.full(count, barri, dtype=object))
+
+    minx, miny, maxx, maxy = sections.total_bounds
+    xs.append(rng.uniform(minx - OUTSIDE_MARGIN_M, maxx + OUTSIDE_MARGIN_M, n_outside))
+    ys.append(rng.uniform(miny - OUTSIDE_MARGIN_M, maxy + OUTSIDE_MARGIN_M, n_outside))
+    barris.append(np.full(n_outside, None, dtype=object))
+
+    order = rng.permutation(n)
+    lat, lon = to_lat_lon(np.concatenate(xs)[order], np.concatenate(ys)[order], sections.crs)
+    return lat, lon, np.concatenate(barris)[order]
+
+
+def real_listings_by_barri(sections):
+    """Real listings with the barri of the section containing them (None outside)."""
+    listings = load_listings()
+    lat, lon = listings["lat"].to_numpy(), listings["lon"].to_numpy()
+    x, y = gpd.GeoSeries(gpd.points_from_xy(lon, lat), crs="EPSG:4326").to_crs(sections.crs).pipe(
+        lambda s: (s.x.to_numpy(), s.y.to_numpy()))
+    point_idx, section_idx = sections.sindex.query(gpd.points_from_xy(x, y), predicate="within")
+    section = np.full(len(listings), -1)
+    section[point_idx] = section_idx
+    listings["barri"] = np.where(section >= 0, sections["BARRIS"].to_numpy()[section], None)
+    listings["section"] = section
+    return listings
+
+
+def synthetic_listings(n, rng, outside=OUTSIDE_SHARE, sections=None):
+    sections = load_sections() if sections is None else sections
+    real = real_listings_by_barri(sections)
+
+    # Sections weighted by their real listings (+1)
+    weights = np.bincount(real["section"][real["section"] >= 0], minlength=len(sections)) + 1.0
+    lat, lon, barris = listing_points(sections, weights, n, outside, rng)
+
+    # Attributes of a real listing of the same barri (any one if the barri has none)
+    rows = rng.integers(0, len(real), n)
+    by_barri = real.groupby("barri").indices
+    for barri, positions in pd.Series(np.arange(n)).groupby(barris).indices.items():
+        if barri in by_barri:
+            rows[positions] = rng.choice(by_barri[barri], len(positions))
+    out = real.iloc[rows].drop(columns=["barri", "section"]).reset_index(drop=True)
+
+    scale = rng.uniform(0.9, 1.1, n)
+    out["area"] = np.maximum(np.round(out["area"] * scale), 15).astype(int)
+    out["price"] = np.round(out["price"] * scale * rng.uniform(0.95, 1.05, n)).astype(int)
+    out["lat"], out["lon"] = lat, lon
+    out["synthetic_id"] = [f"gen-{i:07d}" for i in range(n)]
+    return out
+
+
+def synthetic_services(rng, services_csv=SERVICES_CSV):
+    real = pd.read_csv(services_csv)
+    n = len(real)
+    out = real.iloc[rng.integers(0, n, n)].reset_index(drop=True)
+    dlat = rng.normal(0, SERVICE_JITTER_M / 111_320, n)
+    out["lat"] += dlat
+    out["lon"] += rng.normal(0, SERVICE_JITTER_M / (111_320 * np.cos(np.radians(out["lat"]))), n)
+    out["id"] = np.arange(1, n + 1)
+    return out
+
+
+def synthetic_certificates(n_listings, rng, energy_csv=ENERGY_CSV):
+    real = pd.read_csv(energy_csv, dtype={"census_tract": str})
+    n = max(1, round(n_listings * len(real) / len(load_listings())))
+    out = real.iloc[rng.integers(0, len(real), n)].reset_index(drop=True)
+    for col in ["metres_cadastre", "emissions_de_co2"]:
+        out[col] = (out[col] * rng.uniform(0.9, 1.1, n)).round(2)
+    return out
+
+
+def generate(n_listings, seed=42, outside=OUTSIDE_SHARE):
+    """{name: DataFrame} with the listings, services and certificates of a market of n_listings."""
+    rng = np.random.default_rng(seed)
+    return {
+        "girona_for_rent_synthetic": synthetic_listings(n_listings, rng, outside),
+        "girona_services": synthetic_services(rng),
+        "girona_energy_certificates": synthetic_certificates(n_listings, rng),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, required=True)
+    parser.add_argument("--out", help="output directory (default: data/synthetic/<listings>)")
+    parser.add_argument("--outside", type=float, default=OUTSIDE_SHARE, help="share of points around the city")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    out_dir = args.out or os.path.join(base_dir, "data", "synthetic", str(args.listings))
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in generate(args.listings, args.seed, args.outside).items():
+        path = os.path.join(out_dir, f"{name}.csv")
+        df.to_csv(path, index=False)
+        print(f"✔ {len(df)} rows saved to: {path}")
+
+
+if __name__ == "__main__":
+    main()
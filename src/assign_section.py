@@ -1,4 +1,5 @@
 import geopandas as gpd
+import numpy as np
 from shapely.geometry import Point
 import os
 
@@ -6,7 +7,7 @@ import os
 # CONFIGURACIÓ PATH
 # =========================
 
-base_dir = os.path.abspath("..")
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 data_dir = os.path.join(base_dir, "data")
 
 GPKG_FILE = os.path.join(data_dir, "section_to_neighbourhood_clean.gpkg")
@@ -51,3 +52,48 @@ def assign_district(lat, lon):
             "census_tract_IDESCAT": None,
             "barri_oficial": None
         }
+
+
+# =========================
+# 3. Versió vectoritzada per a molts punts alhora
+# =========================
+
+# Columnes de la capa -> noms de sortida (mateix ordre que assign_district)
+DISTRICT_COLUMNS = {
+    'DISTRICTE': 'districte',
+    'SECCIÓ': 'section',
+    'district_id': 'district_id',
+    'section_id': 'section_id',
+    'census_tract_INE': 'census_tract_INE',
+    'census_tract_IDESCAT': 'census_tract_IDESCAT',
+    'BARRIS': 'barri_oficial'
+}
+
+
+def assign_districts(lats, lons, seccions=seccions):
+    """
+    Equivalent a aplicar assign_district fila a fila, però amb una sola
+    consulta a l'índex espacial (STRtree) de les seccions.
+
+    Retorna un DataFrame amb una fila per punt (mateix ordre que l'entrada) i
+    les set columnes d'assign_district. Si un punt cau dins de més d'una
+    secció es queda la primera segons l'ordre de `seccions`; si no cau dins
+    de cap, totes les columnes queden buides.
+    """
+    points = gpd.points_from_xy(lons, lats, crs="EPSG:4326")
+
+    # Parelles (punt, secció) amb point.within(secció) == secció.contains(point)
+    point_idx, section_idx = seccions.sindex.query(points, predicate='within')
+
+    # Primera coincidència per punt: ordenem per punt i després per secció
+    order = np.lexsort((section_idx, point_idx))
+    point_idx, section_idx = point_idx[order], section_idx[order]
+    _, first = np.unique(point_idx, return_index=True)
+
+    match = np.full(len(points), -1)
+    match[point_idx[first]] = section_idx[first]
+
+    # Les posicions -1 no existeixen a l'índex i queden com a files buides
+    attrs = seccions[list(DISTRICT_COLUMNS)].rename(columns=DISTRICT_COLUMNS)
+    attrs = attrs.reset_index(drop=True)
+    return attrs.reindex(match).reset_index(drop=True)
@@ -0,0 +1,186 @@
+"""
+clean.py
+
+Cleaning of the final rental dataset, from notebooks/dataCleaning.ipynb, as a pipeline
+stage whose fitted parameters are kept to clean new listings.
+
+- Imputation (same rules as the notebook): rooms, metres_cadastre, emissions_de_co2 and the
+  energy grade (A=7 ... G=1, median rounded) get the median of their sector_oficial;
+  elevator -> False, floors -> 0.
+- Outliers (same rules as the notebook): per sector, values outside
+  [Q1 - 1.5 IQR, Q3 + 1.5 IQR] of rooms, floors, emissions_de_co2, or of log1p(price),
+  log1p(area), log1p(metres_cadastre), computed after imputation. A listing is dropped if
+  any of its values is an outlier.
+- fit() computes every sector median in one groupby and every Q1 / Q3 of every column in a
+  second one; apply() imputes and flags outliers for all columns at once by aligning those
+  tables on the sector of each listing (no loop over sectors or columns).
+- The medians and bounds are saved to models/cleaning_params.json; `--apply` cleans a CSV of
+  new listings with them, without the history. Sectors unknown to the parameters get no
+  imputation and are never outliers.
+
+    python clean.py                                  fit on girona_for_rent_final, save the
+                                                     parameters and girona_for_rent_cleaned
+    python clean.py --apply new.csv --out clean.csv  clean new listings with the saved parameters
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from storage import read_table, table_path, write_table
+
+# =========================
+# CONFIGURATION PATHS
+# =========================
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PARAMS_FILE = os.path.join(base_dir, "models", "cleaning_params.json")
+
+INPUT_TABLE = "girona_for_rent_final"
+OUTPUT_TABLE = "girona_for_rent_cleaned"
+
+# =========================
+# RULES
+# =========================
+GROUP = "sector_oficial"
+MEDIAN_COLUMNS = ["rooms", "metres_cadastre", "emissions_de_co2", "qual_energia"]
+CONSTANT_FILLS = {"elevator": False, "floors": 0}
+LINEAR_IQR_COLUMNS = ["rooms", "floors", "emissions_de_co2"]
+LOG_IQR_COLUMNS = ["price", "area", "metres_cadastre"]
+IQR_FACTOR = 1.5
+
+ENERGY_GRADES = {"A": 7, "B": 6, "C": 5, "D": 4, "E": 3, "F": 2, "G": 1}
+ENERGY_GRADES_INV = {v: k for k, v in ENERGY_GRADES.items()}
+
+
+def _numeric(df):
+    """Columns with a sector median, as numbers (energy grade -> 7 ... 1)."""
+    out = df[MEDIAN_COLUMNS].copy()
+    out["qual_energia"] = df["qual_energia"].map(ENERGY_GRADES)
+    return out.astype(float)
+
+
+def _iqr_values(df):
+    """Columns checked for outliers, log1p-transformed where the notebook does it."""
+    return pd.concat([df[LINEAR_IQR_COLUMNS].astype(float), np.log1p(df[LOG_IQR_COLUMNS].astype(float))], axis=1)
+
+
+def _sectors(df):
+    # Plain labels (the typed tables store the sector as a category)
+    return df[GROUP].astype(object)
+
+
+def _by_sector(table, df, sectors=None):
+    """
+    Rows of a per-sector table aligned with the listings of `df` (NaN for unknown sectors).
+    `sectors` is pd.factorize() of the sectors of `df`, when already computed.
+    """
+    codes, sectors = pd.factorize(_sectors(df)) if sectors is None else sectors
+    rows = np.append(table.index.get_indexer(sectors), -1)[codes]  # no sector -> -1 too
+    values = np.vstack([table.to_numpy(float), np.full((1, table.shape[1]), np.nan)])  # row -1: NaN
+    return pd.DataFrame(values[rows], index=df.index, columns=table.columns)
+
+
+# =========================
+# FIT / APPLY
+# =========================
+def fit(df):
+    """Sector medians and IQR bounds of `df` (JSON-serializable)."""
+    medians = _numeric(df).groupby(_sectors(df)).median()
+    medians["qual_energia"] = medians["qual_energia"].round()
+
+    imputed = impute(df, {"medians": medians.to_dict()})
+    quartiles = _iqr_values(imputed).groupby(_sectors(imputed)).quantile([0.25, 0.75])
+    q1, q3 = quartiles.xs(0.25, level=-1), quartiles.xs(0.75, level=-1)
+    iqr = q3 - q1
+    return {
+        "medians": medians.to_dict(),
+        "lower": (q1 - IQR_FACTOR * iqr).to_dict(),
+        "upper": (q3 + IQR_FACTOR * iqr).to_dict(),
+    }
+
+
+def imputed_columns(df, params, sectors=None):
+    """The columns of `df` that get imputed, with their missing values filled."""
+    fills = _by_sector(pd.DataFrame(params["medians"]), df, sectors)
+    filled = _numeric(df).fillna(fills)
+    filled["qual_energia"] = filled["qual_energia"].map(ENERGY_GRADES_INV)
+    for col, value in CONSTANT_FILLS.items():
+        filled[col] = df[col].where(df[col].notna(), value).infer_objects()
+    return filled
+
+
+def impute(df, params):
+    """Copy of `df` with the missing values filled."""
+    out = df.copy()
+    for col, values in imputed_columns(df, params).items():
+        out[col] = values
+    return out
+
+
+def outliers(df, params, sectors=None):
+    """Boolean Series: listing with at least one value outside the bounds of its sector."""
+    values = _iqr_values(df)
+    sectors = pd.factorize(_sectors(df)) if sectors is None else sectors
+    lower = _by_sector(pd.DataFrame(params["lower"]), df, sectors)[values.columns]
+    upper = _by_sector(pd.DataFrame(params["upper"]), df, sectors)[values.columns]
+    return ((values < lower) | (values > upper)).any(axis=1)
+
+
+def apply(df, params):
+    """Imputed listings without the outliers, index reset like the notebook."""
+    sectors = pd.factorize(_sectors(df))
+    filled = imputed_columns(df, params, sectors)
+    others = [c for c in LINEAR_IQR_COLUMNS + LOG_IQR_COLUMNS if c not in filled.columns]
+    checked = pd.concat([filled, df[others]], axis=1)
+    keep = np.flatnonzero(~outliers(checked, params, sectors).to_numpy())
+
+    # Only the kept rows of the other columns are copied, once
+    out = df.take(keep)
+    for col, values in filled.items():
+        out[col] = values.to_numpy()[keep]
+    out.index = pd.RangeIndex(len(out))
+    return out
+
+
+def save_params(params, path=PARAMS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def load_params(path=PARAMS_FILE):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", help="CSV of new listings to clean with the saved parameters")
+    parser.add_argument("--out", help="where to write the cleaned listings of --apply (default: stdout)")
+    parser.add_argument("--params", default=PARAMS_FILE)
+    args = parser.parse_args()
+
+    if args.apply:
+        listings = pd.read_csv(args.apply)
+        cleaned = apply(listings, load_params(args.params))
+        if args.out:
+            cleaned.to_csv(args.out, index=False)
+            print(f"✔ {len(cleaned)} of {len(listings)} listings kept, saved to: {args.out}")
+        else:
+            print(cleaned.to_csv(index=False), end="")
+    else:
+        with stage("clean") as metrics:
+            rent = read_table(INPUT_TABLE)
+            params = fit(rent)
+            cleaned = apply(rent, params)
+            print(f"✔ Cleaning parameters saved to: {save_params(params, args.params)}")
+            write_table(cleaned, OUTPUT_TABLE)
+            print(f"✔ {len(cleaned)} of {len(rent)} listings kept, saved to: {table_path(OUTPUT_TABLE)}")
+            metrics.rows_in, metrics.rows_out = len(rent), len(cleaned)
+            metrics.set(outliers_dropped=len(rent) - len(cleaned),
+                        outliers_rate=round(1 - len(cleaned) / len(rent), 6) if len(rent) else 0.0)
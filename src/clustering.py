@@ -1,21 +1,42 @@
+"""
+clustering.py
+
+PCA (2 components) of the sociodemographic indicators by sector.
+
+- Default: mean of the indicators over the listings of each sector of
+  final_final_dataset.csv -> data/results/pca_scores_sector.csv.
+- --crosswalk: population-weighted mean of the census tracts overlapping each sector (area
+  crosswalk of section_to_neighbourhood.py, one sparse matrix product), which covers every
+  sector with population and not only those with listings
+  -> data/results/pca_scores_sector_crosswalk.csv.
+
+    python clustering.py [--crosswalk]
+"""
+
+import argparse
 import os
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 
+from crosswalk import SECTOR_WEIGHTS_CSV, Crosswalk
+from enrich import latest_socio
+from schema import read_dataset
+
 # =========================
 # CONFIGURATION PATHS
 # =========================
-base_dir = os.path.abspath("..")
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 data_dir = os.path.join(base_dir, "data")
 
 INPUT_CSV = os.path.join(data_dir, "final_final_dataset.csv")
 OUTPUT_PCA_SCORES = os.path.join(data_dir, "results", "pca_scores_sector.csv")
+OUTPUT_PCA_SCORES_CROSSWALK = os.path.join(data_dir, "results", "pca_scores_sector_crosswalk.csv")
 
-# =========================
-# LOAD DATA
-# =========================
-df = pd.read_csv(INPUT_CSV)
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--crosswalk", action="store_true",
+                    help="aggregate the census tracts to the sectors with the area crosswalk")
+args = parser.parse_args()
 
 # =========================
 # VARIABLES TO USE (same as first PCA)
@@ -25,8 +46,22 @@ pca_cols = [
     "pct_65_plus", "pct_under18", "pct_single_household"
 ]
 
-# Aggregate per sector_oficial
-df_sector = df.groupby("sector_oficial")[pca_cols].mean()
+# =========================
+# LOAD DATA + AGGREGATE PER SECTOR
+# =========================
+if args.crosswalk:
+    # Population-weighted mean of the tracts overlapping each sector (one sparse matrix
+    # product; each tract weighs its population times the share of its area inside)
+    socio = latest_socio()
+    crosswalk = Crosswalk.read_csv(SECTOR_WEIGHTS_CSV)
+    df_sector = crosswalk.aggregate(socio[pca_cols], weights=socio["poblacion"]).dropna()
+    df_sector.index.name = "sector_oficial"
+    output_csv = OUTPUT_PCA_SCORES_CROSSWALK
+else:
+    # Aggregate per sector_oficial
+    df = read_dataset(INPUT_CSV)
+    df_sector = df.groupby("sector_oficial", observed=True)[pca_cols].mean()
+    output_csv = OUTPUT_PCA_SCORES
 
 # =========================
 # STANDARDIZE
@@ -60,5 +95,5 @@ print(pca.explained_variance_ratio_.sum())
 # =========================
 # SAVE TO CSV
 # =========================
-scores_df.to_csv(OUTPUT_PCA_SCORES, index=False)
-print(f"✔ PCA scores exported to: {OUTPUT_PCA_SCORES}")
+scores_df.to_csv(output_csv, index=False)
+print(f"✔ PCA scores exported to: {output_csv}")
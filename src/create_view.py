@@ -1,45 +1,58 @@
 import os
-import pandas as pd
+from instrumentation import stage
+from storage import read_table
 
 # =========================
 # CONFIGURACIÓ PATHS
 # =========================
-base_dir = os.path.abspath("..")
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 data_dir = os.path.join(base_dir, "data")
 
-INPUT_CSV = os.path.join(data_dir, "girona_for_rent_combined_clean.csv")
+INPUT_TABLE = "girona_for_rent_combined_clean"  # data/interim/<nom>.parquet
 OUTPUT_CSV = os.path.join(data_dir, "girona_rent_leaflet_view.csv")
 
-# =========================
-# 1. Carrega dataset clean
-# =========================
-df = pd.read_csv(INPUT_CSV)
+VIEW_INPUT_COLUMNS = ["lat", "lon", "barri_oficial", "price", "area", "year_available"]
 
-# =========================
-# 2. Feature bàsica per visualització
-# =========================
-df["price_per_m2"] = df["price"] / df["area"]
 
-# =========================
-# 3. Selecciona només camps necessaris
-# =========================
-leaflet_view = df[
-    [
-        "lat",
-        "lon",
-        "barri_oficial",
-        "price",
-        "area",
-        "price_per_m2",
-        "year_available"
-    ]
-].dropna()
+def leaflet_view(df):
+    """Camps de la vista Leaflet dels anuncis geocodificats."""
+    df = df[VIEW_INPUT_COLUMNS].copy()
 
-# =========================
-# 4. Desa CSV
-# =========================
-leaflet_view.to_csv(OUTPUT_CSV, index=False)
+    # =========================
+    # 2. Feature bàsica per visualització
+    # =========================
+    df["price_per_m2"] = df["price"] / df["area"]
+
+    # =========================
+    # 3. Selecciona només camps necessaris
+    # =========================
+    return df[
+        [
+            "lat",
+            "lon",
+            "barri_oficial",
+            "price",
+            "area",
+            "price_per_m2",
+            "year_available"
+        ]
+    ].dropna()
+
+
+if __name__ == "__main__":
+    # =========================
+    # 1. Carrega dataset clean (només les columnes que es fan servir)
+    # =========================
+    with stage("view") as metrics:
+        rent = read_table(INPUT_TABLE, columns=VIEW_INPUT_COLUMNS)
+        leaflet_view_df = leaflet_view(rent)
+
+        # =========================
+        # 4. Desa CSV
+        # =========================
+        leaflet_view_df.to_csv(OUTPUT_CSV, index=False)
+        metrics.rows_in, metrics.rows_out = len(rent), len(leaflet_view_df)
 
-print("✔ Dataset Leaflet creat correctament")
-print(f"Files: {leaflet_view.shape[0]}")
-print(f"Fitxer: {OUTPUT_CSV}")
+    print("✔ Dataset Leaflet creat correctament")
+    print(f"Files: {leaflet_view_df.shape[0]}")
+    print(f"Fitxer: {OUTPUT_CSV}")
@@ -0,0 +1,124 @@
+"""
+crosswalk.py
+
+Area crosswalks between polygon layers (census sections -> barris, sectors) for areal
+interpolation of the sociodemographic indicators, which are given per census tract.
+
+- overlap_pairs() pairs the polygons of two layers with an STRtree (bounding boxes, then the
+  exact intersects test) and computes the intersection only for the pairs that intersect,
+  instead of a full gpd.overlay.
+- Crosswalk holds the intersection areas as a sparse sources x targets matrix (rows: census
+  tracts, columns: barris or sectors; a section in several polygons adds up its parts),
+  with the area of every source. section_to_neighbourhood.py saves the crosswalks of the
+  sections to the barris and sectors as long tables (one row per non-zero entry:
+  section_to_barri_weights.csv, section_to_sector_weights.csv).
+- Crosswalk.aggregate() takes values per source (e.g. sociodemographic rates per tract) to
+  the targets with one sparse matrix product: the mean of the sources overlapping each
+  target, weighted by the share of each source inside it times a weight per source (default
+  its area; the population gives a population-weighted mean). Missing values are left out
+  of the mean.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import shapely
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+data_dir = os.path.join(base_dir, "data")
+
+BARRI_WEIGHTS_CSV = os.path.join(data_dir, "section_to_barri_weights.csv")
+SECTOR_WEIGHTS_CSV = os.path.join(data_dir, "section_to_sector_weights.csv")
+
+SOURCE_KEY = 'census_tract_INE'
+
+
+def overlap_pairs(sources, targets):
+    """
+    (source positions, target positions, intersections) of the polygons of `sources` and
+    `targets` (GeoDataFrames, same CRS) that intersect, ordered by source and then target
+    (the rows of gpd.overlay(sources, targets, how='intersection')).
+    """
+    source_idx, target_idx = targets.sindex.query(sources.geometry, predicate='intersects', sort=True)
+    pieces = shapely.intersection(sources.geometry.values[source_idx], targets.geometry.values[target_idx])
+    return source_idx, target_idx, pieces
+
+
+class Crosswalk:
+    """Sparse intersection areas between source and target polygons, by key."""
+
+    def __init__(self, areas, sources, targets, source_area):
+        self.areas = sp.csr_matrix(areas)  # sources x targets, m2
+        self.sources = pd.Index(sources)
+        self.targets = pd.Index(targets)
+        self.source_area = np.asarray(source_area, dtype=float)
+
+    @classmethod
+    def build(cls, sources, targets, source_key=SOURCE_KEY, target_key='BARRIS'):
+        """Crosswalk of two layers in the same projected CRS (areas in its units)."""
+        source_codes, source_keys = pd.factorize(sources[source_key], sort=True)
+        target_codes, target_keys = pd.factorize(targets[target_key], sort=True)
+        source_idx, target_idx, pieces = overlap_pairs(sources, targets)
+        area = shapely.area(pieces)
+        keep = area > 0
+        # Duplicate (source, target) entries (sections split in several polygons) are summed
+        areas = sp.coo_matrix((area[keep], (source_codes[source_idx[keep]], target_codes[target_idx[keep]])),
+                              shape=(len(source_keys), len(target_keys)))
+        source_area = np.bincount(source_codes, weights=sources.geometry.area.to_numpy(),
+                                  minlength=len(source_keys))
+        return cls(areas, source_keys, target_keys, source_area)
+
+    # -------------------------
+    # Long table
+    # -------------------------
+    def to_frame(self, source_key=SOURCE_KEY, target_key='barri'):
+        """One row per (source, target) with intersection area and the share of the source it is."""
+        areas = self.areas.tocoo()
+        return pd.DataFrame({
+            source_key: self.sources[areas.row],
+            target_key: self.targets[areas.col],
+            'area_m2': areas.data.round(2),
+            'share': (areas.data / self.source_area[areas.row]).round(6),
+        }).sort_values([source_key, target_key], ignore_index=True)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Inverse of to_frame() (first column: source key, second: target key)."""
+        source_key, target_key = df.columns[:2]
+        source_codes, sources = pd.factorize(df[source_key].astype(str), sort=True)
+        target_codes, targets = pd.factorize(df[target_key], sort=True)
+        areas = sp.coo_matrix((df['area_m2'].to_numpy(float), (source_codes, target_codes)),
+                              shape=(len(sources), len(targets)))
+        # Area of each source: total area / total share of its rows (tiny shares are rounded off)
+        source_area = (np.bincount(source_codes, weights=df['area_m2'].to_numpy(float))
+                       / np.bincount(source_codes, weights=df['share'].to_numpy(float)))
+        return cls(areas, sources, targets, source_area)
+
+    @classmethod
+    def read_csv(cls, path):
+        return cls.from_frame(pd.read_csv(path, dtype={SOURCE_KEY: str}))
+
+    # -------------------------
+    # Areal interpolation
+    # -------------------------
+    def aggregate(self, values, weights=None):
+        """
+        Values per source (DataFrame indexed by source key) -> per target (same columns): mean
+        of the sources overlapping each target, weighted by the share of the source inside it
+        times `weights` (Series per source key, default the source area). NaN for a target
+        without any value.
+        """
+        shares = sp.diags(1 / self.source_area) @ self.areas
+        w = self.source_area if weights is None else pd.Series(weights).reindex(self.sources).to_numpy(float)
+        w = np.nan_to_num(w)
+        matrix = (sp.diags(w) @ shares).T.tocsr()  # targets x sources
+
+        x = values.reindex(self.sources).to_numpy(float)
+        present = ~np.isnan(x)
+        total = matrix @ np.where(present, x, 0.0)
+        weight = matrix @ present.astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(weight > 0, total / weight, np.nan)
+        return pd.DataFrame(means, index=self.targets, columns=values.columns)
@@ -0,0 +1,291 @@
+"""
+enrich.py
+
+In-memory enrichment of geocoded rentals with energy certificates, service accessibility,
+sociodemographic features and the official sector.
+
+- load_sources() builds (or reloads from data/cache) the lookup structures once: the
+  certificates and sociodemographic TemporalIndex, the ServicesIndex and the sector polygons.
+  The certificates are streamed and pre-reduced by energy_ingest.py.
+- energy_features(), services_features(), socio_features() and sector_features() return only
+  the new columns for a rentals frame (same index). enrich() applies all of them to one frame
+  and appends the column blocks without copying the existing columns.
+- enrich_municipalities() runs enrich() per municipality in a process pool (--workers), each
+  worker loading the sources once; a single municipality (Girona) runs in this process.
+- merge_energy_certificates.py, merge_services_radius.py and merge_sociodemographic.py are
+  thin wrappers around these functions. Running this module writes girona_for_rent_final
+  directly from the geocoded rentals, without the three intermediate tables:
+
+    python enrich.py [--metric haversine] [--workers 4]
+"""
+
+import argparse
+import os
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from energy_ingest import CERT_COLS, ENERGY_CSV, SECTIONS_CSV, read_certificates
+from instrumentation import peak_rss_mb, stage
+from municipalities import map_municipalities
+from services_index import CATEGORIES, METRICS, ServicesIndex
+from storage import read_table, table_path, write_table
+from temporal_index import TemporalIndex
+
+# =========================
+# CONFIGURATION PATHS
+# =========================
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+data_dir = os.path.join(base_dir, "data")
+
+SERVICES_CSV = os.path.join(data_dir, "initial", "girona_services.csv")
+SOCIO_CSV = os.path.join(data_dir, "initial", "girona_sociodemographic.csv")
+ENERGY_INDEX = os.path.join(data_dir, "cache", "energy_certificates_index.pkl")
+SOCIO_INDEX = os.path.join(data_dir, "cache", "sociodemographic_index.pkl")
+SECTORS_FILE = os.path.join(data_dir, "sectors_girona", "sectors.shp")
+
+RENT_TABLE = "girona_for_rent_combined_clean"
+OUTPUT_TABLE = "girona_for_rent_final"
+
+# =========================
+# FEATURES
+# =========================
+
+RADII_M = [500]  # radii in meters
+# One of METRICS. Mercator is what data/final_final_dataset.csv and the saved model were built
+# with; haversine / utm give true meters but other counts, so they need a retrained model.
+METRIC = "mercator"
+
+SOCIO_COLS = {
+    'media_de_la_renta_por_unidad_de_consumo': 'renda_med',
+    'mediana_de_la_renta_por_unidad_de_consumo': 'renda_mediana',
+    'indice_de_gini': 'gini',
+    'distribucion_de_la_renta_p80_p20': 'p80_p20',
+    'porcentaje_de_poblacion_de_65_y_mas_anos': 'pct_65_plus',
+    'porcentaje_de_poblacion_menor_de_18_anos': 'pct_under18',
+    'porcentaje_de_hogares_unipersonales': 'pct_single_household',
+    # Rest of the variables used by the model (same names as data/final_final_dataset.csv)
+    'fuente_de_ingreso_otras_prestaciones': 'ingresos_otros_prest',
+    'fuente_de_ingreso_otros_ingresos': 'ingresos_otros',
+    'fuente_de_ingreso_pensiones': 'ingresos_pensiones',
+    'fuente_de_ingreso_prestaciones_por_desempleo': 'ingresos_desempleo',
+    'fuente_de_ingreso_salario': 'ingresos_salario',
+    'renta_bruta_media_por_hogar': 'renta_bruta_hogar',
+    'renta_bruta_media_por_persona': 'renta_bruta_persona',
+    'renta_neta_media_por_hogar': 'renta_neta_hogar',
+    'renta_neta_media_por_persona': 'renta_neta_persona',
+    'edad_media_de_la_poblacion': 'edad_media',
+    'poblacion': 'poblacion',
+    'porcentaje_de_poblacion_espanola': 'pct_espanola',
+    'tamano_medio_del_hogar': 'tamany_mitja_hogar'
+}
+
+
+# =========================
+# SOURCES
+# =========================
+def build_energy_index(energy_csv=ENERGY_CSV):
+    """Per-tract temporal index of certificates, keyed by the year of data_entrada."""
+    # Streamed in chunks and reduced to the last certificate per tract and year
+    certificates = read_certificates(energy_csv)
+    return TemporalIndex.build(certificates, 'census_tract', 'year', CERT_COLS)
+
+
+def build_socio_index(socio_csv=SOCIO_CSV):
+    """Per-tract temporal index of the relevant sociodemographic variables."""
+    socio = pd.read_csv(socio_csv)
+
+    if 'year' in socio.columns:
+        socio['year'] = socio['year'].astype(int)
+    elif 'data' in socio.columns:
+        socio['year'] = pd.to_datetime(socio['data'], errors='coerce').dt.year
+    else:
+        socio['year'] = 9999  # fallback
+
+    return TemporalIndex.build(socio, 'census_tract', 'year', list(SOCIO_COLS))
+
+
+def latest_socio(socio_csv=SOCIO_CSV):
+    """Sociodemographic values (SOCIO_COLS names) of the latest year of each tract, by tract code."""
+    socio = pd.read_csv(socio_csv).sort_values(['census_tract', 'year'])
+    socio = socio.drop_duplicates('census_tract', keep='last')
+    socio.index = pd.Index(socio['census_tract'].astype('Int64').astype(str), name='census_tract_INE')
+    return socio[list(SOCIO_COLS)].rename(columns=SOCIO_COLS)
+
+
+def load_energy_index():
+    # Only rebuilt when the certificates file (or the tracts of Girona) or the code changes
+    return TemporalIndex.load_or_build(ENERGY_INDEX, [ENERGY_CSV, SECTIONS_CSV], build_energy_index,
+                                       columns=CERT_COLS)
+
+
+def load_socio_index():
+    # Only rebuilt when the sociodemographic file or the code changes
+    return TemporalIndex.load_or_build(SOCIO_INDEX, SOCIO_CSV, build_socio_index, columns=list(SOCIO_COLS))
+
+
+def load_services_index(metric=METRIC):
+    return ServicesIndex(pd.read_csv(SERVICES_CSV), categories=CATEGORIES, metric=metric)
+
+
+def load_sectors():
+    # Official sectors in WGS84 (same reading as maps.py)
+    return gpd.read_file(SECTORS_FILE, encoding="utf-8-sig").to_crs(epsg=4326)
+
+
+class EnrichmentSources:
+    """The lookup structures used by enrich(), loaded once and reusable across calls."""
+
+    def __init__(self, energy_index, services_index, socio_index, sectors, radii=RADII_M):
+        self.energy_index = energy_index
+        self.services_index = services_index
+        self.socio_index = socio_index
+        self.sectors = sectors
+        self.radii = list(radii)
+
+
+def load_sources(metric=METRIC, radii=RADII_M):
+    return EnrichmentSources(load_energy_index(), load_services_index(metric), load_socio_index(),
+                             load_sectors(), radii)
+
+
+# =========================
+# ENRICHMENT
+# =========================
+def energy_features(rent, energy_index):
+    """Latest certificate per rental with year <= year_available."""
+    return energy_index.lookup(rent['census_tract_INE'], rent['year_available'], CERT_COLS, index=rent.index)
+
+
+def services_features(rent, services_index, radii=RADII_M):
+    """Service flags, counts within each radius and nearest distances per rental."""
+    return services_index.query(rent['lat'], rent['lon'], radii=radii, index=rent.index)
+
+
+def socio_features(rent, socio_index):
+    """Latest sociodemographic values per rental with year <= year_available."""
+    return socio_index.lookup(
+        rent['census_tract_INE'], rent['year_available'], list(SOCIO_COLS), index=rent.index
+    ).rename(columns=SOCIO_COLS)
+
+
+def containing_polygon(polygons, lats, lons):
+    """
+    Position in `polygons` of the first polygon containing each point (-1 if none), with
+    the same first-match rule as assign_section.assign_districts.
+    """
+    points = gpd.points_from_xy(lons, lats, crs="EPSG:4326")
+    point_idx, polygon_idx = polygons.sindex.query(points, predicate='within')
+    match = np.full(len(points), len(polygons))
+    np.minimum.at(match, point_idx, polygon_idx)
+    return np.where(match < len(polygons), match, -1)
+
+
+def sector_features(rent, sectors):
+    """Official sector (sectors.shp) containing each rental."""
+    match = containing_polygon(sectors, rent['lat'], rent['lon'])
+    names = sectors['SECTORS'].reset_index(drop=True).reindex(match)
+    return pd.DataFrame({'sector_oficial': names.values}, index=rent.index)
+
+
+def append_columns(rent, *blocks):
+    """
+    `rent` plus the columns of `blocks` (aligned on the index). The result shares the
+    existing column data with `rent`; only the new columns are added.
+    """
+    result = rent.copy(deep=False)
+    for block in blocks:
+        for col in block.columns:
+            result[col] = block[col]
+    return result
+
+
+def enrich(rent, sources):
+    """Geocoded rentals -> rentals with energy, services, sociodemographic and sector columns."""
+    return append_columns(
+        rent,
+        energy_features(rent, sources.energy_index),
+        services_features(rent, sources.services_index, sources.radii),
+        socio_features(rent, sources.socio_index),
+        sector_features(rent, sources.sectors),
+    )
+
+
+# =========================
+# PER MUNICIPALITY
+# =========================
+_worker = {}  # lookup structures of a worker process, loaded once by its initializer
+
+
+def _load_worker_sources(metric, radii):
+    _worker['sources'] = load_sources(metric=metric, radii=radii)
+
+
+def _load_worker_services(metric, radii):
+    _worker['services'] = load_services_index(metric)
+    _worker['radii'] = list(radii)
+
+
+def _enrich_shard(rent):
+    return enrich(rent, _worker['sources'])
+
+
+def _services_shard(rent):
+    return services_features(rent, _worker['services'], _worker['radii'])
+
+
+def enrich_municipalities(rent, metric=METRIC, radii=RADII_M, workers=None):
+    """enrich() of the rentals of each municipality in a process pool, in the order of `rent`."""
+    return map_municipalities(_enrich_shard, rent, workers, _load_worker_sources, (metric, radii))
+
+
+def services_municipalities(rent, metric=METRIC, radii=RADII_M, workers=None):
+    """
+    services_features() per municipality in a process pool. Every worker has all the services,
+    so the ones across a municipal border still count for the rentals near it.
+    """
+    return map_municipalities(_services_shard, rent, workers, _load_worker_services, (metric, radii))
+
+
+def record_match_rates(metrics, rent):
+    """
+    Unmatched rates of the enrichment columns present in `rent` (instrumentation.StageMetrics):
+    rentals (and tracts) without a certificate up to their year, without sociodemographic
+    data, without any service within each radius, outside every sector.
+    """
+    tracts = rent['census_tract_INE'] if 'census_tract_INE' in rent.columns else None
+    if set(CERT_COLS) <= set(rent.columns):
+        metrics.unmatched("no_certificate", rent[CERT_COLS].isna().all(axis=1), tracts)
+    socio_cols = list(SOCIO_COLS.values())
+    if set(socio_cols) <= set(rent.columns):
+        metrics.unmatched("no_socio", rent[socio_cols].isna().all(axis=1), tracts)
+    for r in RADII_M:
+        flags = [f'has_{cat}_within_{r}m' for cat in CATEGORIES]
+        if set(flags) <= set(rent.columns):
+            metrics.unmatched(f"no_service_within_{r}m", rent[flags].eq(0).all(axis=1))
+    if 'sector_oficial' in rent.columns:
+        metrics.unmatched("no_sector", rent['sector_oficial'].isna())
+
+
+# =========================
+# FUSED RUN
+# =========================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--metric", choices=METRICS, default=METRIC, help="distance used for the radii")
+    parser.add_argument("--workers", type=int, help="processes, one municipality each (default: one per CPU)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with stage("enrich") as metrics:
+        rent = read_table(RENT_TABLE)
+        rent_final = enrich_municipalities(rent, metric=args.metric, workers=args.workers)
+        write_table(rent_final, OUTPUT_TABLE)
+        metrics.rows_in, metrics.rows_out = len(rent), len(rent_final)
+        record_match_rates(metrics, rent_final)
+
+    print(f"✔ Final dataset (fused enrichment) saved to: {table_path(OUTPUT_TABLE)}")
+    print(f"Rows: {len(rent_final)}, columns: {rent_final.shape[1]}")
+    print(f"Wall time: {time.perf_counter() - start:.2f} s, peak RSS: {peak_rss_mb():.1f} MB")
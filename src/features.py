@@ -0,0 +1,103 @@
+"""
+features.py
+
+Model features for new listings, without running the batch pipeline.
+
+- FeatureAssembler keeps in memory everything the batch pipeline reads from disk: the
+  section polygons of assign_section.py, the certificates and sociodemographic
+  TemporalIndex, the ServicesIndex and the sector polygons (see enrich.py).
+- assemble_one(listing) turns one listing (a dict with lat, lon, year_available and the
+  listing's own fields: rooms, floors, area, elevator) into the feature row model.py
+  expects, as a dict. It only does point lookups: no DataFrame is built.
+- assemble(listings) does the same for a DataFrame of listings, through the batch functions
+  (assign_districts + enrich), so its rows are the rows of girona_for_rent_final.
+- Missing values (no certificate for the tract, point outside every section, ...) are NaN,
+  as in the batch pipeline.
+- load() computes the services counts with the metric the saved model was trained with
+  (model.model_metric), not the default of enrich.py, unless a metric is given. Without a
+  saved model (models/ is not versioned), the metric of the training data
+  (model.DATA_METRIC).
+
+    python features.py '{"lat": 41.98, "lon": 2.82, "year_available": 2026, ...}'
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+from shapely import STRtree
+from shapely.geometry import Point
+
+from assign_section import DISTRICT_COLUMNS, assign_districts, seccions
+from enrich import CERT_COLS, RADII_M, SOCIO_COLS, append_columns, enrich, load_sources
+from model import DATA_METRIC, FEATURES, MODEL_FILE, load_model, model_metric
+
+LISTING_COLUMNS = ['lat', 'lon', 'year_available', 'rooms', 'floors', 'area', 'elevator']
+
+
+def _first_within(tree, point):
+    # Lowest position among the polygons containing the point (-1 if none)
+    match = tree.query(point, predicate='within')
+    return int(match.min()) if len(match) else -1
+
+
+class FeatureAssembler:
+    """Section polygons + enrichment sources, loaded once, turned into model feature rows."""
+
+    def __init__(self, sections, sources, features=FEATURES):
+        self.sections = sections.reset_index(drop=True)
+        self.sources = sources
+        self.features = list(features)
+
+        # Spatial trees and row attributes per section / sector, read by position in assemble_one
+        self._section_tree = STRtree(self.sections.geometry.values)
+        self._sector_tree = STRtree(sources.sectors.geometry.values)
+        self._section_attrs = self.sections[list(DISTRICT_COLUMNS)].rename(columns=DISTRICT_COLUMNS) \
+            .to_dict('records')
+        self._sector_names = sources.sectors['SECTORS'].tolist()
+        self._empty_section = dict.fromkeys(DISTRICT_COLUMNS.values(), np.nan)
+
+    @classmethod
+    def load(cls, metric=None, radii=RADII_M, features=FEATURES, model_path=MODEL_FILE):
+        """Assembler for the model at `model_path` (its services metric, unless `metric` is given)."""
+        if metric is None:
+            metric = model_metric(load_model(model_path)) if os.path.exists(model_path) else DATA_METRIC
+        return cls(seccions, load_sources(metric=metric, radii=radii), features)
+
+    def assemble_one(self, listing):
+        """Feature row (dict, in model order) for a single listing."""
+        lat, lon, year = listing['lat'], listing['lon'], listing['year_available']
+        sources = self.sources
+        point = Point(lon, lat)
+
+        section = _first_within(self._section_tree, point)
+        row = dict(listing)
+        row.update(self._section_attrs[section] if section >= 0 else self._empty_section)
+
+        tract = row['census_tract_INE']
+        row.update(sources.energy_index.lookup_one(tract, year, CERT_COLS))
+        row.update(sources.services_index.query_one(lat, lon, sources.radii))
+        socio = sources.socio_index.lookup_one(tract, year, list(SOCIO_COLS))
+        row.update({SOCIO_COLS[c]: v for c, v in socio.items()})
+
+        sector = _first_within(self._sector_tree, point)
+        row['sector_oficial'] = self._sector_names[sector] if sector >= 0 else np.nan
+
+        return {f: row[f] for f in self.features}
+
+    def assemble(self, listings):
+        """Feature rows (DataFrame, same index) for many listings at once."""
+        geo = assign_districts(listings['lat'].values, listings['lon'].values, self.sections)
+        geo.index = listings.index
+        rent = append_columns(listings, geo.drop(columns=[c for c in geo.columns if c in listings.columns]))
+        return enrich(rent, self.sources)[self.features]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("listing", help=f"listing as a JSON object with {', '.join(LISTING_COLUMNS)}")
+    args = parser.parse_args()
+
+    assembler = FeatureAssembler.load()
+    print(json.dumps(assembler.assemble_one(json.loads(args.listing)), default=str, indent=2))
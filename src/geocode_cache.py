@@ -0,0 +1,140 @@
+"""
+geocode_cache.py
+
+Persistent on-disk cache for the section/neighbourhood assignment of assign_section.py.
+
+- Coordinates are rounded to a configurable number of decimals and used as the cache key
+  (precision 6 is roughly 0.1 m at Girona's latitude). A new key is geocoded with the exact
+  coordinates of the first listing that produced it, so uncached runs give the same answer
+  as assign_districts; only two different points closer than the precision to each other
+  and to a section border could be told apart.
+
+- The cache lives in a SQLite file and remembers the SHA-256 of the GeoPackage it was built
+  from. If the GeoPackage content changes (or the precision changes) the cache is emptied
+  automatically.
+
+- Only points never seen before go through assign_districts (sharded per municipality in a
+  process pool when the sections cover several, municipalities.assign_districts_sharded);
+  the last lookup's hit and miss counts are kept on the cache object so the calling script
+  can report them.
+"""
+
+import os
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from hashing import file_hash
+
+# Same output columns as assign_section.assign_district / assign_districts
+ATTR_COLUMNS = ['districte', 'section', 'district_id', 'section_id',
+                'census_tract_INE', 'census_tract_IDESCAT', 'barri_oficial']
+KEY_COLUMNS = ['lat_key', 'lon_key']
+
+
+class GeocodeCache:
+    """SQLite cache of rounded (lat, lon) -> section attributes."""
+
+    def __init__(self, path, gpkg_file, precision=6, workers=None):
+        self.path = path
+        self.gpkg_file = gpkg_file
+        self.precision = precision
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._init_db()
+
+    # -------------------------
+    # Storage
+    # -------------------------
+    def _connect(self):
+        return closing(sqlite3.connect(self.path))
+
+    def _init_db(self):
+        source_hash = file_hash(self.gpkg_file)
+        with self._connect() as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                "lat_key INTEGER, lon_key INTEGER, "
+                "districte INTEGER, section TEXT, district_id TEXT, section_id TEXT, "
+                "census_tract_INE TEXT, census_tract_IDESCAT TEXT, barri_oficial TEXT, "
+                "PRIMARY KEY (lat_key, lon_key))"
+            )
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            if meta.get('gpkg_sha256') != source_hash or meta.get('precision') != str(self.precision):
+                # Different GeoPackage (or precision): old entries are no longer valid
+                conn.execute("DELETE FROM geocode")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    [('gpkg_sha256', source_hash), ('precision', str(self.precision))]
+                )
+
+    def _read(self, conn, keys):
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (lat_key INTEGER, lon_key INTEGER)")
+        conn.execute("DELETE FROM wanted")
+        conn.executemany("INSERT INTO wanted VALUES (?, ?)", keys[KEY_COLUMNS].itertuples(index=False))
+        return pd.read_sql_query(
+            "SELECT g.* FROM geocode g JOIN wanted w "
+            "ON g.lat_key = w.lat_key AND g.lon_key = w.lon_key",
+            conn
+        )
+
+    def _write(self, conn, rows):
+        records = rows[KEY_COLUMNS + ATTR_COLUMNS].astype(object)
+        records = records.where(records.notna(), None)
+        conn.executemany(
+            f"INSERT OR REPLACE INTO geocode ({', '.join(KEY_COLUMNS + ATTR_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(KEY_COLUMNS + ATTR_COLUMNS))})",
+            [tuple(int(v) if isinstance(v, np.integer) else v for v in row)
+             for row in records.itertuples(index=False)]
+        )
+
+    # -------------------------
+    # Lookup
+    # -------------------------
+    def lookup(self, lats, lons):
+        """
+        Same contract as assign_section.assign_districts: one row per input point, in input
+        order, with the seven section columns (empty when the point is outside every section).
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        valid = np.isfinite(lats) & np.isfinite(lons)
+
+        scale = 10 ** self.precision
+        points = pd.DataFrame({
+            'lat_key': np.round(np.where(valid, lats, 0) * scale).astype('int64'),
+            'lon_key': np.round(np.where(valid, lons, 0) * scale).astype('int64'),
+            'lat': lats,
+            'lon': lons,
+        })[valid]
+        keys = points.drop_duplicates(subset=KEY_COLUMNS)
+        points = points[KEY_COLUMNS]
+
+        with self._connect() as conn, conn:
+            cached = self._read(conn, keys)
+            seen = pd.MultiIndex.from_frame(cached[KEY_COLUMNS])
+            new = keys[~pd.MultiIndex.from_frame(keys[KEY_COLUMNS]).isin(seen)]
+
+            if not new.empty:
+                # Late import: the GeoPackage is only loaded when there are new points
+                from municipalities import assign_districts_sharded
+                found = assign_districts_sharded(new['lat'].values, new['lon'].values, workers=self.workers)
+                found = pd.concat([new[KEY_COLUMNS].reset_index(drop=True), found], axis=1)
+                self._write(conn, found)
+                cached = found if cached.empty else pd.concat([cached, found], ignore_index=True)
+
+        self.misses = int(pd.MultiIndex.from_frame(points).isin(pd.MultiIndex.from_frame(new[KEY_COLUMNS])).sum())
+        self.hits = len(points) - self.misses
+
+        # Left merge keeps the order of `points`; invalid coordinates stay empty
+        result = points.merge(cached, how='left', on=KEY_COLUMNS)
+        result.index = np.flatnonzero(valid)
+        result = result[ATTR_COLUMNS].reindex(np.arange(len(lats)))
+        result['districte'] = pd.to_numeric(result['districte'])
+        return result
@@ -1,56 +1,100 @@
+"""
+girona_for_rent_combined.py
+
+Anuncis reals i sintètics combinats, amb la secció censal i el barri de cada punt
+(geocodificació amb cache; amb diversos municipis, un procés per municipi, --workers).
+
+    python girona_for_rent_combined.py [--workers 4]
+"""
+
+import argparse
 import os
 import pandas as pd
-from assign_section import assign_district 
+from geocode_cache import GeocodeCache
+from instrumentation import stage
+from storage import table_path, write_table
 
 # =========================
 # CONFIGURACIÓ DE PATHS
 # =========================
-base_dir = os.path.abspath("..")
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 data_dir = os.path.join(base_dir, "data")
 
 REAL_CSV = os.path.join(data_dir, "initial", "girona_for_rent.csv")
 SYNTHETIC_CSV = os.path.join(data_dir, "initial", "girona_for_rent_synthetic.csv")
-OUTPUT_CSV = os.path.join(data_dir, "interim", "girona_for_rent_combined_clean.csv")
+OUTPUT_TABLE = "girona_for_rent_combined_clean"  # data/interim/<nom>.parquet
+
+# Cache de geocodificació (coordenades arrodonides -> secció)
+GPKG_FILE = os.path.join(data_dir, "section_to_neighbourhood_clean.gpkg")
+GEOCODE_CACHE = os.path.join(data_dir, "cache", "geocode_cache.sqlite")
+GEOCODE_PRECISION = 6  # decimals de lat/lon a la clau de la cache
+
+# Columnes sense les quals una fila es descarta
+REQUIRED_COLUMNS = ['districte', 'section', 'census_tract_INE']
+
 
 # =========================
 # 1. Carrega datasets
 # =========================
-real = pd.read_csv(REAL_CSV)
-synthetic = pd.read_csv(SYNTHETIC_CSV)
+def load_listings(real_csv=REAL_CSV, synthetic_csv=SYNTHETIC_CSV):
+    """Anuncis reals i sintètics en un sol DataFrame (reals i després sintètiques)."""
+    real = pd.read_csv(real_csv)
+    synthetic = pd.read_csv(synthetic_csv)
+
+    # Afegim any disponible si no existeix
+    if 'year_available' not in real.columns:
+        real['year_available'] = 2026
 
-# Afegim any disponible si no existeix
-if 'year_available' not in real.columns:
-    real['year_available'] = 2026
+    # Reindex per assegurar columnes compatibles (ordre estable: reals i després sintètiques)
+    all_cols = list(real.columns) + [c for c in synthetic.columns if c not in real.columns]
+    real = real.reindex(columns=all_cols)
+    synthetic = synthetic.reindex(columns=all_cols)
 
-# Reindex per assegurar columnes compatibles
-all_cols = list(set(real.columns) | set(synthetic.columns))
-real = real.reindex(columns=all_cols)
-synthetic = synthetic.reindex(columns=all_cols)
+    # Concatenem
+    return pd.concat([real, synthetic], ignore_index=True)
 
-# Concatenem
-rent_all = pd.concat([real, synthetic], ignore_index=True)
-print("Total files combinades:", rent_all.shape[0])
 
 # =========================
 # 2. Assignar secció i barri a cada fila
 # =========================
-district_info = rent_all.apply(
-    lambda row: assign_district(row['lat'], row['lon']),
-    axis=1
-)
+def geocode_cache(workers=None):
+    return GeocodeCache(GEOCODE_CACHE, GPKG_FILE, precision=GEOCODE_PRECISION, workers=workers)
 
-# Convertim en DataFrame i concatenem
-district_df = pd.DataFrame(list(district_info))
-rent_all = pd.concat([rent_all, district_df], axis=1)
 
-# =========================
-# 3. Eliminar files sense assignació
-# =========================
-rent_all_clean = rent_all.dropna(subset=['districte', 'section', 'census_tract_INE'])
-print("Files després de netejar:", rent_all_clean.shape[0])
+def assign_sections(rent_all, cache):
+    """Anuncis amb les columnes de secció i barri (buides si el punt no és a cap secció)."""
+    # Només es geocodifiquen (en bloc) els punts que no són a la cache
+    district_df = cache.lookup(rent_all['lat'].values, rent_all['lon'].values)
+    district_df.index = rent_all.index
+    return pd.concat([rent_all, district_df], axis=1)
 
-# =========================
-# 4. Desa el dataset final
-# =========================
-rent_all_clean.to_csv(OUTPUT_CSV, index=False)
-print(f"Dataset final creat: {OUTPUT_CSV}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, help="processos, un municipi cadascun (per defecte: un per CPU)")
+    args = parser.parse_args()
+
+    with stage("geocode") as metrics:
+        rent_all = load_listings()
+        print("Total files combinades:", rent_all.shape[0])
+
+        cache = geocode_cache(args.workers)
+        rent_all = assign_sections(rent_all, cache)
+        print(f"Geocodificació: {cache.hits} encerts de cache, {cache.misses} punts nous")
+
+        # =========================
+        # 3. Eliminar files sense assignació
+        # =========================
+        rent_all_clean = rent_all.dropna(subset=REQUIRED_COLUMNS)
+        print("Files després de netejar:", rent_all_clean.shape[0])
+
+        # =========================
+        # 4. Desa el dataset final
+        # =========================
+        write_table(rent_all_clean, OUTPUT_TABLE)
+        print(f"Dataset final creat: {table_path(OUTPUT_TABLE)}")
+
+        # Lloguers fora de qualsevol secció (descartats) i encerts de la cache
+        metrics.rows_in, metrics.rows_out = len(rent_all), len(rent_all_clean)
+        metrics.unmatched("outside_section", rent_all[REQUIRED_COLUMNS].isna().any(axis=1))
+        metrics.set(cache_hits=cache.hits, cache_misses=cache.misses)
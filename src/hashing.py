@@ -0,0 +1,59 @@
+"""
+hashing.py
+
+Content hashes of files and of code, shared by the caches of the pipeline: the stage cache
+of pipeline.py, the geocoding cache, the pickled temporal indexes and the incremental states
+(incremental.py, price_pyramid.py).
+
+- file_hash() is the SHA-256 of a file's content.
+- local_modules() finds the modules of src/ a script imports (directly or indirectly, from
+  its AST), so a cache can be invalidated when the code that built it changes;
+  code_hash() hashes them all.
+"""
+
+import ast
+import hashlib
+import os
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def local_modules(script, seen=None):
+    """The script plus every module of src/ it imports, directly or indirectly."""
+    seen = set() if seen is None else seen
+    path = os.path.join(SRC_DIR, script)
+    if path in seen or not os.path.exists(path):
+        return seen
+    seen.add(path)
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            local_modules(name.split(".")[0] + ".py", seen)
+    return seen
+
+
+def code_hash(*scripts):
+    """SHA-256 of the code of the scripts (of src/) and of every module of src/ they import."""
+    paths = set()
+    for script in scripts:
+        local_modules(script, paths)
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(f"{os.path.relpath(path, SRC_DIR)}:{file_hash(path)}\n".encode())
+    return digest.hexdigest()
@@ -0,0 +1,219 @@
+"""
+incremental.py
+
+Incremental refresh of the geocoded rentals, the final dataset and the Leaflet view: only the
+listings that are new or changed since the last run are geocoded and enriched.
+
+- Every listing of girona_for_rent.csv + girona_for_rent_synthetic.csv has a stable key: a
+  hash of its synthetic_id, or for the real listings (no id) of its address and coordinates,
+  plus an occurrence number when a key repeats. A hash of all its source columns tells
+  whether a known listing changed (e.g. a new price).
+- The section and enrichment columns of every listing with a section are kept in
+  data/cache/incremental_listings.parquet with its key and row hash, and the keys of the
+  listings outside every section in data/cache/incremental_without_section.parquet. A run
+  only sends the listings whose (key, row hash) is in neither through the geocode cache and
+  enrich.enrich_municipalities(); removed listings leave the state and changed ones are
+  replaced (upsert).
+- The state also stores a hash of everything the enrichment depends on (the certificates,
+  services, sociodemographic, sections and sectors files, the code of the modules involved,
+  the metric and the radii). If any of them changed, every listing is recomputed.
+- girona_for_rent_combined_clean, girona_for_rent_final and girona_rent_leaflet_view.csv are
+  assembled from the state in source order: the same tables as a full run of the geocode,
+  energy / services / socio, final and view stages.
+
+    python incremental.py [--full] [--metric haversine] [--workers 4]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from create_view import OUTPUT_CSV as VIEW_CSV, leaflet_view
+from energy_ingest import ENERGY_CSV, SECTIONS_CSV
+from enrich import METRIC, RADII_M, SERVICES_CSV, SOCIO_CSV, enrich_municipalities, record_match_rates
+from geocode_cache import ATTR_COLUMNS
+from girona_for_rent_combined import GPKG_FILE, REQUIRED_COLUMNS, assign_sections, geocode_cache, load_listings
+from hashing import file_hash, local_modules
+from instrumentation import stage
+from pipeline import shapefile
+from services_index import METRICS
+from storage import table_path, write_table
+
+# =========================
+# CONFIGURATION PATHS
+# =========================
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+data_dir = os.path.join(base_dir, "data")
+
+STATE_FILES = [os.path.join(data_dir, "cache", "incremental_listings.parquet"),
+               os.path.join(data_dir, "cache", "incremental_without_section.parquet")]
+GEOCODED_TABLE = "girona_for_rent_combined_clean"
+FINAL_TABLE = "girona_for_rent_final"
+
+# Everything the section and enrichment columns depend on
+SOURCE_FILES = [GPKG_FILE, ENERGY_CSV, SECTIONS_CSV, SERVICES_CSV, SOCIO_CSV] + shapefile("sectors_girona", "sectors.shp")
+
+# =========================
+# KEYS
+# =========================
+ID_COLUMN = "synthetic_id"
+REAL_KEY_COLUMNS = ["address", "lat", "lon"]
+STATE_KEYS = ["key", "row_hash"]
+
+
+def listing_keys(rent_all):
+    """Stable key and content hash (uint64) of every listing (same positions as `rent_all`)."""
+    base = pd.util.hash_pandas_object(rent_all[REAL_KEY_COLUMNS], index=False)
+    if ID_COLUMN in rent_all.columns:
+        has_id = rent_all[ID_COLUMN].notna()
+        ids = pd.util.hash_pandas_object(rent_all[ID_COLUMN].astype(str), index=False)
+        base = base.where(~has_id, ids)
+    occurrence = base.groupby(base).cumcount()
+    return pd.DataFrame({
+        "key": pd.util.hash_pandas_object(pd.DataFrame({"base": base, "occurrence": occurrence}), index=False).values,
+        "row_hash": pd.util.hash_pandas_object(rent_all, index=False).values,
+    })
+
+
+def versions(keys):
+    # One uint64 per (key, row_hash): matched through a hash table, no sorting
+    return pd.Index(pd.util.hash_pandas_object(keys[STATE_KEYS], index=False).values)
+
+
+def sources_key(metric=METRIC, radii=RADII_M):
+    digest = hashlib.sha256()
+    for path in SOURCE_FILES + sorted(local_modules("incremental.py")):
+        digest.update(f"{os.path.relpath(path, base_dir)}:{file_hash(path)}\n".encode())
+    digest.update(json.dumps([metric, list(radii)]).encode())
+    return digest.hexdigest()
+
+
+# =========================
+# STATE
+# =========================
+def load_state(key=None, paths=STATE_FILES):
+    """
+    Stored (listings, without_section), or None if there is none or it was built from other
+    sources.
+    """
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    tables = [pq.read_table(p) for p in paths]
+    if key is not None and any((t.schema.metadata or {}).get(b"sources") != key.encode() for t in tables):
+        return None
+    return tuple(t.to_pandas() for t in tables)
+
+
+def save_state(state, key, paths=STATE_FILES):
+    for frame, path in zip(state, paths):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        pq.write_table(table.replace_schema_metadata({**table.schema.metadata, b"sources": key.encode()}), path)
+
+
+def _concat(frames):
+    # Skips empty frames (their all-NA columns would decide the dtypes otherwise); if all are
+    # empty, the first one keeps the columns
+    rows = [f for f in frames if len(f)]
+    if not rows:
+        return frames[0].iloc[:0].reset_index(drop=True)
+    return pd.concat(rows, ignore_index=True) if len(rows) > 1 else rows[0].reset_index(drop=True)
+
+
+# =========================
+# UPDATE
+# =========================
+def update(rent_all, state=None, metric=METRIC, radii=RADII_M, cache=None, workers=None):
+    """
+    (geocoded, final, state, changes) for the listings `rent_all` (load_listings()). The
+    state is (listings with a section and their columns, keys of the listings without one);
+    with a previous state, only the listings not in it are geocoded and enriched (one
+    municipality per process, `workers`).
+    """
+    keys = listing_keys(rent_all)
+    ids = versions(keys)
+    if state is None:
+        listings, without_section = keys.iloc[:0], keys.iloc[:0].assign(districte=np.nan)
+        todo = np.ones(len(rent_all), dtype=bool)
+        previous = pd.Index([])
+    else:
+        previous = pd.Index(np.concatenate([f["key"].to_numpy() for f in state]))
+        listings, without_section = (f[versions(f).isin(ids)] for f in state)
+        todo = ~(ids.isin(versions(listings)) | ids.isin(versions(without_section)))
+
+    # Only new and changed listings are geocoded and enriched
+    new = assign_sections(rent_all[todo].reset_index(drop=True), geocode_cache(workers) if cache is None else cache)
+    new_keys = keys[todo].reset_index(drop=True)
+    assigned = new[REQUIRED_COLUMNS].notna().all(axis=1).to_numpy()
+    without_section = _concat([
+        without_section,
+        new_keys[~assigned].assign(districte=new["districte"][~assigned].astype(float).values),
+    ])
+
+    new, new_keys = new[assigned].reset_index(drop=True), new_keys[assigned].reset_index(drop=True)
+    if len(new):
+        derived = enrich_municipalities(new, metric, radii, workers).drop(columns=list(rent_all.columns))
+        derived["districte"] = derived["districte"].astype(float)  # int or float depending on the rows
+        listings = _concat([listings, pd.concat([new_keys, derived], axis=1)])
+    if not len(listings):
+        raise ValueError("No listing could be assigned to a section")
+
+    # Assembled in source order, like the full geocode + enrichment
+    positions = versions(listings).get_indexer(ids)
+    rows = np.flatnonzero(positions >= 0)
+    final = pd.concat([
+        rent_all.iloc[rows].reset_index(drop=True),
+        listings.drop(columns=STATE_KEYS).iloc[positions[rows]].reset_index(drop=True),
+    ], axis=1)
+    # The full lookup gives integer districts when every listing has one
+    if final["districte"].notna().all() and without_section["districte"].notna().all():
+        final["districte"] = final["districte"].astype("int64")
+    geocoded = final[list(rent_all.columns) + ATTR_COLUMNS]
+
+    changes = {
+        "enriched": len(new),
+        "changed": int(keys["key"][todo].isin(previous).sum()),
+        "removed": int((~previous.isin(keys["key"])).sum()),
+        "without_section": len(without_section),
+    }
+    return geocoded, final, (listings, without_section), changes
+
+
+def write_outputs(geocoded, final):
+    write_table(geocoded, GEOCODED_TABLE)
+    write_table(final, FINAL_TABLE)
+    leaflet_view(geocoded).to_csv(VIEW_CSV, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="ignore the stored state and recompute everything")
+    parser.add_argument("--metric", choices=METRICS, default=METRIC, help="distance used for the radii")
+    parser.add_argument("--workers", type=int, help="processes, one municipality each (default: one per CPU)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with stage("incremental") as metrics:
+        key = sources_key(args.metric)
+        state = None if args.full else load_state(key=key)
+        rent_all = load_listings()
+        geocoded, final, state, changes = update(rent_all, state, metric=args.metric, workers=args.workers)
+        save_state(state, key)
+        write_outputs(geocoded, final)
+        metrics.rows_in, metrics.rows_out = len(rent_all), len(final)
+        metrics.set(**changes)
+        record_match_rates(metrics, final)
+
+    print(f"✔ Geocoded listings saved to: {table_path(GEOCODED_TABLE)}")
+    print(f"✔ Final dataset saved to: {table_path(FINAL_TABLE)}")
+    print(f"✔ Leaflet view saved to: {VIEW_CSV}")
+    print(f"Listings: {len(final)} ({changes['enriched']} enriched, {changes['changed']} changed, "
+          f"{changes['removed']} removed, {changes['without_section']} without section)")
+    print(f"Wall time: {time.perf_counter() - start:.2f} s")
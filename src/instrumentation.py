@@ -0,0 +1,252 @@
+"""
+instrumentation.py
+
+Structured metrics of the pipeline stages: one JSON line per stage run in
+data/logs/metrics.jsonl, to tell which stage made a run slow or dropped rows.
+
+- `with stage("energy") as metrics:` (or the @instrumented decorator on a function) records
+  wall and CPU time, peak RSS of the process while the stage ran, rows in / out (set on the
+  metrics object, or taken from the DataFrame argument / result of a decorated function),
+  the status (ok, or the exception that stopped it) and any extra metrics of the stage.
+- metrics.unmatched(name, mask, keys) records how many rows were left without a match (e.g.
+  rentals outside every section, without a certificate up to their year) and their rate; with
+  `keys`, also how many distinct keys (e.g. census tracts) they belong to.
+- Every record carries the run id of the pipeline run (PIPELINE_RUN_ID, set by pipeline.py
+  for all its stages), so the stages of one nightly run can be read back together.
+- METRICS_LOG changes the log file (METRICS_LOG=0 turns the metrics off).
+- PROFILE_STAGES=energy,services (or all) profiles those stages with cProfile, or with
+  pyinstrument if PROFILER=pyinstrument and it is installed; the profile is saved in
+  data/logs/profiles/ and its path recorded with the metrics.
+
+    PROFILE_STAGES=geocode python -m src.pipeline run --force geocode
+    python instrumentation.py [--run RUN_ID]     metrics of the last (or a given) run
+"""
+
+import argparse
+import cProfile
+import functools
+import json
+import os
+import resource
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# =========================
+# CONFIGURATION PATHS
+# =========================
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LOG_DIR = os.path.join(base_dir, "data", "logs")
+METRICS_FILE = os.path.join(LOG_DIR, "metrics.jsonl")
+PROFILE_DIR = os.path.join(LOG_DIR, "profiles")
+
+# One id per process unless the pipeline gives one to all its stages
+RUN_ID = os.environ.get("PIPELINE_RUN_ID") or uuid.uuid4().hex[:12]
+
+_profiling = False  # a single profiler at a time (nested stages are not profiled)
+_open_stages = []  # stages being run, outermost first
+
+
+def metrics_file():
+    path = os.environ.get("METRICS_LOG", METRICS_FILE)
+    return None if path in ("", "0") else path
+
+
+# =========================
+# MEMORY
+# =========================
+def _reset_peak_rss():
+    # Linux: resets the peak RSS (VmHWM) to the current RSS, so each stage gets its own peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 1024
+    except (OSError, StopIteration):
+        # Peak of the whole process (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+# =========================
+# PROFILING
+# =========================
+def _profiled(name):
+    wanted = {s.strip() for s in os.environ.get("PROFILE_STAGES", "").split(",") if s.strip()}
+    return not _profiling and ("all" in wanted or name in wanted)
+
+
+def _start_profiler():
+    if os.environ.get("PROFILER", "cprofile") == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed, using cProfile", file=sys.stderr)
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler, name):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"{RUN_ID}_{name}")
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats(stem + ".prof")
+        return stem + ".prof"
+    profiler.stop()
+    with open(stem + ".html", "w", encoding="utf-8") as f:
+        f.write(profiler.output_html())
+    return stem + ".html"
+
+
+# =========================
+# METRICS
+# =========================
+def _rows(obj):
+    # Only tables and arrays have rows
+    return int(len(obj)) if hasattr(obj, "shape") else None
+
+
+class StageMetrics:
+    """What a stage reports besides its timings: rows in / out and its own metrics."""
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.metrics = {}
+        self._peak_mb = 0.0  # peak RSS before nested stages reset it
+
+    def set(self, **metrics):
+        self.metrics.update(metrics)
+
+    def unmatched(self, name, mask, keys=None):
+        """Rows where `mask` is True have no match: their count, rate and distinct keys."""
+        mask = np.asarray(mask, dtype=bool)
+        total = len(mask)
+        self.metrics[f"{name}_rows"] = int(mask.sum())
+        self.metrics[f"{name}_rate"] = round(float(mask.mean()), 6) if total else 0.0
+        if keys is not None:
+            keys = pd.Series(np.asarray(keys, dtype=object))
+            present, missing = keys.nunique(), keys[mask].nunique()
+            self.metrics[f"{name}_keys"] = int(missing)
+            self.metrics[f"{name}_keys_rate"] = round(missing / present, 6) if present else 0.0
+
+
+def write_record(record, path=None):
+    path = path or metrics_file()
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # One write per line: the stages of a run append to the same file at the same time
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """Context manager recording the metrics of the code it wraps as stage `name`."""
+    global _profiling
+    metrics = StageMetrics(name, rows_in)
+    profiler = None
+    if _profiled(name):
+        profiler, _profiling = _start_profiler(), True
+
+    # The peak so far belongs to the enclosing stages, which keep it before the reset
+    peak = peak_rss_mb()
+    for outer in _open_stages:
+        outer._peak_mb = max(outer._peak_mb, peak)
+    _open_stages.append(metrics)
+    _reset_peak_rss()
+    started = datetime.now(timezone.utc)
+    wall, cpu = time.perf_counter(), time.process_time()
+    status = "ok"
+    try:
+        yield metrics
+    except BaseException as e:
+        status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        _open_stages.remove(metrics)
+        peak = peak_rss_mb()
+        for outer in _open_stages:
+            outer._peak_mb = max(outer._peak_mb, peak)
+        record = {
+            "run_id": RUN_ID,
+            "stage": name,
+            "started": started.isoformat(timespec="seconds"),
+            "status": status,
+            "wall_s": round(time.perf_counter() - wall, 4),
+            "cpu_s": round(time.process_time() - cpu, 4),
+            "peak_rss_mb": round(max(peak, metrics._peak_mb), 1),
+            "rows_in": metrics.rows_in,
+            "rows_out": metrics.rows_out,
+            "metrics": metrics.metrics,
+            "pid": os.getpid(),
+        }
+        if profiler is not None:
+            record["profile"] = _stop_profiler(profiler, name)
+            _profiling = False
+        write_record(record)
+
+
+def instrumented(name=None):
+    """Decorator: each call is a stage (rows in from the first argument, out from the result)."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name or fn.__name__, rows_in=_rows(args[0]) if args else None) as metrics:
+                result = fn(*args, **kwargs)
+                metrics.rows_out = _rows(result)
+                return result
+        return wrapper
+    return decorate
+
+
+# =========================
+# READING
+# =========================
+def read_records(run_id=None, path=None):
+    """Records of one run (default: the last run in the log)."""
+    path = path or metrics_file()
+    if path is None or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run_id is None and records:
+        run_id = records[-1]["run_id"]
+    return [r for r in records if r["run_id"] == run_id]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--run", help="run id (default: the last one)")
+    args = parser.parse_args()
+
+    records = read_records(args.run)
+    if not records:
+        sys.exit("No metrics recorded")
+    print(f"run {records[0]['run_id']}")
+    print(f"{'stage':<26}{'status':<10}{'wall (s)':>9}{'cpu (s)':>9}{'RSS (MB)':>10}{'rows in':>9}{'rows out':>9}")
+    for r in records:
+        rows = [r["rows_in"], r["rows_out"]]
+        print(f"{r['stage']:<26}{r['status'][:9]:<10}{r['wall_s']:>9.2f}{r['cpu_s']:>9.2f}{r['peak_rss_mb']:>10.1f}"
+              + "".join(f"{'-' if v is None else v:>9}" for v in rows))
+        for key, value in r["metrics"].items():
+            print(f"    {key}: {value}")
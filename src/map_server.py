@@ -0,0 +1,338 @@
+"""
+map_server.py
+
+Local HTTP server for the map data (asyncio, standard library only).
+
+- Keeps in memory the listings of girona_rent_leaflet_view.csv, the barris / sectors /
+  sections layers and data/results/prediccions_sectors_2026.csv. Listings are indexed with
+  an STRtree of their points and layers with an STRtree of their bboxes.
+- Layers come from the TopoJSON levels of maps.py (data/topojson/, the level matching the
+  requested zoom) when they exist, otherwise from the GeoJSON files.
+- Every feature is serialized once at load time; a response is the concatenation of the
+  features selected by the query. Responses are gzip-compressed when the client accepts it,
+  carry an ETag (data version + query, plus -gz for the gzip coding: the two codings of a
+  response have different strong validators) and are answered with 304 on If-None-Match;
+  recent responses are kept in an LRU cache. Compression runs in a worker thread (zlib
+  releases the GIL) so revalidations and cached responses are not queued behind it.
+- The source files are polled every --reload-interval seconds and reloaded (in a worker
+  thread, then swapped in) when they change; the data version, and so the ETags, change too.
+
+Endpoints (GET or HEAD, JSON):
+    /listings?bbox=minlon,minlat,maxlon,maxlat&year=2022&min_price=500&max_price=1500&barri=Centre
+    /layers/<barris|sectors|seccions>?bbox=...&zoom=14
+    /predictions?barri=Centre&sector=Carme
+    /health
+
+    python map_server.py [--host 127.0.0.1] [--port 8001] [--reload-interval 2]
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+from topology import ZOOM_LEVELS, decode, decode_arcs, level_name
+
+# =========================
+# CONFIGURATION PATHS
+# =========================
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+data_dir = os.path.join(base_dir, "data")
+
+LISTINGS_CSV = os.path.join(data_dir, "girona_rent_leaflet_view.csv")
+PREDICTIONS_CSV = os.path.join(data_dir, "results", "prediccions_sectors_2026.csv")
+LAYER_GEOJSON = {
+    "barris": os.path.join(data_dir, "barris_girona.geojson"),
+    "sectors": os.path.join(data_dir, "sectors_girona.geojson"),
+    "seccions": os.path.join(data_dir, "seccions_girona_union.geojson"),
+}
+TOPOJSON_DIR = os.path.join(data_dir, "topojson")
+
+CACHE_SIZE = 512  # responses kept in memory
+GZIP_LEVEL = 1  # local server: level 5 compresses ~15% smaller but takes twice as long
+GZIP_MIN_BYTES = 512
+
+
+def source_files():
+    levels = [os.path.join(TOPOJSON_DIR, f"girona_{level_name(z)}.topojson") for z in [*ZOOM_LEVELS, None]]
+    return [LISTINGS_CSV, PREDICTIONS_CSV, *LAYER_GEOJSON.values(), *levels]
+
+
+def data_version(paths):
+    """Short hash of the size and mtime of the source files (changes when any of them does)."""
+    digest = hashlib.sha1()
+    for path in paths:
+        if os.path.exists(path):
+            st = os.stat(path)
+            digest.update(f"{path}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def feature_collection(fragments):
+    return b'{"type":"FeatureCollection","features":[' + b",".join(fragments) + b"]}"
+
+
+def parse_bbox(value):
+    parts = [float(v) for v in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be minlon,minlat,maxlon,maxlat")
+    return parts
+
+
+# =========================
+# IN-MEMORY DATA
+# =========================
+class LayerLevel:
+    """Features of one layer at one resolution, with an STRtree over their bboxes."""
+
+    def __init__(self, features):
+        self.fragments = [_dumps(f) for f in features]
+        bounds = np.array([f["bbox"] for f in features], dtype=float).reshape(-1, 4)
+        self.tree = STRtree(shapely.box(*bounds.T))
+
+    def query(self, bbox=None):
+        if bbox is None:
+            return feature_collection(self.fragments)
+        idx = np.sort(self.tree.query(shapely.box(*bbox)))
+        return feature_collection([self.fragments[i] for i in idx])
+
+
+def _geojson_features(path):
+    with open(path, encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    for feature in features:
+        feature["bbox"] = [round(v, 6) for v in shapely.geometry.shape(feature["geometry"]).bounds]
+    return features
+
+
+class MapData:
+    """Everything the server answers from, loaded at once (one data version)."""
+
+    def __init__(self, version):
+        self.version = version
+
+        listings = pd.read_csv(LISTINGS_CSV)
+        self.lat = listings["lat"].to_numpy(float)
+        self.lon = listings["lon"].to_numpy(float)
+        self.year = listings["year_available"].to_numpy(float)
+        self.price = listings["price"].to_numpy(float)
+        self.barri = listings["barri_oficial"].astype(str).to_numpy()
+        self.points = STRtree(shapely.points(self.lon, self.lat))
+        props = listings.drop(columns=["lat", "lon"]).to_dict("records")
+        self.listing_fragments = np.array([
+            _dumps({"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": p})
+            for lon, lat, p in zip(self.lon.tolist(), self.lat.tolist(), props)
+        ], dtype=object)
+
+        # layer -> [(max zoom, LayerLevel)], coarsest first; None = any zoom
+        self.layers = {name: [] for name in LAYER_GEOJSON}
+        for zoom in [*ZOOM_LEVELS, None]:
+            path = os.path.join(TOPOJSON_DIR, f"girona_{level_name(zoom)}.topojson")
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                topology = json.load(f)
+            arcs = decode_arcs(topology)
+            for name in self.layers:
+                self.layers[name].append((zoom, LayerLevel(decode(topology, name, arcs))))
+        for name, path in LAYER_GEOJSON.items():
+            if not self.layers[name]:
+                self.layers[name].append((None, LayerLevel(_geojson_features(path))))
+
+        self.predictions = pd.read_csv(PREDICTIONS_CSV)
+
+    @classmethod
+    def load(cls):
+        return cls(data_version(source_files()))
+
+    def listings(self, bbox=None, year=None, min_price=None, max_price=None, barri=None):
+        idx = np.arange(len(self.lat)) if bbox is None else np.sort(self.points.query(shapely.box(*bbox)))
+        mask = np.ones(len(idx), dtype=bool)
+        if year is not None:
+            mask &= self.year[idx] == year
+        if min_price is not None:
+            mask &= self.price[idx] >= min_price
+        if max_price is not None:
+            mask &= self.price[idx] <= max_price
+        if barri is not None:
+            mask &= self.barri[idx] == barri
+        return feature_collection(self.listing_fragments[idx[mask]].tolist())
+
+    def layer(self, name, bbox=None, zoom=None):
+        levels = self.layers[name]
+        for max_zoom, level in levels:
+            if zoom is not None and (max_zoom is None or zoom <= max_zoom):
+                return level.query(bbox)
+        return levels[-1][1].query(bbox)  # no zoom: finest level
+
+    def predictions_for(self, barri=None, sector=None):
+        rows = self.predictions
+        if barri is not None:
+            rows = rows[rows["barri_oficial"] == barri]
+        if sector is not None:
+            rows = rows[rows["sector_oficial"] == sector]
+        return _dumps(rows.to_dict("records"))
+
+
+# =========================
+# HTTP
+# =========================
+def _etag(tag, gzipped):
+    # Different strong validators for the identity and gzip codings (RFC 9110)
+    return f'"{tag}-gz"' if gzipped else f'"{tag}"'
+
+
+class MapServer:
+    def __init__(self, reload_interval=2.0):
+        self.data = MapData.load()
+        self.reload_interval = reload_interval
+        self.cache = OrderedDict()
+
+    def route(self, path, params):
+        """Response body for a path and its query parameters (ValueError -> 400, KeyError -> 404)."""
+        data = self.data
+        bbox = parse_bbox(params["bbox"]) if "bbox" in params else None
+        if path == "/listings":
+            return data.listings(
+                bbox,
+                year=int(params["year"]) if "year" in params else None,
+                min_price=float(params["min_price"]) if "min_price" in params else None,
+                max_price=float(params["max_price"]) if "max_price" in params else None,
+                barri=params.get("barri"),
+            )
+        if path.startswith("/layers/"):
+            name = path[len("/layers/"):]
+            if name not in data.layers:
+                raise KeyError(name)
+            return data.layer(name, bbox, zoom=int(params["zoom"]) if "zoom" in params else None)
+        if path == "/predictions":
+            return data.predictions_for(params.get("barri"), params.get("sector"))
+        if path == "/health":
+            return _dumps({"status": "ok", "version": data.version, "listings": len(data.lat)})
+        raise KeyError(path)
+
+    async def respond(self, method, target, headers):
+        """(status, headers, body) for one request."""
+        if method not in ("GET", "HEAD"):
+            return 405, {"Allow": "GET, HEAD"}, b""
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        canonical = url.path + "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+        version = self.data.version
+        tag = f"{version}-{hashlib.sha1(canonical.encode()).hexdigest()[:12]}"
+        gzip_ok = "gzip" in headers.get("accept-encoding", "")
+        common = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding", "Access-Control-Allow-Origin": "*"}
+        if_none_match = headers.get("if-none-match")
+
+        # A -gz tag was only given to a body big enough to compress, which it still is in this
+        # version; an identity tag with gzip accepted depends on the size, checked below
+        etag = _etag(tag, gzip_ok)
+        if if_none_match == etag:
+            return 304, {**common, "ETag": etag}, b""
+
+        key = (version, canonical)
+        cached = self.cache.get(key)
+        if cached is None:
+            try:
+                body = self.route(url.path, params)
+            except KeyError:
+                return 404, {"Content-Type": "application/json"}, _dumps({"error": "not found"})
+            except ValueError as e:
+                return 400, {"Content-Type": "application/json"}, _dumps({"error": str(e)})
+            compressed = None
+            if len(body) >= GZIP_MIN_BYTES:
+                compressed = await asyncio.get_running_loop().run_in_executor(None, gzip.compress, body, GZIP_LEVEL)
+            cached = (body, compressed)
+            self.cache[key] = cached
+            if len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+
+        body, compressed = cached
+        gzipped = gzip_ok and compressed is not None
+        etag = _etag(tag, gzipped)
+        if if_none_match == etag:
+            return 304, {**common, "ETag": etag}, b""
+        out = {**common, "ETag": etag, "Content-Type": "application/json; charset=utf-8"}
+        if gzipped:
+            body = compressed
+            out["Content-Encoding"] = "gzip"
+        return 200, out, body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, http_version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                status, out, body = await self.respond(method, target, headers)
+                keep_alive = http_version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                head = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}", f"Content-Length: {len(body)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head += [f"{k}: {v}" for k, v in out.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass  # client went away or sent something that is not HTTP
+        finally:
+            writer.close()
+
+    async def watch(self):
+        """Reload the data when a source file changes."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            if data_version(source_files()) != self.data.version:
+                try:
+                    self.data = await loop.run_in_executor(None, MapData.load)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Reload failed, keeping version {self.data.version}: {e}")
+                    continue
+                self.cache.clear()
+                print(f"Reloaded map data (version {self.data.version})")
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving map data on http://{host}:{port} (version {self.data.version})")
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.watch())
+
+
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--reload-interval", type=float, default=2.0, help="seconds between file checks")
+    args = parser.parse_args()
+
+    asyncio.run(MapServer(args.reload_interval).serve(args.host, args.port))
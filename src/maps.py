@@ -1,11 +1,13 @@
 import geopandas as gpd
 import os
 
+from topology import write_levels
+
 # =========================
 # CONFIGURACIÓ DE PATHS
 # =========================
 
-base_dir = os.path.abspath("..")
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 data_dir = os.path.join(base_dir, "data")
 
 SECCIONS_DIR = os.path.join(data_dir, "seccions_girona")
@@ -91,3 +93,19 @@ sectors_union.to_file(
     encoding="utf-8"
 )
 print(f"Sectors processats i guardats a: {OUTPUT_SECTORS}")
+
+# =========================
+# --- GEOMETRIA MULTIRESOLUCIÓ (TopoJSON) ---
+# =========================
+
+# Les tres capes en un sol TopoJSON per nivell de zoom: les vores compartides es desen un
+# sol cop, simplificades a un píxel del zoom, amb coordenades quantitzades i bbox
+TOPOJSON_DIR = os.path.join(data_dir, "topojson")
+
+topo_paths = write_levels(
+    {"seccions": seccions_union, "barris": barris, "sectors": sectors_union},
+    TOPOJSON_DIR,
+    prefix="girona",
+)
+for level, path in topo_paths.items():
+    print(f"TopoJSON {level} guardat a: {path}")
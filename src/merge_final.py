@@ -0,0 +1,56 @@
+"""
+merge_final.py
+
+Assemble the final rental dataset from the independent enrichment outputs.
+
+- merge_energy_certificates.py, merge_services_radius.py and merge_sociodemographic.py all
+  read the geocoded rentals (girona_for_rent_combined_clean) and only append their own
+  columns, so they can run in any order or at the same time.
+- This script takes the geocoded rentals and appends, in order, the energy, services and
+  sociodemographic columns of each output (rows are aligned one to one). Only those new
+  columns are read from each Parquet file.
+- The official sector of each rental (point in sectors.shp) is appended last, as enrich.py does.
+"""
+
+import pandas as pd
+
+from enrich import load_sectors, record_match_rates, sector_features
+from instrumentation import stage
+from storage import read_table, table_columns, table_path, write_table
+
+# =========================
+# TABLES (data/interim/<name>.parquet)
+# =========================
+RENT_TABLE = "girona_for_rent_combined_clean"
+ENRICHED_TABLES = [
+    "girona_for_rent_with_energy",
+    "girona_for_rent_with_services_binary",
+    "girona_for_rent_with_socio",
+]
+OUTPUT_TABLE = "girona_for_rent_final"
+
+with stage("final") as metrics:
+    # =========================
+    # LOAD AND APPEND NEW COLUMNS
+    # =========================
+    rent = read_table(RENT_TABLE)
+    blocks = [rent]
+
+    for name in ENRICHED_TABLES:
+        new_cols = [c for c in table_columns(name) if c not in rent.columns]
+        enriched = read_table(name, columns=new_cols)
+        if len(enriched) != len(rent):
+            raise ValueError(f"{name} has {len(enriched)} rows, expected {len(rent)}")
+        blocks.append(enriched)
+
+    blocks.append(sector_features(rent, load_sectors()))
+
+    rent_final = pd.concat(blocks, axis=1)
+
+    # =========================
+    # SAVE
+    # =========================
+    write_table(rent_final, OUTPUT_TABLE)
+    print(f"✔ Final dataset with energy, services, sociodemographic and sector features saved to: {table_path(OUTPUT_TABLE)}")
+    metrics.rows_in, metrics.rows_out = len(rent), len(rent_final)
+    record_match_rates(metrics, rent_final)
@@ -0,0 +1,212 @@
+"""
+model_search.py
+
+Cross-validated search over model families and hyperparameters for the rent model, run in
+a process pool, with a leaderboard of metrics and fit times.
+
+- Families (SEARCH_SPACE): ElasticNet over a grid of l1_ratio (alpha chosen by an inner
+  ElasticNetCV, like the notebook), Ridge on log(price) and gradient boosting
+  (HistGradientBoostingRegressor).
+- CV on the training part of model.split() (the notebook's test set stays untouched):
+  shuffled KFold, or GroupKFold by sector_oficial (--cv sector) to measure how the model
+  does on sectors it has not seen.
+- The preprocessing of model.py (StandardScaler + OneHotEncoder(drop='first')) is fitted once
+  per fold and the transformed matrices are cached in data/cache/model_search/ (keyed by the
+  data, the CV and the features). Every candidate reuses them, in this run and the next
+  ones; each worker process reads a fold once.
+- Each (candidate, fold) is one task of the pool; results are aggregated per candidate into
+  data/results/model_search_<cv>.csv, sorted by mean MAE.
+
+    python model_search.py [--cv kfold|sector] [--families elasticnet,ridge_log,gbr] [--workers 4]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import product
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer, TransformedTargetRegressor
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import ElasticNetCV, Ridge
+from sklearn.model_selection import GroupKFold, KFold
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from model import CATEGORICAL_FEATURES, DATA_CSV, FEATURES, NUMERIC_FEATURES, split
+from schema import read_dataset
+
+# =========================
+# CONFIGURATION PATHS
+# =========================
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+data_dir = os.path.join(base_dir, "data")
+
+CACHE_DIR = os.path.join(data_dir, "cache", "model_search")
+RESULTS_DIR = os.path.join(data_dir, "results")
+
+N_SPLITS = 5
+RANDOM_STATE = 42
+
+# =========================
+# SEARCH SPACE
+# =========================
+SEARCH_SPACE = {
+    "elasticnet": {"l1_ratio": [0.1, 0.3, 0.5, 0.7, 0.9, 1.0]},
+    "ridge_log": {"alpha": [0.1, 1.0, 10.0, 100.0]},
+    "gbr": {"learning_rate": [0.05, 0.1], "max_leaf_nodes": [15, 31], "max_iter": [200, 500]},
+}
+
+
+def make_model(family, params):
+    if family == "elasticnet":
+        return ElasticNetCV(cv=5, random_state=RANDOM_STATE, **params)
+    if family == "ridge_log":
+        return TransformedTargetRegressor(Ridge(**params), func=np.log, inverse_func=np.exp)
+    if family == "gbr":
+        return HistGradientBoostingRegressor(random_state=RANDOM_STATE, **params)
+    raise ValueError(f"Unknown model family: {family}")
+
+
+def candidates(families):
+    """(family, params) of every point of the grid of each family."""
+    out = []
+    for family in families:
+        grid = SEARCH_SPACE[family]
+        for values in product(*grid.values()):
+            out.append((family, dict(zip(grid, values))))
+    return out
+
+
+# =========================
+# FOLDS (PREPROCESSED ONCE, CACHED)
+# =========================
+def build_preprocessor():
+    # Same as model.build_pipeline(); unknown sectors (grouped CV) get the baseline sector
+    return ColumnTransformer(
+        transformers=[
+            ("num", StandardScaler(), NUMERIC_FEATURES),
+            ("cat", OneHotEncoder(drop='first', handle_unknown='ignore', sparse_output=False), CATEGORICAL_FEATURES)
+        ]
+    )
+
+
+def fold_indices(X, cv):
+    if cv == "kfold":
+        return list(KFold(N_SPLITS, shuffle=True, random_state=RANDOM_STATE).split(X))
+    if cv == "sector":
+        return list(GroupKFold(N_SPLITS).split(X, groups=X["sector_oficial"]))
+    raise ValueError(f"Unknown CV: {cv}")
+
+
+def prepare_folds(data, cv, cache_dir=CACHE_DIR):
+    """
+    Paths of the preprocessed folds (one .npz each, with X_train, X_test, y_train, y_test),
+    computed only if they are not cached yet.
+    """
+    X, _, y, _ = split(data)
+    key = hashlib.sha1(pd.util.hash_pandas_object(pd.concat([X, y], axis=1)).values.tobytes())
+    key.update(json.dumps([cv, N_SPLITS, RANDOM_STATE, FEATURES]).encode())
+    fold_dir = os.path.join(cache_dir, f"{cv}_{key.hexdigest()[:12]}")
+
+    paths = [os.path.join(fold_dir, f"fold_{i}.npz") for i in range(N_SPLITS)]
+    if all(os.path.exists(p) for p in paths):
+        return paths
+
+    os.makedirs(fold_dir, exist_ok=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # unknown categories in grouped CV
+        for path, (train, test) in zip(paths, fold_indices(X, cv)):
+            preproc = build_preprocessor().fit(X.iloc[train])
+            np.savez(path,
+                     X_train=preproc.transform(X.iloc[train]), X_test=preproc.transform(X.iloc[test]),
+                     y_train=y.iloc[train].to_numpy(float), y_test=y.iloc[test].to_numpy(float))
+    return paths
+
+
+@lru_cache(maxsize=None)
+def load_fold(path):
+    # Kept per worker process, so each fold is read once however many candidates use it
+    with np.load(path) as fold:
+        return {name: fold[name] for name in fold.files}
+
+
+def evaluate(task):
+    """Fit one candidate on one fold; metrics on the fold's test part."""
+    family, params, fold_id, path = task
+    fold = load_fold(path)
+    model = make_model(family, params)
+    start = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)  # small l1_ratio on the alpha path
+        model.fit(fold["X_train"], fold["y_train"])
+    fit_s = time.perf_counter() - start
+
+    pred = model.predict(fold["X_test"])
+    err = fold["y_test"] - pred
+    r2 = 1 - np.sum(err ** 2) / np.sum((fold["y_test"] - fold["y_test"].mean()) ** 2)
+    return {
+        "family": family, "params": json.dumps(params, sort_keys=True), "fold": fold_id,
+        "r2": float(r2), "mae": float(np.mean(np.abs(err))), "rmse": float(np.sqrt(np.mean(err ** 2))),
+        "fit_s": fit_s,
+    }
+
+
+# =========================
+# SEARCH
+# =========================
+def leaderboard(results):
+    df = pd.DataFrame(results)
+    board = df.groupby(["family", "params"]).agg(
+        r2_mean=("r2", "mean"), r2_std=("r2", "std"),
+        mae_mean=("mae", "mean"), mae_std=("mae", "std"),
+        rmse_mean=("rmse", "mean"),
+        fit_s_mean=("fit_s", "mean"), fit_s_total=("fit_s", "sum"),
+    )
+    return board.sort_values("mae_mean").reset_index()
+
+
+def run_search(data, cv="kfold", families=tuple(SEARCH_SPACE), workers=None, cache_dir=CACHE_DIR):
+    paths = prepare_folds(data, cv, cache_dir)
+    tasks = [(family, params, i, path)
+             for family, params in candidates(families)
+             for i, path in enumerate(paths)]
+    if workers == 1:
+        results = [evaluate(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(evaluate, tasks, chunksize=max(1, len(tasks) // (4 * (workers or os.cpu_count())))))
+    return leaderboard(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cv", choices=["kfold", "sector"], default="kfold")
+    parser.add_argument("--families", default=",".join(SEARCH_SPACE), help="comma-separated, from SEARCH_SPACE")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    families = args.families.split(",")
+    unknown = set(families) - set(SEARCH_SPACE)
+    if unknown:
+        parser.error(f"unknown families: {', '.join(sorted(unknown))} (choose from {', '.join(SEARCH_SPACE)})")
+    data = read_dataset(DATA_CSV)
+
+    start = time.perf_counter()
+    board = run_search(data, args.cv, families, args.workers)
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = os.path.join(RESULTS_DIR, f"model_search_{args.cv}.csv")
+    board.to_csv(out, index=False)
+
+    with pd.option_context("display.width", 200, "display.max_colwidth", 70):
+        print(board[["family", "params", "r2_mean", "mae_mean", "mae_std", "fit_s_mean"]].head(10).to_string(index=False))
+    print(f"{len(board)} candidates x {N_SPLITS} folds in {elapsed:.1f} s")
+    print(f"✔ Leaderboard saved to: {out}")
@@ -0,0 +1,159 @@
+"""
+municipalities.py
+
+Municipality codes and per-municipality sharding, to run the pipeline for every municipality
+of a province and not only Girona.
+
+- INE municipality codes have 5 digits (province + municipality, 17079 = Girona). The census
+  tract codes start with them (census_tract_INE = municipality + district + section) and the
+  IDESCAT codes add the INE check digit after them (170792 + district + section);
+  check_digit() computes it.
+- assign_districts_sharded() is assign_section.assign_districts for a sections layer with
+  several municipalities: each municipality (prefix of census_tract_INE) only tests the points
+  inside its bounding box against its own sections, in a process pool. A point in the box (or
+  on the border) of several municipalities keeps the first section in the order of the layer,
+  the rule of assign_districts, so the result is the same as a single query over the layer.
+- map_municipalities(fn, rent) applies fn to the listings of each municipality (by their
+  census tract) in a process pool and concatenates the results in the order of `rent`;
+  enrich.enrich_municipalities() shards the enrichment this way.
+- A layer or a set of listings with a single municipality (Girona) runs in the calling
+  process, without a pool, exactly as before.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+GIRONA = "17079"
+
+# Weights of the INE check digit, by position of the digit (cycling every three digits)
+CHECK_DIGIT_TABLE = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [0, 3, 8, 2, 7, 4, 1, 5, 9, 6],
+    [0, 2, 4, 6, 8, 1, 3, 5, 7, 9],
+]
+
+
+# =========================
+# CODES
+# =========================
+def municipality_code(code):
+    """5-digit INE municipality code as text (8019 or '8019' -> '08019')."""
+    code = str(code).strip()
+    if not code.isdigit() or len(code) > 5:
+        raise ValueError(f"{code!r} is not an INE municipality code (5 digits)")
+    return code.zfill(5)
+
+
+def check_digit(code):
+    """INE check digit of a municipality code (17079 -> 2)."""
+    code = municipality_code(code)
+    total = sum(CHECK_DIGIT_TABLE[(2 - i) % 3][int(d)] for i, d in enumerate(code))
+    return (10 - total % 10) % 10
+
+
+def idescat_prefix(code):
+    """Prefix of the IDESCAT census tract codes of a municipality (17079 -> '170792')."""
+    code = municipality_code(code)
+    return code + str(check_digit(code))
+
+
+def municipality_of(tracts):
+    """Municipality code of each census tract (INE code), None where the tract is missing."""
+    tracts = pd.Series(np.asarray(tracts, dtype=object))
+    return tracts.where(tracts.isna(), tracts.astype(str).str[:5]).to_numpy()
+
+
+# =========================
+# PROCESS POOL
+# =========================
+def pool_size(shards, workers=None):
+    """Processes for `shards` tasks: `workers` (default: every CPU), at most one per shard."""
+    return max(1, min(workers or os.cpu_count() or 1, shards))
+
+
+def run_tasks(fn, tasks, workers, initializer=None, initargs=()):
+    """[fn(*task) for task in tasks], in a process pool when there is more than one worker."""
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [fn(*task) for task in tasks]
+    with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as pool:
+        return list(pool.map(fn, *zip(*tasks)))
+
+
+# =========================
+# SECTION ASSIGNMENT
+# =========================
+def _sections(seccions):
+    if seccions is None:
+        # Late import: assign_section loads the GeoPackage when imported
+        from assign_section import seccions
+    return seccions.reset_index(drop=True)
+
+
+def _section_matches(seccions, lats, lons):
+    """(point, section) pairs with the point inside the section, positions in the arguments."""
+    points = gpd.points_from_xy(lons, lats, crs="EPSG:4326")
+    return seccions.sindex.query(points, predicate='within')
+
+
+def assign_districts_sharded(lats, lons, seccions=None, workers=None):
+    """
+    Same result as assign_section.assign_districts(lats, lons, seccions), with the sections
+    (WGS84, default: those of assign_section) sharded per municipality over `workers`
+    processes.
+    """
+    from assign_section import DISTRICT_COLUMNS, assign_districts
+
+    seccions = _sections(seccions)
+    shards = pd.Series(np.arange(len(seccions))).groupby(municipality_of(seccions['census_tract_INE'])).indices
+    if len(shards) <= 1:
+        return assign_districts(lats, lons, seccions)
+
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    tasks, positions = [], []
+    for sections in shards.values():
+        minx, miny, maxx, maxy = seccions.geometry.iloc[sections].total_bounds
+        candidates = np.flatnonzero((lons >= minx) & (lons <= maxx) & (lats >= miny) & (lats <= maxy))
+        if len(candidates):
+            tasks.append((seccions.iloc[sections], lats[candidates], lons[candidates]))
+            positions.append((candidates, sections))
+
+    # Largest municipalities first, so a long one does not start last
+    order = sorted(range(len(tasks)), key=lambda i: -len(tasks[i][1]))
+    results = run_tasks(_section_matches, [tasks[i] for i in order], pool_size(len(tasks), workers))
+
+    # First section in the order of the layer among every municipality containing the point
+    match = np.full(len(lats), len(seccions))
+    for i, (point_idx, section_idx) in zip(order, results):
+        candidates, sections = positions[i]
+        np.minimum.at(match, candidates[point_idx], sections[section_idx])
+    match[match == len(seccions)] = -1
+
+    attrs = seccions[list(DISTRICT_COLUMNS)].rename(columns=DISTRICT_COLUMNS)
+    return attrs.reindex(match).reset_index(drop=True)
+
+
+# =========================
+# LISTINGS
+# =========================
+def map_municipalities(fn, rent, workers=None, initializer=None, initargs=()):
+    """
+    fn(listings of one municipality) for each municipality of `rent` (by census_tract_INE),
+    in a process pool, concatenated in the order of `rent`. `initializer(*initargs)` runs
+    once per process (e.g. to load the lookup structures fn uses).
+    """
+    shards = pd.Series(np.arange(len(rent))).groupby(municipality_of(rent['census_tract_INE']),
+                                                     dropna=False).indices
+    if len(shards) <= 1:
+        return run_tasks(fn, [(rent,)], 1, initializer, initargs)[0]
+
+    parts = sorted(shards.values(), key=len, reverse=True)
+    results = run_tasks(fn, [(rent.iloc[rows],) for rows in parts], pool_size(len(parts), workers),
+                        initializer, initargs)
+    return pd.concat(results).iloc[np.argsort(np.concatenate(parts), kind="stable")]
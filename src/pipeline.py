@@ -0,0 +1,290 @@
+"""
+pipeline.py
+
+Runs the data preparation scripts of src/ as a DAG.
+
+- Each stage declares the script it runs and the files it reads and writes; a stage depends
+  on every stage that writes one of its inputs.
+- A stage is skipped when the content hash of its inputs and of its code (the script plus
+  the local modules it imports) is the same as in the last successful run and its outputs
+  are still there untouched.
+- Stages whose dependencies are done run concurrently (each one in its own process), and the
+  wall time, peak RSS and rows in / out of every stage are reported at the end. Every stage
+  appends its metrics to data/logs/metrics.jsonl under the run id of the pipeline run (see
+  instrumentation.py; `python instrumentation.py` shows them with the match rates).
+- Interim tables are Parquet (see storage.py); `--no-csv` skips their CSV copies.
+- `--fused` replaces the energy / services / socio / final stages with a single in-memory
+  enrichment stage (enrich.py) that writes the final table without intermediate files.
+- `--incremental` replaces the geocode, enrichment and view stages with incremental.py, which
+  only geocodes and enriches the listings that are new or changed since its last run.
+
+Usage (from the repository root or from src/):
+    python -m src.pipeline run [--force] [--jobs N] [--no-csv] [--fused | --incremental] [stage ...]
+    python -m src.pipeline list [--fused | --incremental]
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SRC_DIR)
+
+import instrumentation  # noqa: E402
+from hashing import file_hash, local_modules  # noqa: E402
+
+base_dir = os.path.abspath(os.path.join(SRC_DIR, ".."))
+data_dir = os.path.join(base_dir, "data")
+
+STATE_FILE = os.path.join(data_dir, "cache", "pipeline_state.json")
+
+
+def data(*parts):
+    return os.path.join(data_dir, *parts)
+
+
+def interim(name):
+    """Typed Parquet table written through storage.write_table."""
+    return data("interim", f"{name}.parquet")
+
+
+def shapefile(*parts):
+    """All the sidecar files of a shapefile (.shp, .shx, .dbf, .prj, ...)."""
+    stem = os.path.splitext(data(*parts))[0]
+    return sorted(p for p in glob.glob(stem + ".*") if not p.endswith((".xml", ".zip")))
+
+
+class Stage:
+    def __init__(self, name, script, inputs, outputs):
+        self.name = name
+        self.script = script
+        self.inputs = inputs
+        self.outputs = outputs
+
+
+# =========================
+# STAGES
+# =========================
+GEOCODED = interim("girona_for_rent_combined_clean")
+
+STAGES = [
+    Stage("maps", "maps.py",
+          inputs=shapefile("seccions_girona", "Seccions.shp") + shapefile("barris_girona", "Barris.shp")
+          + shapefile("sectors_girona", "sectors.shp"),
+          outputs=[data("seccions_girona_union.geojson"), data("barris_girona.geojson"),
+                   data("sectors_girona.geojson")]
+          + [data("topojson", f"girona_{level}.topojson") for level in ["z12", "z14", "z16", "full"]]),
+    Stage("section_to_neighbourhood", "section_to_neighbourhood.py",
+          inputs=shapefile("seccions_girona", "Seccions.shp") + shapefile("barris_girona", "Barris.shp")
+          + shapefile("sectors_girona", "sectors.shp"),
+          outputs=[data("section_to_neighbourhood_clean.csv"), data("section_to_neighbourhood_clean.gpkg"),
+                   data("section_to_barri_weights.csv"), data("section_to_sector_weights.csv")]),
+    Stage("geocode", "girona_for_rent_combined.py",
+          inputs=[data("initial", "girona_for_rent.csv"), data("initial", "girona_for_rent_synthetic.csv"),
+                  data("section_to_neighbourhood_clean.gpkg")],
+          outputs=[GEOCODED]),
+    Stage("energy", "merge_energy_certificates.py",
+          inputs=[GEOCODED, data("initial", "girona_energy_certificates.csv"),
+                  data("section_to_neighbourhood_clean.csv")],
+          outputs=[interim("girona_for_rent_with_energy")]),
+    Stage("services", "merge_services_radius.py",
+          inputs=[GEOCODED, data("initial", "girona_services.csv")],
+          outputs=[interim("girona_for_rent_with_services_binary")]),
+    Stage("socio", "merge_sociodemographic.py",
+          inputs=[GEOCODED, data("initial", "girona_sociodemographic.csv")],
+          outputs=[interim("girona_for_rent_with_socio")]),
+    Stage("final", "merge_final.py",
+          inputs=[GEOCODED, interim("girona_for_rent_with_energy"),
+                  interim("girona_for_rent_with_services_binary"),
+                  interim("girona_for_rent_with_socio")] + shapefile("sectors_girona", "sectors.shp"),
+          outputs=[interim("girona_for_rent_final")]),
+    Stage("clean", "clean.py",
+          inputs=[interim("girona_for_rent_final")],
+          outputs=[interim("girona_for_rent_cleaned"), os.path.join(base_dir, "models", "cleaning_params.json")]),
+    Stage("view", "create_view.py",
+          inputs=[GEOCODED],
+          outputs=[data("girona_rent_leaflet_view.csv")]),
+    Stage("pyramid", "price_pyramid.py",
+          inputs=[GEOCODED] + shapefile("sectors_girona", "sectors.shp"),
+          outputs=[data("pyramid", f"{level}.json")
+                   for level in ["section", "barri", "sector", "grid_z12", "grid_z14", "grid_z16", "index"]]),
+]
+
+# Single stage doing energy + services + socio + final in memory (run --fused)
+FUSED_STAGE = Stage("enrich", "enrich.py",
+                    inputs=[GEOCODED, data("initial", "girona_energy_certificates.csv"),
+                            data("section_to_neighbourhood_clean.csv"),
+                            data("initial", "girona_services.csv"), data("initial", "girona_sociodemographic.csv")]
+                    + shapefile("sectors_girona", "sectors.shp"),
+                    outputs=[interim("girona_for_rent_final")])
+FUSED_REPLACES = {"energy", "services", "socio", "final"}
+
+# Single stage doing geocode + enrichment + view for the new or changed listings only (run --incremental)
+INCREMENTAL_STAGE = Stage("incremental", "incremental.py",
+                          inputs=[data("initial", "girona_for_rent.csv"), data("initial", "girona_for_rent_synthetic.csv"),
+                                  data("section_to_neighbourhood_clean.gpkg")] + FUSED_STAGE.inputs[1:],
+                          outputs=[GEOCODED, interim("girona_for_rent_final"), data("girona_rent_leaflet_view.csv")])
+INCREMENTAL_REPLACES = {"geocode", "view"} | FUSED_REPLACES
+
+
+def pipeline_stages(fused=False, incremental=False):
+    if incremental:
+        return [s for s in STAGES if s.name not in INCREMENTAL_REPLACES] + [INCREMENTAL_STAGE]
+    if fused:
+        return [s for s in STAGES if s.name not in FUSED_REPLACES] + [FUSED_STAGE]
+    return STAGES
+
+
+def dependencies(stages):
+    """Stage name -> names of the stages that produce one of its inputs."""
+    producers = {out: s.name for s in stages for out in s.outputs}
+    return {s.name: sorted({producers[i] for i in s.inputs if i in producers} - {s.name}) for s in stages}
+
+
+# =========================
+# HASHING
+# =========================
+def stage_key(stage):
+    """Hashes of the stage's code and inputs; a stage reruns when this changes."""
+    return {
+        "code": {os.path.relpath(p, base_dir): file_hash(p) for p in sorted(local_modules(stage.script))},
+        "inputs": {os.path.relpath(p, base_dir): file_hash(p) if os.path.exists(p) else None
+                   for p in stage.inputs},
+    }
+
+
+def outputs_hash(stage):
+    return {os.path.relpath(p, base_dir): file_hash(p) for p in stage.outputs if os.path.exists(p)}
+
+
+def load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    with open(STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def up_to_date(stage, state):
+    previous = state.get(stage.name)
+    if previous is None or not all(os.path.exists(p) for p in stage.outputs):
+        return False
+    return previous["key"] == stage_key(stage) and previous["outputs"] == outputs_hash(stage)
+
+
+# =========================
+# EXECUTION
+# =========================
+def run_script(stage):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, stage.script], cwd=SRC_DIR, capture_output=True, text=True)
+    return proc, time.perf_counter() - start
+
+
+def run(selected=None, force=False, jobs=None, fused=False, incremental=False):
+    all_stages = pipeline_stages(fused, incremental)
+    stages = [s for s in all_stages if not selected or s.name in selected]
+    deps = dependencies(all_stages)
+    names = {s.name for s in stages}
+    state = load_state()
+
+    pending = {s.name: s for s in stages}
+    done, failed, report = set(), set(), []
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        running = {}
+        while pending or running:
+            # Stages not selected count as done: their current outputs are used as they are
+            for name, stage in list(pending.items()):
+                stage_deps = [d for d in deps[name] if d in names]
+                if any(d in failed for d in stage_deps):
+                    report.append((name, "blocked", 0.0))
+                    failed.add(name)
+                    del pending[name]
+                elif all(d in done for d in stage_deps):
+                    del pending[name]
+                    if not force and up_to_date(stage, state):
+                        report.append((name, "cached", 0.0))
+                        done.add(name)
+                    else:
+                        print(f"▶ {name} ({stage.script})")
+                        running[pool.submit(run_script, stage)] = stage
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                proc, elapsed = future.result()
+                output = (proc.stdout + proc.stderr).strip()
+                if output:
+                    print("\n".join(f"  [{stage.name}] {line}" for line in output.splitlines()))
+                if proc.returncode == 0:
+                    state[stage.name] = {"key": stage_key(stage), "outputs": outputs_hash(stage)}
+                    save_state(state)
+                    done.add(stage.name)
+                    report.append((stage.name, "ran", elapsed))
+                else:
+                    failed.add(stage.name)
+                    report.append((stage.name, f"failed ({proc.returncode})", elapsed))
+
+    # Metrics the stages recorded in this run (none for the cached ones)
+    recorded = {r["stage"]: r for r in instrumentation.read_records(instrumentation.RUN_ID)}
+    print(f"\nrun {instrumentation.RUN_ID}")
+    print(f"{'stage':<26}{'status':<14}{'wall (s)':>10}{'RSS (MB)':>10}{'rows in':>9}{'rows out':>9}")
+    for name, status, elapsed in report:
+        r = recorded.get(name, {})
+        values = [r.get("peak_rss_mb"), r.get("rows_in"), r.get("rows_out")]
+        print(f"{name:<26}{status:<14}{elapsed:>10.2f}" + "".join(
+            f"{'-' if v is None else v:>{w}}" for v, w in zip(values, [10, 9, 9])))
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="run the pipeline (only what changed)")
+    run_parser.add_argument("stages", nargs="*", help="run only these stages (default: all)")
+    run_parser.add_argument("--force", action="store_true", help="ignore the cache and rerun")
+    run_parser.add_argument("--jobs", type=int, default=None, help="max stages running at once")
+    run_parser.add_argument("--no-csv", action="store_true", help="do not write CSV copies of interim tables")
+    run_parser.add_argument("--fused", action="store_true", help="enrich in memory in a single stage")
+    run_parser.add_argument("--incremental", action="store_true",
+                            help="geocode and enrich only the new or changed listings")
+    list_parser = sub.add_parser("list", help="show the stages and their dependencies")
+    list_parser.add_argument("--fused", action="store_true", help="show the fused variant")
+    list_parser.add_argument("--incremental", action="store_true", help="show the incremental variant")
+    args = parser.parse_args()
+    if args.fused and args.incremental:
+        parser.error("--fused and --incremental are exclusive")
+
+    if args.command == "list":
+        stages = pipeline_stages(args.fused, args.incremental)
+        deps = dependencies(stages)
+        for stage in stages:
+            print(f"{stage.name:<26}{stage.script:<32}after: {', '.join(deps[stage.name]) or '-'}")
+        return
+
+    if args.no_csv:
+        os.environ["INTERIM_CSV"] = "0"  # inherited by the stage processes
+    os.environ["PIPELINE_RUN_ID"] = instrumentation.RUN_ID  # the metrics of all the stages go together
+
+    unknown = set(args.stages) - {s.name for s in pipeline_stages(args.fused, args.incremental)}
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    sys.exit(0 if run(args.stages, force=args.force, jobs=args.jobs, fused=args.fused,
+                      incremental=args.incremental) else 1)
+
+
+if __name__ == "__main__":
+    main()
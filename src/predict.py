@@ -0,0 +1,167 @@
+"""
+predict.py
+
+Fast rent predictions from the fitted model of model.py.
+
+- The ElasticNet pipeline is linear once fitted, so it is compiled into plain numbers:
+  one weight per numeric feature (coefficient / scale, with the scaler means folded into
+  the bias) and one contribution per category of every categorical feature (0 for the
+  category dropped by the OneHotEncoder).
+- predict_one(dict) is the single-listing fast path: a few dozen multiplications and dict
+  lookups, no DataFrame or ColumnTransformer involved.
+- predict_batch(DataFrame) does the same over many listings with numpy.
+- Both give the same numbers as pipeline.predict(); unknown categories raise ValueError,
+  like the OneHotEncoder does. A value equal to a category is that category in both (e.g.
+  elevator 1 / 0 for True / False).
+
+Command line:
+    python predict.py '{"rooms": 2, "area": 70, ...}'      one listing as JSON
+    python predict.py --csv listings.csv --out preds.csv    batch
+    python predict.py serve [--port 8000]                   HTTP: POST /predict with a JSON
+                                                            object or list of objects
+"""
+
+import argparse
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from model import CATEGORICAL_FEATURES, MODEL_FILE, NUMERIC_FEATURES, load_model
+
+
+class LinearRentModel:
+    """Fitted preprocessing + ElasticNet pipeline reduced to weights and lookup tables."""
+
+    def __init__(self, pipeline):
+        preproc = pipeline.named_steps["preproc"]
+        regressor = pipeline.named_steps["regressor"]
+        scaler = preproc.named_transformers_["num"]
+        encoder = preproc.named_transformers_["cat"]
+        coef = np.asarray(regressor.coef_, dtype=float)
+
+        n_num = len(NUMERIC_FEATURES)
+        self.numeric_features = list(NUMERIC_FEATURES)
+        self.categorical_features = list(CATEGORICAL_FEATURES)
+
+        # (x - mean) / scale * coef  ==  x * weight - mean * weight
+        self.weights = coef[:n_num] / scaler.scale_
+        self.bias = float(regressor.intercept_ - np.dot(self.weights, scaler.mean_))
+        self._weights = self.weights.tolist()
+
+        # category -> contribution, per categorical feature (dropped category -> 0)
+        self.categories = []
+        self.contributions = []
+        pos = n_num
+        for cats, drop in zip(encoder.categories_, encoder.drop_idx_):
+            kept = [i for i in range(len(cats)) if drop is None or i != drop]
+            contrib = np.zeros(len(cats))
+            contrib[kept] = coef[pos:pos + len(kept)]
+            pos += len(kept)
+            self.categories.append(cats)
+            self.contributions.append(contrib)
+        self._lookup = [dict(zip(cats.tolist(), contrib.tolist()))
+                        for cats, contrib in zip(self.categories, self.contributions)]
+        self._codes = [{c: i for i, c in enumerate(cats.tolist())} for cats in self.categories]
+
+    @classmethod
+    def load(cls, path=MODEL_FILE):
+        return cls(load_model(path))
+
+    def predict_one(self, row):
+        """Predicted price for one listing given as a mapping of feature -> value."""
+        price = self.bias
+        for w, name in zip(self._weights, self.numeric_features):
+            price += w * row[name]
+        for lookup, name in zip(self._lookup, self.categorical_features):
+            try:
+                price += lookup[row[name]]
+            except KeyError:
+                raise ValueError(f"Unknown category {row[name]!r} for {name}") from None
+        return price
+
+    def predict_batch(self, df):
+        """Predicted prices (numpy array) for every row of a DataFrame."""
+        X = df[self.numeric_features].to_numpy(dtype=float)
+        pred = X @ self.weights + self.bias
+        for cats, contrib, index, name in zip(self.categories, self.contributions, self._codes,
+                                              self.categorical_features):
+            codes = np.array(pd.Categorical(df[name], categories=cats).codes, dtype=np.intp)
+            missing = np.flatnonzero(codes < 0)
+            if len(missing):
+                # Values equal to a category but of another type (1 for True), found by the
+                # same dict lookup as predict_one
+                codes[missing] = [index.get(v, -1) for v in df[name].to_numpy()[missing]]
+            if (codes < 0).any():
+                unknown = df[name][codes < 0].unique().tolist()
+                raise ValueError(f"Unknown categories {unknown} for {name}")
+            pred += contrib[codes]
+        return pred
+
+
+# =========================
+# HTTP FRONT END
+# =========================
+def make_handler(model):
+    class PredictHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/predict":
+                return self._send(404, {"error": "not found"})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if isinstance(body, list):
+                    result = {"predicted_price": model.predict_batch(pd.DataFrame(body)).tolist()}
+                else:
+                    result = {"predicted_price": model.predict_one(body)}
+            except (ValueError, KeyError, TypeError) as e:
+                return self._send(400, {"error": str(e)})
+            self._send(200, result)
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # keep the console quiet under load
+
+    return PredictHandler
+
+
+def serve(model, host="127.0.0.1", port=8000):
+    server = ThreadingHTTPServer((host, port), make_handler(model))
+    print(f"Serving predictions on http://{host}:{port}/predict")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("listing", nargs="?", help="one listing as a JSON object, or 'serve'")
+    parser.add_argument("--csv", help="CSV of listings to predict in batch")
+    parser.add_argument("--out", help="where to write the batch predictions (default: stdout)")
+    parser.add_argument("--model", default=MODEL_FILE, help="fitted pipeline saved by model.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    model = LinearRentModel.load(args.model)
+
+    if args.listing == "serve":
+        serve(model, args.host, args.port)
+    elif args.csv:
+        listings = pd.read_csv(args.csv)
+        listings["predicted_price"] = model.predict_batch(listings)
+        listings.to_csv(args.out or sys.stdout, index=False)
+    elif args.listing:
+        print(model.predict_one(json.loads(args.listing)))
+    else:
+        parser.error("give a listing as JSON, --csv, or 'serve'")
+
+
+if __name__ == "__main__":
+    main()
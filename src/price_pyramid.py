@@ -0,0 +1,258 @@
+"""
+price_pyramid.py
+
+Pre-aggregated price statistics for the Leaflet view, so the browser does not have to
+aggregate the listing points itself.
+
+- Levels: census section, barri, sector and square grid cells at zooms 12, 14 and 16 (each
+  cell is a Web Mercator tile of zoom + 2, i.e. 64 px on screen at that zoom).
+- For every cell of a level and every year_available (plus all years together, year null):
+  count, median, p25 and p75 of price_per_m2 and of price.
+- Output: one compact columnar JSON per level in data/pyramid/ (<level>.json, each cell key
+  stored once), plus index.json telling the map which levels to fetch at each zoom.
+- Incremental: the listings already aggregated are kept in data/cache/ with their cell keys.
+  On the next run only the new listings get their keys (sector / grid assignment), and only
+  the cells that gained or lost listings are recomputed; the others are kept as they are.
+  `--full` recomputes everything.
+- The state also stores a hash of what the cell keys depend on (the sectors layer and the
+  code of the modules involved). If any of them changed, every listing gets its keys again.
+
+    python price_pyramid.py [--full]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from enrich import load_sectors, sector_features
+from hashing import file_hash, local_modules
+from instrumentation import stage
+from pipeline import shapefile
+from storage import read_table
+
+# =========================
+# CONFIGURATION PATHS
+# =========================
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+data_dir = os.path.join(base_dir, "data")
+
+INPUT_TABLE = "girona_for_rent_combined_clean"
+OUTPUT_DIR = os.path.join(data_dir, "pyramid")
+STATE_FILE = os.path.join(data_dir, "cache", "price_pyramid_listings.parquet")
+STATS_FILE = os.path.join(data_dir, "cache", "price_pyramid_stats.parquet")
+
+# Everything the cell keys depend on, besides the listings
+SOURCE_FILES = shapefile("sectors_girona", "sectors.shp")
+
+# =========================
+# LEVELS AND STATISTICS
+# =========================
+LISTING_COLUMNS = ["lat", "lon", "census_tract_INE", "barri_oficial", "price", "area", "year_available"]
+
+GRID_ZOOMS = [12, 14, 16]
+CELL_ZOOM_OFFSET = 2  # grid cells at zoom z are tiles of zoom z + 2
+
+ADMIN_LEVELS = {"section": "census_tract_INE", "barri": "barri_oficial", "sector": "sector_oficial"}
+LEVELS = list(ADMIN_LEVELS) + [f"grid_z{z}" for z in GRID_ZOOMS]
+
+# Levels the map should fetch at each zoom
+ZOOM_LEVELS = {12: ["barri", "grid_z12"], 14: ["sector", "grid_z14"], 16: ["section", "grid_z16"]}
+
+VALUES = ["price_per_m2", "price"]
+QUANTILES = {"p25": 0.25, "median": 0.5, "p75": 0.75}
+STAT_COLUMNS = ["count"] + [f"{v}_{q}" for v in VALUES for q in QUANTILES]
+
+
+def tile_keys(lats, lons, zoom):
+    """'z/x/y' of the Web Mercator tile containing each point (None for missing coordinates)."""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.asarray(lons, dtype=float)
+    n = 2 ** zoom
+    x = np.floor((lon + 180) / 360 * n)
+    y = np.floor((1 - np.arcsinh(np.tan(lat)) / np.pi) / 2 * n)
+    valid = np.isfinite(x) & np.isfinite(y)
+    keys = np.full(len(lat), None, dtype=object)
+    keys[valid] = [f"{zoom}/{int(a)}/{int(b)}" for a, b in zip(x[valid], y[valid])]
+    return keys
+
+
+def listing_ids(listings):
+    """
+    Content hash of each listing plus its occurrence number, so identical listings are
+    counted as many times as they appear.
+    """
+    hashes = pd.util.hash_pandas_object(listings[LISTING_COLUMNS], index=False)
+    occurrence = hashes.groupby(hashes).cumcount()
+    return hashes.astype(str) + "_" + occurrence.astype(str)
+
+
+def assign_keys(listings, sectors):
+    """Listings with price_per_m2 and the cell key of every level."""
+    out = pd.DataFrame({
+        "id": listing_ids(listings).values,
+        "year": listings["year_available"].astype("Int64").values,
+        "price": listings["price"].astype(float).values,
+        "price_per_m2": (listings["price"] / listings["area"]).astype(float).values,
+    })
+    out["section"] = listings["census_tract_INE"].astype(object).values
+    out["barri"] = listings["barri_oficial"].astype(object).values
+    out["sector"] = sector_features(listings, sectors)["sector_oficial"].values
+    for zoom in GRID_ZOOMS:
+        out[f"grid_z{zoom}"] = tile_keys(listings["lat"], listings["lon"], zoom + CELL_ZOOM_OFFSET)
+    return out
+
+
+def level_stats(rows, level):
+    """Statistics per (cell, year) and per cell for all years (year <NA>)."""
+    rows = rows[rows[level].notna()]
+    by_year = rows.groupby([level, "year"])
+    all_years = rows.groupby(level)
+
+    blocks = []
+    for grouped in [by_year, all_years]:
+        stats = {"count": grouped.size()}
+        for v in VALUES:
+            for name, q in QUANTILES.items():
+                stats[f"{v}_{name}"] = grouped[v].quantile(q)
+        block = pd.DataFrame(stats).reset_index()
+        if "year" not in block.columns:
+            block["year"] = pd.Series(pd.NA, index=block.index, dtype="Int64")
+        blocks.append(block)
+
+    result = pd.concat(blocks, ignore_index=True).rename(columns={level: "key"})
+    result["year"] = result["year"].astype("Int64")
+    result.insert(0, "level", level)
+    return result[["level", "key", "year"] + STAT_COLUMNS]
+
+
+# =========================
+# INCREMENTAL UPDATE
+# =========================
+def sources_key():
+    digest = hashlib.sha256()
+    for path in SOURCE_FILES + sorted(local_modules("price_pyramid.py")):
+        digest.update(f"{os.path.relpath(path, base_dir)}:{file_hash(path)}\n".encode())
+    return digest.hexdigest()
+
+
+def load_state(key=None, paths=(STATE_FILE, STATS_FILE)):
+    """
+    Stored (state, stats), or (None, None) if there is none or it was built from other
+    sources.
+    """
+    if not all(os.path.exists(p) for p in paths):
+        return None, None
+    tables = [pq.read_table(p) for p in paths]
+    if key is not None and any((t.schema.metadata or {}).get(b"sources") != key.encode() for t in tables):
+        return None, None
+    return tuple(t.to_pandas() for t in tables)
+
+
+def _concat(frames, columns):
+    # Skips empty frames (their all-NA columns would decide the dtypes otherwise)
+    frames = [f for f in frames if len(f)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def update(listings, state=None, stats=None, sectors=None):
+    """
+    New (state, stats) after aggregating `listings`. With a previous state, only new
+    listings get keys and only the cells whose listings changed are recomputed.
+    """
+    listings = listings.dropna(subset=["price", "area", "year_available"])
+    ids = listing_ids(listings)
+    full = state is None or stats is None
+
+    if full:
+        added, removed = listings, pd.DataFrame(columns=["id"] + LEVELS)
+        kept = pd.DataFrame()
+    else:
+        added = listings[~ids.isin(state["id"]).values]
+        removed = state[~state["id"].isin(ids)]
+        kept = state[state["id"].isin(ids)]
+
+    new_rows = assign_keys(added, load_sectors() if sectors is None else sectors) if len(added) else kept.iloc[:0]
+    state = _concat([kept, new_rows], columns=new_rows.columns)
+
+    blocks = []
+    for level in LEVELS:
+        if full:
+            rows = state
+        else:
+            dirty = set(new_rows[level].dropna()) | set(removed[level].dropna())
+            blocks.append(stats[(stats["level"] == level) & ~stats["key"].isin(dirty)])
+            rows = state[state[level].isin(dirty)]
+        if len(rows):
+            blocks.append(level_stats(rows, level))
+
+    stats = _concat(blocks, columns=["level", "key", "year"] + STAT_COLUMNS)
+    stats = stats.sort_values(["level", "key", "year"], na_position="first", ignore_index=True)
+    return state, stats, {"added": len(added), "removed": len(removed)}
+
+
+def save_state(state, stats, key, paths=(STATE_FILE, STATS_FILE)):
+    for frame, path in zip([state, stats], paths):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        pq.write_table(table.replace_schema_metadata({**table.schema.metadata, b"sources": key.encode()}), path)
+
+
+# =========================
+# OUTPUT
+# =========================
+def level_json(stats, level):
+    """
+    Columnar JSON of one level: the cell keys once, then per row the position of its key
+    (`cell`), its year (null = all years) and one list per statistic.
+    """
+    rows = stats[stats["level"] == level]
+    codes, keys = pd.factorize(rows["key"])
+    out = {
+        "level": level,
+        "keys": keys.tolist(),
+        "cell": codes.tolist(),
+        "years": [None if pd.isna(y) else int(y) for y in rows["year"]],
+    }
+    for col in STAT_COLUMNS:
+        out[col] = rows[col].astype(int).tolist() if col == "count" else rows[col].round(2).tolist()
+    return out
+
+
+def write_outputs(stats, output_dir=OUTPUT_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    for level in LEVELS:
+        with open(os.path.join(output_dir, f"{level}.json"), "w", encoding="utf-8") as f:
+            json.dump(level_json(stats, level), f, separators=(",", ":"), ensure_ascii=False)
+
+    index = {
+        "statistics": STAT_COLUMNS,
+        "grid_cell_zoom_offset": CELL_ZOOM_OFFSET,
+        "zooms": {str(z): [f"{level}.json" for level in levels] for z, levels in ZOOM_LEVELS.items()},
+    }
+    with open(os.path.join(output_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="ignore the stored state and recompute everything")
+    args = parser.parse_args()
+
+    with stage("pyramid") as metrics:
+        listings = read_table(INPUT_TABLE, columns=LISTING_COLUMNS)
+        key = sources_key()
+        state, stats = (None, None) if args.full else load_state(key)
+        state, stats, changes = update(listings, state, stats)
+        save_state(state, stats, key)
+        write_outputs(stats)
+        metrics.rows_in, metrics.rows_out = len(listings), len(stats)
+        metrics.set(**changes)
+
+    print(f"✔ Price pyramid saved to: {OUTPUT_DIR}")
+    print(f"Listings: {len(state)} (+{changes['added']} / -{changes['removed']}), cells x years: {len(stats)}")
@@ -0,0 +1,203 @@
+"""
+scenarios.py
+
+What-if predictions over a grid of scenarios (e.g. sector x area x rooms x qual_energia x
+elevator x year), generalizing the last part of notebooks/model.ipynb that predicted one
+fixed listing per sector (prediccions_sectors_2026.csv).
+
+- Axes are given per feature: a list of values, a range {"start", "stop", "step"} (stop
+  included) or "all" (every category the model knows). A single value overrides the
+  notebook default of that feature; the other features keep the notebook defaults.
+  Repeated values of a list are kept once; a missing value (null / NaN) is an error.
+- The grid is the Cartesian product of the axes and is never built in full: it is walked in
+  chunks of flat positions, unravelled into one index per axis. With the compiled model of
+  predict.py, a chunk is one matrix product of its numeric axes with their weights plus one
+  lookup per categorical axis; the fixed features are folded into a single constant.
+- Chunks are streamed to a Parquet file (one row group each), so memory depends on the
+  chunk size, not on the size of the grid.
+- Axes that are not model features (year_available, as in the notebook) only label the
+  rows. When sector_oficial is an axis, its barri_oficial is added like in the notebook.
+
+    python scenarios.py '{"sector_oficial": "all", "area": {"start": 20, "stop": 150, "step": 1},
+                          "rooms": [1, 2, 3, 4], "qual_energia": "all", "elevator": [true, false],
+                          "year_available": [2025, 2026]}' [--out data/results/scenarios.parquet]
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from model import DATA_CSV, MODEL_FILE
+from predict import LinearRentModel
+
+# =========================
+# CONFIGURATION PATHS
+# =========================
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_FILE = os.path.join(base_dir, "data", "results", "scenarios.parquet")
+
+CHUNK_SIZE = 1_000_000
+
+# Scenario of the notebook (a small flat with the usual values of Girona)
+DEFAULTS = {
+    "rooms": 1,
+    "floors": 0,
+    "area": 25,
+    "metres_cadastre": 28,
+    "emissions_de_co2": 90,
+    "renda_med": 15000,
+    "gini": 38,
+    "pct_65_plus": 25,
+    "pct_under18": 25,
+    "pct_single_household": 45,
+    "ingresos_otros_prest": 0,
+    "ingresos_otros": 0,
+    "ingresos_pensiones": 0,
+    "ingresos_desempleo": 0,
+    "ingresos_salario": 8000,
+    "renta_bruta_hogar": 16000,
+    "renta_bruta_persona": 8000,
+    "renta_neta_hogar": 14500,
+    "renta_neta_persona": 7250,
+    "edad_media": 48,
+    "poblacion": 1000,
+    "pct_espanola": 65,
+    "tamany_mitja_hogar": 1.8,
+    "education_count_within_500m": 0,
+    "food_count_within_500m": 0,
+    "health_count_within_500m": 0,
+    "mobility_count_within_500m": 0,
+    "public_service_count_within_500m": 0,
+    "elevator": False,
+    "qual_energia": "G",
+    "year_available": 2026,
+}
+
+
+def axis_values(name, spec, model):
+    """Values of one axis from its spec (list, range dict or "all")."""
+    if isinstance(spec, dict):
+        start, stop, step = spec["start"], spec["stop"], spec.get("step", 1)
+        return np.arange(start, stop + step / 2, step)
+    if spec == "all":
+        if name not in model.categorical_features:
+            raise ValueError(f"'all' is only valid for categorical features, not {name}")
+        return model.categories[model.categorical_features.index(name)]
+    values = np.asarray(spec)
+    if values.ndim != 1 or len(values) == 0:
+        raise ValueError(f"Axis {name} needs a non-empty list of values")
+    if pd.isna(values).any():
+        raise ValueError(f"Axis {name} has missing values (null / NaN): {spec}")
+    # Repeated values would repeat scenarios (and are not valid categories): first one kept
+    return pd.unique(values)
+
+
+class ScenarioGrid:
+    """Cartesian product of scenario axes, predicted chunk by chunk with a LinearRentModel."""
+
+    def __init__(self, model, axes, defaults=DEFAULTS):
+        self.model = model
+        fixed = dict(defaults)
+        self.axes = {}
+        for name, spec in axes.items():
+            if isinstance(spec, (list, dict)) or spec == "all":
+                self.axes[name] = axis_values(name, spec, model)
+            else:
+                fixed[name] = spec
+        missing = [name for name in model.numeric_features + model.categorical_features
+                   if name not in fixed and name not in self.axes]
+        if missing:
+            raise ValueError(f"No value or axis for {missing}")
+        self.shape = tuple(len(v) for v in self.axes.values())
+        self.size = int(np.prod(self.shape, dtype=np.int64))
+
+        # Contribution of the fixed features, and per-axis weights / lookup tables
+        self.constant = model.bias
+        self.numeric_axes, self.numeric_weights = [], []
+        for weight, name in zip(model.weights, model.numeric_features):
+            if name in self.axes:
+                self.numeric_axes.append(name)
+                self.numeric_weights.append(weight)
+            else:
+                self.constant += weight * fixed[name]
+        self.numeric_weights = np.array(self.numeric_weights)
+
+        self.category_axes = {}
+        for cats, contrib, name in zip(model.categories, model.contributions, model.categorical_features):
+            values = self.axes[name] if name in self.axes else np.array([fixed[name]], dtype=object)
+            codes = pd.Categorical(values, categories=cats).codes
+            if (codes < 0).any():
+                raise ValueError(f"Unknown categories {values[codes < 0].tolist()} for {name}")
+            if name in self.axes:
+                self.category_axes[name] = contrib[codes]
+            else:
+                self.constant += contrib[codes[0]]
+
+        self.barri = None
+        if "sector_oficial" in self.axes:
+            sectors = pd.read_csv(DATA_CSV, usecols=["sector_oficial", "barri_oficial"])
+            mapping = sectors.drop_duplicates("sector_oficial").set_index("sector_oficial")["barri_oficial"]
+            self.barri = pd.factorize(mapping.reindex(self.axes["sector_oficial"]).fillna("Unknown"))
+
+    def predict_chunk(self, start, stop):
+        """DataFrame with the axis values and predicted_price of grid positions [start, stop)."""
+        index = np.unravel_index(np.arange(start, stop, dtype=np.int64), self.shape)
+        codes = dict(zip(self.axes, index))
+
+        if self.numeric_axes:
+            X = np.column_stack([self.axes[name][codes[name]] for name in self.numeric_axes]).astype(float)
+            pred = X @ self.numeric_weights + self.constant
+        else:
+            pred = np.full(stop - start, self.constant)
+        for name, contrib in self.category_axes.items():
+            pred += contrib[codes[name]]
+
+        out = {}
+        for name, values in self.axes.items():
+            if values.dtype == object:
+                out[name] = pd.Categorical.from_codes(codes[name], categories=values)
+            else:
+                out[name] = values[codes[name]]
+            if name == "sector_oficial" and self.barri is not None:
+                barri_codes, barris = self.barri
+                out["barri_oficial"] = pd.Categorical.from_codes(barri_codes[codes[name]], categories=barris)
+        out["predicted_price"] = pred
+        return pd.DataFrame(out)
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        for start in range(0, self.size, chunk_size):
+            yield self.predict_chunk(start, min(start + chunk_size, self.size))
+
+    def to_parquet(self, path=OUTPUT_FILE, chunk_size=CHUNK_SIZE):
+        """Stream the whole grid to `path`, one row group per chunk. Returns the number of rows."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        writer = None
+        try:
+            for chunk in self.chunks(chunk_size):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return self.size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("axes", help="JSON object: feature -> list, {start, stop, step}, 'all' or a fixed value")
+    parser.add_argument("--out", default=OUTPUT_FILE)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--model", default=MODEL_FILE, help="fitted pipeline saved by model.py")
+    args = parser.parse_args()
+
+    grid = ScenarioGrid(LinearRentModel.load(args.model), json.loads(args.axes))
+    print(f"Scenarios: {' x '.join(f'{n} ({k})' for n, k in zip(grid.axes, grid.shape))} = {grid.size}")
+    grid.to_parquet(args.out, args.chunk_size)
+    print(f"✔ Scenarios saved to: {args.out}")
@@ -0,0 +1,216 @@
+"""
+schema.py
+
+Column types of the rental datasets, shared by the interim tables of the pipeline
+(storage.py) and the final dataset of the model (data/final_final_dataset.csv).
+
+- Codes (census tract, section, district) are text categoricals, repeated labels (barri,
+  sector, energy grade) categoricals.
+- has_<category>_within_<r>m flags and elevator are bool (elevator a nullable boolean while
+  it has missing values, until clean.py imputes them: the model gets plain bool); counts of
+  services within a radius are int16, the year int16, price and area int32.
+- Measurements (surfaces, emissions, sociodemographic rates and incomes, distances to the
+  nearest service, rooms and floors, which are missing before cleaning) are float32: about 7
+  significant digits, more than any of the sources has. lat / lon stay float64 (float32
+  would only keep about half a meter).
+- census_tract_INE is the only census tract key: census_tract (the same code, from the merge
+  in the notebooks) is checked to be equal and dropped.
+- apply_schema() converts a DataFrame (write side), validate() checks it (read side: wrong
+  dtypes, values that do not fit, unknown energy grades, non-numeric codes) and
+  read_dataset() reads a CSV straight into these types and validates it.
+
+    python schema.py [data/final_final_dataset.csv]     memory of the CSV with and without the schema
+"""
+
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATASET_CSV = os.path.join(base_dir, "data", "final_final_dataset.csv")
+
+# =========================
+# TYPES
+# =========================
+CODE = "code"  # text codes, as a categorical ("01", "1707901003")
+NULLABLE_BOOL = "nullable_bool"  # bool, or boolean while some values are missing
+
+# Codes: stored as text even when they look like numbers
+CODE_COLUMNS = ['census_tract_INE', 'census_tract_IDESCAT', 'district_id', 'section_id', 'section']
+
+# Few distinct values repeated over many rows
+CATEGORICAL_COLUMNS = CODE_COLUMNS + ['neighbourhood', 'barri_oficial', 'sector_oficial', 'qual_energia']
+
+FLOAT32_COLUMNS = [
+    # Listing (missing before cleaning)
+    'rooms', 'floors',
+    # Energy certificate
+    'metres_cadastre', 'emissions_de_co2', 'cost_energia',
+    # Sociodemographic
+    'renda_med', 'renda_mediana', 'gini', 'p80_p20', 'pct_65_plus', 'pct_under18',
+    'pct_single_household', 'ingresos_otros_prest', 'ingresos_otros', 'ingresos_pensiones',
+    'ingresos_desempleo', 'ingresos_salario', 'renta_bruta_hogar', 'renta_bruta_persona',
+    'renta_neta_hogar', 'renta_neta_persona', 'edad_media', 'poblacion', 'pct_espanola',
+    'tamany_mitja_hogar',
+]
+
+COLUMN_TYPES = {
+    **{col: CODE for col in CODE_COLUMNS},
+    **{col: 'category' for col in CATEGORICAL_COLUMNS if col not in CODE_COLUMNS},
+    **{col: 'float32' for col in FLOAT32_COLUMNS},
+    'price': 'int32',
+    'area': 'int32',
+    'year_available': 'int16',
+    'elevator': NULLABLE_BOOL,
+}
+
+# Services columns, one per category and radius
+PATTERN_TYPES = [
+    (re.compile(r'has_\w+_within_\d+m'), 'bool'),
+    (re.compile(r'\w+_count_within_\d+m'), 'int16'),
+    (re.compile(r'\w+_nearest_m'), 'float32'),
+]
+
+# Duplicate column -> the key it repeats
+DUPLICATE_KEYS = {'census_tract': 'census_tract_INE'}
+
+ENERGY_GRADES = ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+
+
+def column_type(col):
+    """Type of a column of the schema, None if it is not in it (kept as it is)."""
+    if col in COLUMN_TYPES:
+        return COLUMN_TYPES[col]
+    return next((t for pattern, t in PATTERN_TYPES if pattern.fullmatch(col)), None)
+
+
+def _has_type(series, kind):
+    if kind in (CODE, 'category'):
+        return isinstance(series.dtype, pd.CategoricalDtype)
+    if kind == NULLABLE_BOOL:
+        return series.dtype == ('boolean' if series.isna().any() else bool)
+    return series.dtype == kind
+
+
+# =========================
+# CONVERSION
+# =========================
+def _as_code(series):
+    """Text codes; integer-looking floats (1.0) lose the decimal part first."""
+    if pd.api.types.is_numeric_dtype(series):
+        series = series.astype("Int64")
+    return series.astype("string").astype(object).where(series.notna(), None)
+
+
+def _as_int(series, dtype):
+    values = pd.to_numeric(series)
+    if values.isna().any():
+        raise ValueError(f"{series.name}: missing values, cannot be stored as {dtype}")
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max or (values % 1 != 0).any()):
+        raise ValueError(f"{series.name}: values outside {dtype} ({values.min()} ... {values.max()})")
+    return values.astype(dtype)
+
+
+def _as_bool(series):
+    if series.isna().any() or not series.isin([0, 1]).all():
+        raise ValueError(f"{series.name}: expected 0 / 1 flags without missing values")
+    return series.astype(bool)
+
+
+def _convert(series, kind):
+    if kind == CODE:
+        return _as_code(series).astype("category")
+    if kind == 'category':
+        return series.astype("category")
+    if kind == 'bool':
+        return _as_bool(series)
+    if kind == NULLABLE_BOOL:
+        series = series.astype("boolean")
+        return series if series.isna().any() else series.astype(bool)
+    if kind.startswith('int'):
+        return _as_int(series, kind)
+    return series.astype(kind)
+
+
+def drop_duplicate_keys(df):
+    """`df` without the columns that repeat a key it has (they must hold the same codes)."""
+    duplicates = [col for col, key in DUPLICATE_KEYS.items() if col in df.columns and key in df.columns]
+    for col in duplicates:
+        key = DUPLICATE_KEYS[col]
+        if not _as_code(df[col]).astype(object).equals(_as_code(df[key]).astype(object)):
+            raise ValueError(f"{col} differs from {key}, it is not a duplicate key")
+    return df.drop(columns=duplicates) if duplicates else df
+
+
+def apply_schema(df):
+    """Copy of `df` with the types of the schema (duplicate keys dropped)."""
+    df = drop_duplicate_keys(df).copy(deep=False)  # columns are replaced, not modified
+    for col in df.columns:
+        kind = column_type(col)
+        if kind is not None and not _has_type(df[col], kind):
+            df[col] = _convert(df[col], kind)
+    return df
+
+
+# =========================
+# VALIDATION
+# =========================
+def validate(df):
+    """Raise ValueError if `df` does not follow the schema, return it otherwise."""
+    problems = []
+    for col in df.columns:
+        kind = column_type(col)
+        if kind is None:
+            continue
+        if not _has_type(df[col], kind):
+            problems.append(f"{col}: {df[col].dtype}, expected {kind}")
+        elif kind == CODE and not df[col].cat.categories.astype(str).str.fullmatch(r'\d+').all():
+            problems.append(f"{col}: codes that are not digits")
+    if 'qual_energia' in df.columns and _has_type(df['qual_energia'], 'category'):
+        unknown = set(df['qual_energia'].cat.categories) - set(ENERGY_GRADES)
+        if unknown:
+            problems.append(f"qual_energia: unknown energy grades {sorted(unknown)}")
+    problems += [f"{col}: duplicate of {key}" for col, key in DUPLICATE_KEYS.items()
+                 if col in df.columns and key in df.columns]
+    if problems:
+        raise ValueError("Columns not matching the schema (see schema.py):\n  " + "\n  ".join(problems))
+    return df
+
+
+# =========================
+# CSV
+# =========================
+def _csv_dtype(kind):
+    # What read_csv can parse directly; the rest is converted by apply_schema
+    if kind in (CODE, 'category'):
+        return 'category'  # categories of the text as it is in the file
+    if kind.startswith('int') or kind in ('bool', NULLABLE_BOOL):
+        return None  # range checked before the cast; 'boolean' parses every value in Python
+    return kind
+
+
+def read_dataset(path=DATASET_CSV, columns=None):
+    """A CSV of listings (default: the final dataset) with the types of the schema, validated."""
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = list(header) if columns is None else list(columns)
+    dtypes = {col: _csv_dtype(column_type(col)) for col in usecols if column_type(col)}
+    dtypes.update({col: 'category' for col in DUPLICATE_KEYS if col in usecols})
+    df = pd.read_csv(path, usecols=usecols, dtype={c: t for c, t in dtypes.items() if t})
+    return validate(apply_schema(df[usecols]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", nargs="?", default=DATASET_CSV)
+    args = parser.parse_args()
+
+    for name, read in [("read_csv", pd.read_csv), ("schema", read_dataset)]:
+        start = time.perf_counter()
+        df = read(args.csv)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<9} {elapsed:6.3f} s  {df.memory_usage(deep=True).sum() / 1e6:8.2f} MB  {df.shape[1]} columns")
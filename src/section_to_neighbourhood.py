@@ -1,91 +1,207 @@
-import geopandas as gpd
+"""
+section_to_neighbourhood.py
+
+Correspondència secció censal -> barri i codis censals (INE i IDESCAT) d'un o més municipis.
+
+- Per defecte, Girona: seccions de data/seccions_girona, barris de data/barris_girona i
+  sectors de data/sectors_girona.
+- Amb la capa de seccions de l'INE (tota una província, columna CUMUN) es processen tots
+  els municipis que té (o els de --municipality), cadascun en un procés (--workers) i amb
+  els barris i sectors de --barris / --sectors si en té; sense capa de barris, BARRIS queda buit.
+- Les parelles secció-barri es troben amb un STRtree (crosswalk.overlap_pairs) i cada secció
+  es queda el barri amb la intersecció més gran. A més, es guarden les àrees d'intersecció
+  de totes les parelles secció-barri i secció-sector (section_to_barri_weights.csv,
+  section_to_sector_weights.csv) per agregar indicadors per secció a barris o sectors
+  (crosswalk.Crosswalk.aggregate).
+
+    python section_to_neighbourhood.py
+    python section_to_neighbourhood.py --sections seccions_17.shp [--municipality 17079 17066]
+                                       [--barris 17079=data/barris_girona/Barris.dbf]
+                                       [--sectors 17079=data/sectors_girona/sectors.shp] [--workers 4]
+"""
+
+import argparse
 import os
 
+import geopandas as gpd
+import pandas as pd
+
+from crosswalk import BARRI_WEIGHTS_CSV, SECTOR_WEIGHTS_CSV, Crosswalk, overlap_pairs
+from municipalities import GIRONA, idescat_prefix, municipality_code, pool_size, run_tasks
+
 # =========================
 # CONFIGURACIÓ DE PATHS
 # =========================
 
-base_dir = os.path.abspath("..")
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 data_dir = os.path.join(base_dir, "data")
 
 SECCIONS_SHP = os.path.join(data_dir, "seccions_girona", "Seccions.shp")
 BARRIS_DBF = os.path.join(data_dir, "barris_girona", "Barris.dbf")
+SECTORS_SHP = os.path.join(data_dir, "sectors_girona", "sectors.shp")
 OUTPUT_CSV = os.path.join(data_dir, "section_to_neighbourhood_clean.csv")
 OUTPUT_GPKG = os.path.join(data_dir, "section_to_neighbourhood_clean.gpkg")  # amb geometria
 
-# =========================
-# 1. Carrega les dades
-# =========================
-
-seccions = gpd.read_file(SECCIONS_SHP)
-barris = gpd.read_file(BARRIS_DBF)
-
-# =========================
-# 2. Assegura CRS coherent
-# =========================
-
-seccions = seccions.to_crs(barris.crs)
-
-# =========================
-# 3. Calcula intersecció de geometries
-# =========================
-
-interseccions = gpd.overlay(seccions, barris, how='intersection', keep_geom_type=False)
-
-# =========================
-# 4. Conserva només polígons i multipolígons
-# =========================
-
-interseccions = interseccions[interseccions.geometry.type.isin(['Polygon','MultiPolygon'])]
-
-# =========================
-# 5. Calcula l'àrea de cada intersecció
-# =========================
-
-interseccions['AREA_INTERSECCIO'] = interseccions.geometry.area
-
-# =========================
-# 6. Assigna a cada secció el barri amb major àrea d'intersecció
-# =========================
-
-idx = interseccions.groupby(['SECCIÓ', 'DISTRICTE'])['AREA_INTERSECCIO'].idxmax()
-seccions_unics = interseccions.loc[idx]
-
-# =========================
-# 7. Crea codis normalitzats i identificadors oficials
-# =========================
-
-seccions_unics['district_id'] = seccions_unics['DISTRICTE'].astype(int).astype(str).str.zfill(2)
-seccions_unics['section_id'] = seccions_unics['SECCIÓ'].astype(int).astype(str).str.zfill(3)
-
-seccions_unics['census_tract_INE'] = '17079' + seccions_unics['district_id'] + seccions_unics['section_id']
-seccions_unics['census_tract_IDESCAT'] = '170792' + seccions_unics['district_id'] + seccions_unics['section_id']
-
-# =========================
-# 8. Selecciona les columnes finals
-# =========================
+# Capa de seccions de l'INE: municipi (CUMUN) i columnes equivalents a les de la capa municipal
+MUNICIPALITY_COLUMN = 'CUMUN'
+INE_COLUMNS = {'CDIS': 'DISTRICTE', 'CSEC': 'SECCIÓ'}
 
 cols = ['DISTRICTE', 'SECCIÓ', 'district_id', 'section_id',
         'census_tract_INE', 'census_tract_IDESCAT', 'BARRIS', 'geometry']
 
-seccions_unics = seccions_unics[cols]
-
-# =========================
-# 9. Ordena per districte i secció
-# =========================
-
-seccions_unics = seccions_unics.sort_values(by=['DISTRICTE','SECCIÓ'])
 
 # =========================
-# 10. Guarda CSV i GeoPackage amb geometria
+# 1. Carrega les seccions per municipi
 # =========================
 
-# CSV sense geometria (només codis i barri)
-seccions_unics.drop(columns='geometry').to_csv(OUTPUT_CSV, index=False)
-
-# GeoPackage amb geometria
-seccions_unics.to_file(OUTPUT_GPKG, layer='section_to_neighbourhood', driver='GPKG')
-
-print("✔ Assignació única, neta i ordenada completada!")
-print(f"CSV creat: {OUTPUT_CSV}")
-print(f"GeoPackage creat amb geometria: {OUTPUT_GPKG}")
+def carrega_seccions(path, municipis=None):
+    """{codi de municipi: seccions} d'una capa municipal (un sol municipi) o de l'INE (CUMUN)."""
+    seccions = gpd.read_file(path)
+    if MUNICIPALITY_COLUMN not in seccions.columns:
+        # Capa d'un sol municipi (Girona per defecte)
+        municipis = municipis or [GIRONA]
+        if len(municipis) != 1:
+            raise ValueError(f"{path} no té la columna {MUNICIPALITY_COLUMN}: indica un sol municipi")
+        return {municipis[0]: seccions}
+
+    seccions = seccions.rename(columns=INE_COLUMNS)
+    seccions['DISTRICTE'] = seccions['DISTRICTE'].astype(int)
+    seccions['SECCIÓ'] = seccions['SECCIÓ'].astype(int).astype(str)
+    codis = seccions[MUNICIPALITY_COLUMN].map(municipality_code)
+
+    municipis = municipis or sorted(codis.unique())
+    absents = sorted(set(municipis) - set(codis))
+    if absents:
+        raise ValueError(f"Municipis sense seccions a {path}: {', '.join(absents)}")
+    return {codi: seccions[codis == codi] for codi in municipis}
+
+
+# =========================
+# 2-9. Correspondència d'un municipi
+# =========================
+
+def codis_censals(seccions, municipi):
+    """Seccions amb els codis normalitzats i els identificadors oficials (prefix del municipi)."""
+    seccions = seccions.copy()
+    seccions['district_id'] = seccions['DISTRICTE'].astype(int).astype(str).str.zfill(2)
+    seccions['section_id'] = seccions['SECCIÓ'].astype(int).astype(str).str.zfill(3)
+
+    codi = seccions['district_id'] + seccions['section_id']
+    seccions['census_tract_INE'] = municipality_code(municipi) + codi
+    seccions['census_tract_IDESCAT'] = idescat_prefix(municipi) + codi
+    return seccions
+
+
+def correspondencia(seccions, barris, sectors, municipi):
+    """
+    (seccions amb el barri de major àrea d'intersecció, pesos secció x barri, pesos secció x
+    sector) d'un municipi; sense barris o sense sectors, la taula de pesos corresponent és buida.
+    """
+    # 2. Assegura CRS coherent (projectat: àrees en m2) i crea els codis censals
+    if barris is not None:
+        seccions = seccions.to_crs(barris.crs)
+    elif seccions.crs.is_geographic:
+        seccions = seccions.to_crs(epsg=25831)
+    seccions = codis_censals(seccions, municipi)
+
+    pesos_barris = pesos_sectors = None
+    if sectors is not None:
+        pesos_sectors = Crosswalk.build(seccions, sectors.to_crs(seccions.crs), target_key='SECTORS').to_frame(
+            target_key='sector')
+
+    if barris is None:
+        # Sense barris: cada secció tal qual, sense barri
+        seccions_unics = seccions.copy()
+        seccions_unics['BARRIS'] = None
+    else:
+        # 3. Parelles secció-barri que es toquen (STRtree) i la seva intersecció
+        i, j, peces = overlap_pairs(seccions, barris)
+        interseccions = gpd.GeoDataFrame(
+            pd.concat([seccions[cols[:-2]].iloc[i].reset_index(drop=True),
+                       barris[['BARRIS']].iloc[j].reset_index(drop=True)], axis=1),
+            geometry=peces, crs=seccions.crs)
+
+        # 4. Conserva només polígons i multipolígons
+        interseccions = interseccions[interseccions.geometry.type.isin(['Polygon','MultiPolygon'])]
+
+        # 5. Calcula l'àrea de cada intersecció
+        interseccions['AREA_INTERSECCIO'] = interseccions.geometry.area
+
+        # 6. Assigna a cada secció el barri amb major àrea d'intersecció
+        idx = interseccions.groupby(['SECCIÓ', 'DISTRICTE'])['AREA_INTERSECCIO'].idxmax()
+        seccions_unics = interseccions.loc[idx]
+
+        # 7. Pesos (àrees d'intersecció) de totes les parelles, no només la major
+        pesos_barris = Crosswalk.build(seccions, barris).to_frame()
+
+    # 8. Selecciona les columnes finals
+    seccions_unics = seccions_unics[cols]
+
+    # 9. Ordena per districte i secció
+    return seccions_unics.sort_values(by=['DISTRICTE','SECCIÓ']), pesos_barris, pesos_sectors
+
+
+def correspondencies(seccions, barris, sectors=None, workers=None):
+    """
+    Correspondència i pesos de tots els municipis de `seccions`, un procés per municipi, en
+    ordre de codi.
+    """
+    sectors = sectors or {}
+    municipis = sorted(seccions)
+    tasques = [(seccions[m], barris.get(m), sectors.get(m), m) for m in municipis]
+    resultats = run_tasks(correspondencia, tasques, pool_size(len(tasques), workers))
+
+    # Mateix CRS per a tots els municipis (el del primer)
+    crs = resultats[0][0].crs
+    seccions_unics = pd.concat([r[0].to_crs(crs) for r in resultats])
+    pesos = [[r[k] for r in resultats if r[k] is not None] for k in (1, 2)]
+    return seccions_unics, *(pd.concat(p, ignore_index=True) if p else None for p in pesos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", default=SECCIONS_SHP, help="capa de seccions (municipal o de l'INE)")
+    parser.add_argument("--municipality", nargs="+", type=municipality_code,
+                        help="codis INE dels municipis (per defecte: Girona, o tots els de la capa de l'INE)")
+    parser.add_argument("--barris", action="append", metavar="CODI=CAPA",
+                        help="capa de barris d'un municipi (per defecte: la de Girona)")
+    parser.add_argument("--sectors", action="append", metavar="CODI=CAPA",
+                        help="capa de sectors d'un municipi (per defecte: la de Girona)")
+    parser.add_argument("--workers", type=int, help="processos (per defecte: un per CPU)")
+    args = parser.parse_args()
+
+    def capes(valors, defecte):
+        # CODI=CAPA -> {codi de municipi: capa}
+        parells = [v.split("=", 1) for v in valors] if valors else [(GIRONA, defecte)]
+        return {municipality_code(m): path for m, path in parells}
+
+    # =========================
+    # 1. Carrega les dades
+    # =========================
+
+    seccions = carrega_seccions(args.sections, args.municipality)
+    barris = {m: gpd.read_file(path) for m, path in capes(args.barris, BARRIS_DBF).items() if m in seccions}
+    sectors = {m: gpd.read_file(path, encoding="utf-8-sig")
+               for m, path in capes(args.sectors, SECTORS_SHP).items() if m in seccions}
+
+    seccions_unics, pesos_barris, pesos_sectors = correspondencies(seccions, barris, sectors, args.workers)
+
+    # =========================
+    # 10. Guarda CSV i GeoPackage amb geometria
+    # =========================
+
+    # CSV sense geometria (només codis i barri)
+    seccions_unics.drop(columns='geometry').to_csv(OUTPUT_CSV, index=False)
+
+    # GeoPackage amb geometria
+    seccions_unics.to_file(OUTPUT_GPKG, layer='section_to_neighbourhood', driver='GPKG')
+
+    print(f"✔ Assignació única, neta i ordenada completada! ({len(seccions)} municipis, {len(seccions_unics)} seccions)")
+    print(f"CSV creat: {OUTPUT_CSV}")
+    print(f"GeoPackage creat amb geometria: {OUTPUT_GPKG}")
+
+    # Àrees d'intersecció de totes les parelles (per a l'agregació a barris i sectors)
+    for pesos, path in [(pesos_barris, BARRI_WEIGHTS_CSV), (pesos_sectors, SECTOR_WEIGHTS_CSV)]:
+        if pesos is not None:
+            pesos.to_csv(path, index=False)
+            print(f"✔ Pesos d'àrea ({len(pesos)} parelles) guardats a: {path}")
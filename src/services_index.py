@@ -0,0 +1,143 @@
+"""
+services_index.py
+
+Spatial index over the services (points of interest) used for the accessibility features.
+
+- One KD-tree per service category, built once on projected coordinates.
+- query() answers every rental, category and radius in a single batched pass and returns,
+  per rental:
+    has_{category}_within_{radius}m    1 if at least one service of the category is within radius
+    {category}_count_within_{radius}m  number of services of the category within radius
+    {category}_nearest_m               distance to the nearest service of the category
+- Several radii can be requested at once; the trees are shared between them.
+- query_one() gives the same values for a single point as a dict, without the DataFrame.
+- Distances can be measured in three ways (`metric`):
+    haversine  great-circle distance; no projection, points go to 3D unit-sphere
+               coordinates with numpy and radii are converted to chord lengths
+    utm        planar distance in ETRS89 / UTM 31N (EPSG:25831), true meters locally
+    mercator   planar distance in Web Mercator (EPSG:3857), the original behaviour and the
+               default (the features the model was trained on); at Girona's latitude it
+               overstates distances by ~35% (500 "m" ~ 370 m)
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
+from scipy.spatial import cKDTree
+
+CATEGORIES = ["education", "food", "health", "mobility", "public_service"]
+
+EARTH_RADIUS_M = 6371008.8
+METRIC_CRS = {"utm": "EPSG:25831", "mercator": "EPSG:3857"}
+METRICS = ["haversine", *METRIC_CRS]
+
+
+@lru_cache(maxsize=None)
+def _transformer(crs):
+    # Same transformation GeoSeries.to_crs uses, built once per CRS
+    return Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+
+
+def project(lats, lons, crs):
+    """(n, 2) array of x/y coordinates in `crs` for WGS84 lat/lon arrays."""
+    x, y = _transformer(crs).transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    return np.column_stack([np.atleast_1d(x), np.atleast_1d(y)])
+
+
+def sphere_coords(lats, lons):
+    """(n, 3) Cartesian coordinates on a sphere of radius EARTH_RADIUS_M."""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    cos_lat = np.cos(lat)
+    return EARTH_RADIUS_M * np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+class ServicesIndex:
+    """KD-trees of service locations, one per category."""
+
+    def __init__(self, services, categories=CATEGORIES, metric="mercator"):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+        self.categories = list(categories)
+        self.metric = metric
+        self.trees = {}
+        for cat in self.categories:
+            subset = services[services['category'] == cat]
+            coords = self._coords(subset['lat'].values, subset['lon'].values)
+            self.trees[cat] = cKDTree(coords.reshape(len(subset), -1))
+
+    def _coords(self, lats, lons):
+        if self.metric == "haversine":
+            return sphere_coords(lats, lons)
+        return project(lats, lons, METRIC_CRS[self.metric])
+
+    def _to_tree_distance(self, meters):
+        # Great-circle distance -> straight chord through the sphere (monotonic, exact)
+        if self.metric == "haversine":
+            return 2 * EARTH_RADIUS_M * np.sin(np.asarray(meters) / (2 * EARTH_RADIUS_M))
+        return meters
+
+    def _to_meters(self, tree_distance):
+        if self.metric == "haversine":
+            return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(tree_distance / (2 * EARTH_RADIUS_M), 1.0))
+        return tree_distance
+
+    def query(self, lats, lons, radii=(500,), index=None):
+        """Flags, counts within each radius and nearest distance for every rental."""
+        coords = self._coords(np.asarray(lats, dtype=float), np.asarray(lons, dtype=float))
+        valid = np.isfinite(coords).all(axis=1)
+        pts = coords[valid]
+
+        counts, nearest = {}, {}
+        for cat in self.categories:
+            tree = self.trees[cat]
+            for r in radii:
+                n = np.zeros(len(coords), dtype=np.int64)
+                if tree.n:
+                    n[valid] = tree.query_ball_point(pts, self._to_tree_distance(r), return_length=True, workers=-1)
+                counts[cat, r] = n
+
+            dist = np.full(len(coords), np.nan)
+            if tree.n:
+                dist[valid] = self._to_meters(tree.query(pts, k=1, workers=-1)[0])
+            nearest[f'{cat}_nearest_m'] = dist
+
+        # has_* flags first (same columns as before), then counts, then nearest distances
+        columns = {}
+        for r in radii:
+            for cat in self.categories:
+                columns[f'has_{cat}_within_{r}m'] = (counts[cat, r] > 0).astype(np.int64)
+        for r in radii:
+            for cat in self.categories:
+                columns[f'{cat}_count_within_{r}m'] = counts[cat, r]
+        columns.update(nearest)
+        return pd.DataFrame(columns, index=index)
+
+    def query_one(self, lat, lon, radii=(500,)):
+        """query() for a single point, as a dict with the same keys in the same order."""
+        point = self._coords(np.array([lat], dtype=float), np.array([lon], dtype=float))[0]
+        valid = bool(np.isfinite(point).all())
+        tree_radii = [float(self._to_tree_distance(r)) for r in radii]
+
+        counts, nearest = {}, {}
+        for cat in self.categories:
+            tree = self.trees[cat]
+            if valid and tree.n:
+                for r, tree_r in zip(radii, tree_radii):
+                    counts[cat, r] = int(tree.query_ball_point(point, tree_r, return_length=True))
+                nearest[f'{cat}_nearest_m'] = float(self._to_meters(tree.query(point, k=1)[0]))
+            else:
+                counts.update({(cat, r): 0 for r in radii})
+                nearest[f'{cat}_nearest_m'] = np.nan
+
+        result = {}
+        for r in radii:
+            for cat in self.categories:
+                result[f'has_{cat}_within_{r}m'] = int(counts[cat, r] > 0)
+        for r in radii:
+            for cat in self.categories:
+                result[f'{cat}_count_within_{r}m'] = counts[cat, r]
+        result.update(nearest)
+        return result
@@ -0,0 +1,53 @@
+"""
+storage.py
+
+Typed Parquet storage for the interim datasets of the pipeline.
+
+- Interim tables (girona_for_rent_combined_clean, girona_for_rent_with_energy, ...) are stored
+  as data/interim/<name>.parquet with the types of schema.py, so dtypes survive between
+  stages: census tract and section codes are always strings (no more int <-> str flips),
+  repeated labels are categoricals, flags bool and measurements float32.
+- read_table() supports column projection: only the requested columns are read from disk.
+  What it reads is validated against the schema (a table written by older code fails).
+- A CSV copy (data/interim/<name>.csv) is also written for the notebooks unless the
+  INTERIM_CSV environment variable is set to 0.
+"""
+
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from schema import apply_schema, validate
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+INTERIM_DIR = os.path.join(base_dir, "data", "interim")
+
+
+def table_path(name, ext="parquet"):
+    return os.path.join(INTERIM_DIR, f"{name}.{ext}")
+
+
+def export_csv_enabled():
+    return os.environ.get("INTERIM_CSV", "1") != "0"
+
+
+def write_table(df, name, csv=None):
+    """Store `df` as data/interim/<name>.parquet (plus a CSV copy if enabled)."""
+    os.makedirs(INTERIM_DIR, exist_ok=True)
+    df = apply_schema(df)
+    path = table_path(name)
+    df.to_parquet(path, index=False)
+    if export_csv_enabled() if csv is None else csv:
+        df.to_csv(table_path(name, "csv"), index=False)
+    return path
+
+
+def read_table(name, columns=None):
+    """Read data/interim/<name>.parquet, optionally only some columns (checked against the schema)."""
+    return validate(pd.read_parquet(table_path(name), columns=columns))
+
+
+def table_columns(name):
+    """Column names of a stored table, without reading any data."""
+    return pq.read_schema(table_path(name)).names
@@ -0,0 +1,141 @@
+"""
+temporal_index.py
+
+Reusable "latest value up to year Y for tract T" index.
+
+- Built once from any table with a key column (e.g. census tract), a year column and a set
+  of value columns: rows are sorted by (key, year) and the values are kept as one numpy
+  array per column.
+
+- lookup() answers all queries at once with a single searchsorted over the sorted
+  (key, year) pairs, instead of filtering the source table once per rental. lookup_one()
+  is the same for a single query, without building a DataFrame.
+
+- Rows without a year are never returned. If several rows share the same key and year,
+  the last one in the source order wins (same rule as iloc[-1] after a stable sort).
+
+- The index can be pickled to disk and reloaded; load_or_build() only rebuilds it when
+  the content hash of its source file(s) or the code that builds it (the module of the
+  build function, this one and the modules of src/ they import) changes.
+"""
+
+import inspect
+import math
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from hashing import code_hash, file_hash
+
+# Years are packed next to the key code in a single int64 (code * YEAR_SPAN + year)
+YEAR_SPAN = 1 << 20
+
+
+class TemporalIndex:
+    """Key -> sorted years plus a columnar block of values."""
+
+    def __init__(self, keys, row_codes, years, values, source_hash=None):
+        self.keys = keys              # sorted unique keys (str)
+        self.row_codes = row_codes    # key position of each row
+        self.years = years            # year of each row, sorted within each key
+        self.values = values          # {column: array aligned with rows}
+        self.source_hash = source_hash
+        self._packed = row_codes.astype(np.int64) * YEAR_SPAN + years
+
+    @property
+    def columns(self):
+        return list(self.values)
+
+    @classmethod
+    def build(cls, df, key_col, year_col, value_cols, source_hash=None):
+        """Index `value_cols` of `df` by (key_col as str, year_col)."""
+        df = df[df[year_col].notna()]
+        keys, row_codes = np.unique(df[key_col].astype(str).values, return_inverse=True)
+        years = df[year_col].values.astype(np.int64)
+
+        # lexsort is stable: rows with the same key and year keep their source order
+        order = np.lexsort((years, row_codes))
+        values = {c: df[c].values[order] for c in value_cols}
+        return cls(keys, row_codes[order], years[order], values, source_hash=source_hash)
+
+    def positions(self, keys, years):
+        """Row position of the latest entry with year <= `years` for each key (-1 if none)."""
+        keys = np.asarray(keys).astype(str)
+        years = np.asarray(years, dtype=float)
+
+        codes = np.searchsorted(self.keys, keys)
+        known = (codes < len(self.keys)) & np.isfinite(years)
+        known[known] = self.keys[codes[known]] == keys[known]
+
+        query = np.where(known, codes, 0).astype(np.int64) * YEAR_SPAN
+        query += np.clip(np.floor(np.nan_to_num(years)), 0, YEAR_SPAN - 1).astype(np.int64)
+        pos = np.searchsorted(self._packed, query, side='right') - 1
+
+        # The candidate must belong to the same key (otherwise no year <= Y exists)
+        found = known & (pos >= 0)
+        found[found] = self.row_codes[pos[found]] == codes[found]
+        return np.where(found, pos, -1)
+
+    def lookup(self, keys, years, columns=None, index=None):
+        """DataFrame of the latest values per query; empty (NaN) where nothing matches."""
+        pos = self.positions(keys, years)
+        found = pos >= 0
+        take = np.where(found, pos, 0)
+        out = {}
+        for c in columns or self.columns:
+            col = self.values[c]
+            out[c] = pd.Series(col[take] if len(col) else np.full(len(pos), np.nan)).where(found)
+        result = pd.DataFrame(out)
+        if index is not None:
+            result.index = index
+        return result
+
+    def position(self, key, year):
+        """positions() for a single (key, year), with plain Python scalars."""
+        key = str(key)
+        year = math.nan if year is None else float(year)
+        code = int(np.searchsorted(self.keys, key))
+        if code >= len(self.keys) or self.keys[code] != key or not math.isfinite(year):
+            return -1
+        query = code * YEAR_SPAN + min(max(math.floor(year), 0), YEAR_SPAN - 1)
+        pos = int(np.searchsorted(self._packed, query, side='right')) - 1
+        return pos if pos >= 0 and self.row_codes[pos] == code else -1
+
+    def lookup_one(self, key, year, columns=None):
+        """Same as lookup() for a single (key, year), as a dict; NaN where nothing matches."""
+        pos = self.position(key, year)
+        return {c: self.values[c][pos] if pos >= 0 else np.nan for c in columns or self.columns}
+
+    # -------------------------
+    # Persistence
+    # -------------------------
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    @classmethod
+    def load_or_build(cls, path, source_file, build, columns=None):
+        """
+        Reuse the index stored at `path` if it was built from the current content of
+        `source_file` (a path or a list of paths) by the current code and has `columns`;
+        otherwise call `build()` and store the result.
+        """
+        sources = [source_file] if isinstance(source_file, str) else source_file
+        scripts = ["temporal_index.py", os.path.basename(inspect.getfile(build))]
+        source_hash = "+".join([*(file_hash(f) for f in sources), code_hash(*scripts)])
+        if os.path.exists(path):
+            index = cls.load(path)
+            if index.source_hash == source_hash and set(columns or []) <= set(index.columns):
+                return index
+        index = build()
+        index.source_hash = source_hash
+        index.save(path)
+        return index
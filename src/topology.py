@@ -0,0 +1,324 @@
+"""
+topology.py
+
+Multi-resolution TopoJSON for the map layers written by maps.py (sections, barris, sectors).
+
+- Rings are cut into arcs at the junctions (points where two polygons stop sharing a
+  border), so every border is stored once and referenced by all the polygons, and by all
+  the layers, that use it.
+- Each level simplifies the arcs with a tolerance of one screen pixel at its zoom level,
+  all of them at once with the topology-preserving simplifier (arcs keep their endpoints
+  and do not cross). Shared borders are simplified once, so neighbouring polygons keep
+  matching without gaps or overlaps.
+- Coordinates are WGS84, quantized to an integer grid and delta-encoded (TopoJSON
+  "transform"), with a cell of a quarter of the tolerance; the grid is refined if snapping
+  would collapse a ring. Every geometry carries its bbox, and the topology its overall bbox.
+- Inputs are snapped to a 1 cm grid first and parts / holes under 1 m2 dropped, which
+  removes the near-zero-width spikes and slivers of the dissolved sections. A feature with
+  no part left keeps its properties and bbox with a null geometry (TopoJSON "type": null).
+- decode() turns one object of a topology back into GeoJSON features (used by the map
+  server and the size/load benchmark).
+
+Tolerances are computed in ETRS89 / UTM 31N meters (EPSG:25831, the CRS of the shapefiles).
+"""
+
+import json
+import math
+import os
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+from shapely.geometry import MultiLineString, MultiPolygon, Polygon
+
+METRIC_CRS = "EPSG:25831"
+
+# Web Mercator meters per pixel at zoom 0 (256 px tiles) and the latitude of Girona
+MERCATOR_M_PER_PX = 156543.03392
+GIRONA_LAT = 41.98
+
+ZOOM_LEVELS = [12, 14, 16]  # simplified levels, plus one at full resolution
+
+# Input cleaning (meters): snapping grid and smallest polygon part / hole kept
+GRID_M = 0.01
+MIN_PART_M2 = 1.0
+
+
+def pixel_size_m(zoom, lat=GIRONA_LAT):
+    """Ground size (meters) of one screen pixel at `zoom`."""
+    return MERCATOR_M_PER_PX * math.cos(math.radians(lat)) / 2 ** zoom
+
+
+def level_name(zoom):
+    return "full" if zoom is None else f"z{zoom}"
+
+
+# =========================
+# ARCS
+# =========================
+def clean_geometries(geoms):
+    """
+    Geometries snapped to GRID_M (GEOS repairs the spikes and slivers this creates) without
+    parts or holes smaller than MIN_PART_M2 (None if no part is left). Same input
+    coordinates give the same output, so shared borders still match exactly.
+    """
+    cleaned = []
+    for geom in shapely.set_precision(np.asarray(geoms), GRID_M):
+        parts = [Polygon(p.exterior, [h for h in p.interiors if Polygon(h).area >= MIN_PART_M2])
+                 for p in getattr(geom, "geoms", [geom]) if p.geom_type == "Polygon" and p.area >= MIN_PART_M2]
+        if not parts:
+            cleaned.append(None)
+        else:
+            cleaned.append(parts[0] if len(parts) == 1 else MultiPolygon(parts))
+    return cleaned
+
+
+def _rings(geometry):
+    """Polygons of a geometry as lists of rings (exterior first), without the closing point."""
+    if geometry is None:
+        return []
+    polygons = geometry.geoms if geometry.geom_type == "MultiPolygon" else [geometry]
+    return [[list(ring.coords)[:-1] for ring in [p.exterior, *p.interiors]] for p in polygons]
+
+
+def _junctions(rings):
+    """Points where the neighbours of a vertex differ between the rings that use it."""
+    neighbours, junctions = {}, set()
+    for ring in rings:
+        n = len(ring)
+        for i, point in enumerate(ring):
+            pair = (ring[i - 1], ring[(i + 1) % n])
+            seen = neighbours.setdefault(point, pair)
+            if seen != pair and seen != pair[::-1]:
+                junctions.add(point)
+    return junctions
+
+
+class ArcTable:
+    """Unique arcs; a reversed arc is referenced as ~index, as in TopoJSON."""
+
+    def __init__(self):
+        self.arcs = []
+        self._index = {}
+
+    def add(self, points):
+        key = tuple(points)
+        if key in self._index:
+            return self._index[key]
+        reverse = key[::-1]
+        if reverse in self._index:
+            return ~self._index[reverse]
+        self._index[key] = len(self.arcs)
+        self.arcs.append(points)
+        return len(self.arcs) - 1
+
+
+def _cut_ring(ring, junctions, table):
+    """Arc references of one ring (cut at its junctions)."""
+    cuts = [i for i, p in enumerate(ring) if p in junctions]
+    if not cuts:
+        # Closed arc: canonical start and orientation so identical rings are shared
+        start = min(range(len(ring)), key=ring.__getitem__)
+        rotated = ring[start:] + ring[:start]
+        return [table.add(rotated + rotated[:1])]
+    rotated = ring[cuts[0]:] + ring[:cuts[0]]
+    cuts = [i - cuts[0] for i in cuts] + [len(ring)]
+    closed = rotated + rotated[:1]
+    return [table.add(closed[a:b + 1]) for a, b in zip(cuts, cuts[1:])]
+
+
+def build_topology(layers):
+    """
+    layers: {name: polygons in METRIC_CRS}. Returns the arc table and, per layer and
+    feature, the polygons as lists of rings of arc references.
+    """
+    rings = [ring for geoms in layers.values() for geom in geoms for poly in _rings(geom) for ring in poly]
+    junctions = _junctions(rings)
+    table = ArcTable()
+    shapes = {
+        name: [[[_cut_ring(ring, junctions, table) for ring in poly] for poly in _rings(geom)] for geom in geoms]
+        for name, geoms in layers.items()
+    }
+    return table.arcs, shapes
+
+
+# =========================
+# SIMPLIFICATION + QUANTIZATION
+# =========================
+def _ring_coords(refs, arcs):
+    coords = []
+    for ref in refs:
+        arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+        coords.extend(arc if not coords else arc[1:])
+    return coords
+
+
+def _encode_arcs(arcs_lonlat, translate, scale):
+    """Quantized, delta-encoded arcs (consecutive duplicates removed, >= 2 points)."""
+    encoded, decoded = [], []
+    for arc in arcs_lonlat:
+        q = np.rint((np.asarray(arc) - translate) / scale).astype(np.int64)
+        keep = np.ones(len(q), dtype=bool)
+        keep[1:] = (np.diff(q, axis=0) != 0).any(axis=1)
+        q = q[keep]
+        if len(q) < 2:
+            q = np.vstack([q, q])
+        encoded.append(np.vstack([q[:1], np.diff(q, axis=0)]).tolist())
+        decoded.append(q * scale + translate)
+    return encoded, decoded
+
+
+def _collapsed(shape, arcs):
+    """True if a ring of the shape has fewer than 3 distinct points left."""
+    for poly in shape:
+        for refs in poly:
+            ring = np.asarray(_ring_coords(refs, arcs))
+            if len(np.unique(ring, axis=0)) < 3:
+                return True
+    return False
+
+
+def simplify_arcs(arcs, tolerance):
+    """
+    All arcs simplified together with GEOS' topology-preserving simplifier: endpoints
+    (junctions) stay, arcs do not cross each other and rings do not collapse.
+    """
+    if tolerance == 0:
+        return arcs
+    lines = shapely.simplify(MultiLineString(arcs), tolerance, preserve_topology=True)
+    # A single arc comes back as a LineString
+    return [list(line.coords) for line in shapely.get_parts(lines)]
+
+
+def encode_level(arcs, shapes, to_lonlat, cell, max_tries=6):
+    """
+    Quantized arcs in lon/lat. If snapping to the grid collapses a ring, the grid is refined
+    (cell / 4) and the level encoded again. Narrow necks thinner than the cell may touch
+    themselves after snapping; that is below the resolution the level is meant for.
+    """
+    lonlat = [np.column_stack(to_lonlat.transform(*np.asarray(a).T)) for a in arcs]
+    translate = np.array([min(a[:, 0].min() for a in lonlat), min(a[:, 1].min() for a in lonlat)])
+    for _ in range(max_tries):
+        scale = np.array([cell, cell])
+        encoded, decoded = _encode_arcs(lonlat, translate, scale)
+        if not any(_collapsed(shape, decoded) for layer in shapes.values() for shape in layer):
+            return encoded, scale.tolist(), translate.tolist()
+        cell /= 4
+    raise ValueError("Could not quantize the topology without collapsing rings")
+
+
+def _properties(gdf):
+    # NaN -> null and numpy scalars -> JSON through pandas
+    return json.loads(pd.DataFrame(gdf.drop(columns=gdf.geometry.name)).to_json(orient="records"))
+
+
+def _bbox(bounds):
+    return [round(float(v), 6) for v in bounds]
+
+
+def to_topojson(layers, zoom=None, cell_m=None):
+    """
+    TopoJSON dict with one GeometryCollection per layer ({name: GeoDataFrame}, any CRS).
+    zoom=None keeps full resolution; otherwise arcs are simplified to one pixel at `zoom`.
+    The quantization cell defaults to a quarter of the tolerance (5 cm at full resolution).
+    """
+    metric = {name: clean_geometries(gdf.to_crs(METRIC_CRS).geometry.values) for name, gdf in layers.items()}
+    arcs, shapes = build_topology(metric)
+
+    tolerance = 0 if zoom is None else pixel_size_m(zoom)
+    cell_m = cell_m or max(tolerance / 4, 0.05)
+    cell = cell_m / 111320  # meters -> degrees (latitude; longitude cells are smaller)
+
+    to_lonlat = Transformer.from_crs(METRIC_CRS, "EPSG:4326", always_xy=True)
+    encoded, scale, translate = encode_level(simplify_arcs(arcs, tolerance), shapes, to_lonlat, cell)
+
+    objects, bounds = {}, []
+    for name, gdf in layers.items():
+        wgs = gdf.to_crs("EPSG:4326")
+        geometries = []
+        for shape, props, geom in zip(shapes[name], _properties(wgs), wgs.geometry):
+            if not shape:
+                # Nothing left after cleaning: null geometry, the feature is kept
+                geometries.append({"type": None, "bbox": _bbox(geom.bounds), "properties": props})
+                continue
+            multi = len(shape) > 1
+            geometries.append({
+                "type": "MultiPolygon" if multi else "Polygon",
+                "arcs": shape if multi else shape[0],
+                "bbox": _bbox(geom.bounds),
+                "properties": props,
+            })
+        objects[name] = {"type": "GeometryCollection", "geometries": geometries}
+        bounds.append(wgs.total_bounds)
+
+    bounds = np.array(bounds)
+    return {
+        "type": "Topology",
+        "bbox": _bbox([*bounds[:, :2].min(axis=0), *bounds[:, 2:].max(axis=0)]),
+        "transform": {"scale": scale, "translate": translate},
+        "objects": objects,
+        "arcs": encoded,
+    }
+
+
+def write_levels(layers, output_dir, prefix, zooms=ZOOM_LEVELS):
+    """One TopoJSON per zoom level (plus full resolution); returns {level: path}."""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for zoom in [*zooms, None]:
+        path = os.path.join(output_dir, f"{prefix}_{level_name(zoom)}.topojson")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(to_topojson(layers, zoom), f, separators=(",", ":"), ensure_ascii=False)
+        paths[level_name(zoom)] = path
+    return paths
+
+
+# =========================
+# DECODING
+# =========================
+def decode_arcs(topology):
+    """Absolute lon/lat coordinates of every arc (numpy arrays)."""
+    scale = np.asarray(topology["transform"]["scale"])
+    translate = np.asarray(topology["transform"]["translate"])
+    arcs = topology["arcs"]
+    lengths = np.array([len(arc) for arc in arcs])
+    # All deltas in one array; cumulative sums restart at the first point of each arc
+    flat = np.fromiter(chain.from_iterable(chain.from_iterable(arcs)), dtype=np.int64,
+                       count=2 * lengths.sum()).reshape(-1, 2)
+    total = np.cumsum(flat, axis=0)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    total -= np.repeat(total[starts] - flat[starts], lengths, axis=0)
+    return np.split(total * scale + translate, np.cumsum(lengths)[:-1])
+
+
+def decode(topology, name, arcs=None):
+    """GeoJSON features (dicts) of the object `name` of a topology."""
+    arcs = decode_arcs(topology) if arcs is None else arcs
+
+    def ring(refs):
+        parts = [arcs[r] if r >= 0 else arcs[~r][::-1] for r in refs]
+        return np.concatenate([parts[0]] + [p[1:] for p in parts[1:]]).tolist()
+
+    features = []
+    for geom in topology["objects"][name]["geometries"]:
+        if geom["type"] is None:
+            geometry = None
+        elif geom["type"] == "Polygon":
+            geometry = {"type": "Polygon", "coordinates": [ring(refs) for refs in geom["arcs"]]}
+        else:
+            geometry = {"type": "MultiPolygon",
+                        "coordinates": [[ring(refs) for refs in poly] for poly in geom["arcs"]]}
+        features.append({
+            "type": "Feature",
+            "bbox": geom["bbox"],
+            "properties": geom["properties"],
+            "geometry": geometry,
+        })
+    return features
+
+
+def decode_geoseries(topology, name):
+    """Shapely geometries of the object `name` (for checks; None for null geometries)."""
+    return [shapely.geometry.shape(f["geometry"]) if f["geometry"] else None for f in decode(topology, name)]
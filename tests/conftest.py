@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules of src/ import each other by name, as when the scripts are run from src/
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
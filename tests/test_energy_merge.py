@@ -0,0 +1,26 @@
+"""
+The as-of join of the energy certificates (latest certificate of the tract up to the year of
+the rental) gives the same table as the original per-row lookup, committed as
+data/interim/girona_for_rent_with_energy.csv.
+"""
+
+import os
+
+import pandas as pd
+
+from enrich import append_columns, build_energy_index, energy_features
+
+INTERIM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "interim")
+
+
+def read_interim(name):
+    return pd.read_csv(os.path.join(INTERIM_DIR, f"{name}.csv"), dtype={"census_tract_INE": str})
+
+
+def test_energy_merge_matches_committed_output():
+    rent = read_interim("girona_for_rent_combined_clean")
+    expected = read_interim("girona_for_rent_with_energy")
+
+    merged = append_columns(rent, energy_features(rent, build_energy_index()))
+
+    pd.testing.assert_frame_equal(merged, expected)
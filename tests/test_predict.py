@@ -0,0 +1,39 @@
+"""
+The compiled model of predict.py gives the same predictions as the fitted pipeline, one
+listing at a time (predict_one) and in batch (predict_batch), also for categorical values
+given with another type (elevator as 1 / 0).
+"""
+
+import numpy as np
+import pytest
+
+from model import DATA_CSV, FEATURES, build_pipeline, split
+from predict import LinearRentModel
+from schema import read_dataset
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    X_train, _, y_train, _ = split(read_dataset(DATA_CSV))
+    return build_pipeline().fit(X_train, y_train), X_train[FEATURES]
+
+
+def test_one_and_batch_match_pipeline(fitted):
+    pipeline, X = fitted
+    model = LinearRentModel(pipeline)
+
+    expected = pipeline.predict(X)
+    np.testing.assert_allclose(model.predict_batch(X), expected)
+    np.testing.assert_allclose([model.predict_one(row) for row in X.head(200).to_dict("records")],
+                               expected[:200])
+
+
+def test_integer_elevator_same_in_both_paths(fitted):
+    pipeline, X = fitted
+    model = LinearRentModel(pipeline)
+    as_int = X.assign(elevator=X["elevator"].astype(int))
+
+    batch = model.predict_batch(as_int)
+    one = [model.predict_one(row) for row in as_int.head(200).to_dict("records")]
+    np.testing.assert_allclose(batch, model.predict_batch(X))
+    np.testing.assert_allclose(one, batch[:200])
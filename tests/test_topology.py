@@ -0,0 +1,70 @@
+"""
+TopoJSON of topology.py: decoding gives back the input polygons (within the quantization
+cell), a border shared by two polygons is stored as a single arc, and a feature with no
+part left after cleaning keeps a null geometry.
+"""
+
+import geopandas as gpd
+import shapely
+from shapely.geometry import LineString, box
+
+from topology import METRIC_CRS, decode, decode_arcs, decode_geoseries, to_topojson
+
+# Around Girona, in ETRS89 / UTM 31N meters
+X0, Y0 = 485000, 4647000
+CELL_M = 0.05  # quantization cell of the full resolution level
+
+
+def layer(geoms, names):
+    return gpd.GeoDataFrame({"name": names}, geometry=geoms, crs=METRIC_CRS)
+
+
+def two_squares():
+    """Two 100 m squares sharing their vertical side, one with a hole."""
+    west = box(X0, Y0, X0 + 100, Y0 + 100).difference(box(X0 + 40, Y0 + 40, X0 + 60, Y0 + 60))
+    east = box(X0 + 100, Y0, X0 + 200, Y0 + 100)
+    return layer([west, east], ["west", "east"])
+
+
+def test_round_trip_within_quantization():
+    squares = two_squares()
+    topology = to_topojson({"squares": squares})
+
+    decoded = gpd.GeoSeries(decode_geoseries(topology, "squares"), crs="EPSG:4326").to_crs(METRIC_CRS)
+    for original, back in zip(squares.geometry, decoded):
+        assert shapely.hausdorff_distance(original, back) < CELL_M
+        assert abs(original.area - back.area) < original.length * CELL_M
+    assert [f["properties"]["name"] for f in decode(topology, "squares")] == ["west", "east"]
+
+
+def test_shared_border_stored_once():
+    topology = to_topojson({"squares": two_squares()})
+    arcs = gpd.GeoSeries([LineString(a) for a in decode_arcs(topology)], crs="EPSG:4326").to_crs(METRIC_CRS)
+    border = LineString([(X0 + 100, Y0), (X0 + 100, Y0 + 100)])
+
+    on_border = [i for i, arc in enumerate(arcs) if arc.hausdorff_distance(border) < CELL_M]
+    assert len(on_border) == 1
+
+    # Both squares reference it, one of them reversed (~index)
+    shared = on_border[0]
+    refs = [{ref for ring in geom["arcs"] for ref in ring} for geom in topology["objects"]["squares"]["geometries"]]
+    assert shared in refs[0] | refs[1] and ~shared in refs[0] | refs[1]
+
+
+def test_feature_without_parts_keeps_null_geometry():
+    tiny = box(X0 + 300, Y0, X0 + 300.5, Y0 + 0.5)  # 0.25 m2, under MIN_PART_M2
+    squares = two_squares()
+    topology = to_topojson({"squares": layer([*squares.geometry, tiny], ["west", "east", "tiny"])})
+
+    geometries = topology["objects"]["squares"]["geometries"]
+    assert [g["type"] for g in geometries] == ["Polygon", "Polygon", None]
+    assert geometries[2]["properties"] == {"name": "tiny"}
+    assert decode_geoseries(topology, "squares")[2] is None
+
+
+def test_single_arc_simplified():
+    square = layer([box(X0, Y0, X0 + 100, Y0 + 100)], ["square"])
+    topology = to_topojson({"square": square}, zoom=12)
+
+    assert len(topology["arcs"]) == 1
+    assert decode_geoseries(topology, "square")[0].geom_type == "Polygon"